@@ -11,136 +11,26 @@ Usage:
 import argparse
 import sys
 from pathlib import Path
-import yaml
 import streamlit as st
-from utils.vector_storage import PGVectorDB
-from langchain_openai import ChatOpenAI
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from utils.config import load_config
+from utils.rag import stream_rag_response
+from utils.resource_registry import registry
+from utils.resources import (
+    initialize_context_packer,
+    initialize_feedback_log,
+    initialize_llm,
+    initialize_response_cache,
+    initialize_tracing,
+    initialize_vector_db,
+    initialize_vector_db_engine,
+)
 import os
 from dotenv import load_dotenv
-from pydantic import BaseModel
-import json
 
 # Load environment variables from .env file
 load_dotenv()
 
 
-class AppConfig(BaseModel):
-    class Config:
-        arbitrary_types_allowed = True
-
-    class Database(BaseModel):
-        name: str
-        host: str
-        password: str
-        username: str
-        port: int
-        table_name: str
-
-    class EmbeddingModel(BaseModel):
-        embed_model_name: str
-        embed_dim: int
-
-    class LLM(BaseModel):
-        openai_model: str
-        temperature: float
-
-    database: Database
-    embedding_model: EmbeddingModel
-    llm: LLM
-
-
-def load_config(config_path):
-    """Load configuration from YAML file."""
-    with open(config_path, "r") as f:
-        config_dict = yaml.safe_load(f)
-    return AppConfig(**config_dict)
-
-def save_dict_to_json(file_path, new_data):
-    # Check if the file exists
-    if os.path.exists(file_path):
-        # Load the existing data
-        with open(file_path, "r") as file:
-            try:
-                data = json.load(file)
-                # Ensure data is a list (to handle multiple dictionaries)
-                if not isinstance(data, list):
-                    data = [data]
-            except json.JSONDecodeError:
-                # If file is empty or contains invalid JSON, start with an empty list
-                data = []
-    else:
-        # If file doesn't exist, start with an empty list
-        data = []
-
-    # Append the new dictionary to the list
-    data.append(new_data)
-
-    # Save the updated list back to the file
-    with open(file_path, "w") as file:
-        json.dump(data, file, indent=4)
-
-
-def initialize_vector_db_engine(db_config, embedding_config):
-    """Initialize connection to vector database."""
-    vectordb = PGVectorDB(
-        db_config.name,
-        db_config.host,
-        db_config.password,
-        db_config.username,
-        db_config.port,
-        db_config.table_name,
-        embed_dim=embedding_config.embed_dim,
-    )
-
-    llama_embedding_model = HuggingFaceEmbedding(
-        model_name=embedding_config.embed_model_name
-    )
-
-    vectordb.build_index(llama_embedding_model)
-
-    query_engine = vectordb.index.as_query_engine(
-        vector_store_query_mode="hybrid", sparse_top_k=4
-    )
-
-    return query_engine
-
-
-def get_rag_response(query: str, query_engine, llm) -> str:
-    """
-    Get response using RAG:
-    1. Retrieve relevant documents
-    2. Create prompt with context
-    3. Get LLM response
-    """
-    # Retrieve relevant documents
-    relevant_docs = query_engine.query(query)
-
-    context = []
-    for doc in relevant_docs.source_nodes:
-        context.append(doc.text)
-
-    context = "\n\n".join([doc for doc in context])
-
-    # Create prompt with context
-    prompt_template = """You are TravelSEA Advisor, an AI travel assistant specialized in sustainable tourism in Southeast Asia. 
-        Use the following context to answer the question. If you cannot find the answer in the context, 
-        say so politely and suggest what information might be helpful to better answer the question.
-        
-        Context: {context}
-        
-        Question: {query}
-        
-        Answer: """
-
-    prompt = prompt_template.format(context=context, query=query)
-
-    # Get LLM response
-    response = llm.predict(prompt)
-
-    return response
-
-
 def main():
     # Parse command line arguments
     if len(sys.argv) > 1:
@@ -166,13 +56,13 @@ def main():
         st.stop()
 
     # Initialize components
-    query_engine = initialize_vector_db_engine(config.database, config.embedding_model)
+    tracer = initialize_tracing(config.tracing)
+    retrieval_engine = initialize_vector_db_engine(config)
 
-    llm = ChatOpenAI(
-        api_key=openai_api_key,
-        model=config.llm.openai_model,
-        temperature=config.llm.temperature,
-    )
+    vectordb = initialize_vector_db(config)
+    response_cache = initialize_response_cache(config.response_cache, vectordb)
+    feedback_log = initialize_feedback_log(config.feedback_log)
+    context_packer = initialize_context_packer(config.context_packing)
 
     # Application header
     st.title("🌏 TravelSEA Advisor")
@@ -197,38 +87,81 @@ def main():
         placeholder="e.g., What are the must-visit temples in Cambodia?",
     )
 
-    json_feedback_path = "../feedback.json"
     # Add a button to submit the question
     if st.button("Get Recommendations"):
         if user_question:
             try:
-                with st.spinner("Generating recommendations..."):
-                    response = get_rag_response(user_question, query_engine, llm)
-
-                # Display the response
+                # The LLM client is only loaded once a question is asked
+                llm = initialize_llm(config.llm, openai_api_key)
+                with st.spinner("Retrieving relevant information..."):
+                    stream = stream_rag_response(
+                        user_question,
+                        retrieval_engine,
+                        llm,
+                        response_cache=response_cache,
+                        embed_model=vectordb.embedding_model,
+                        context_packer=context_packer,
+                    )
+
+                # Display the response as it is generated
                 st.markdown("### 📝 Recommendations")
-                st.write(response)
-
-                answer_dic = {"question": user_question, "answer": response}
-                # Add feedback buttons
-                col1, col2, _ = st.columns([1, 1, 3])
-                with col1:
-                    if st.button("👍 Helpful"):
-                        answer_dic["feedback"] = "helpful"
-                        save_dict_to_json(json_feedback_path, answer_dic)
-                        st.success("Thank you for your feedback!")
-                with col2:
-                    if st.button("👎 Not Helpful"):
-                        answer_dic["feedback"] = "not helpful"
-                        save_dict_to_json(json_feedback_path, answer_dic)
-                        st.info(
-                            "Thank you for your feedback! We'll work on improving our responses."
-                        )
+                st.write_stream(stream.tokens())
+                if stream.time_to_first_token is None:
+                    # The LLM returned no tokens, so there is no first-token time
+                    first_token = "No tokens received"
+                else:
+                    first_token = f"First token after {stream.time_to_first_token:.2f}s"
+                st.caption(f"{first_token}, answer completed in {stream.total_time:.2f}s")
+
+                # Keep the answer across reruns so the feedback buttons can use it
+                st.session_state["last_answer"] = {
+                    "question": user_question,
+                    "answer": stream.text,
+                    "time_to_first_token": stream.time_to_first_token,
+                    "total_time": stream.total_time,
+                    "cached": stream.cached,
+                    "document_ids": [
+                        node.metadata.get("document_id") for node in stream.nodes
+                    ],
+                    "scores": [node.score for node in stream.nodes],
+                }
 
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
         else:
             st.warning("Please enter a question.")
+    elif "last_answer" in st.session_state:
+        st.markdown("### 📝 Recommendations")
+        st.write(st.session_state["last_answer"]["answer"])
+
+    if "last_answer" in st.session_state:
+        answer_dic = dict(st.session_state["last_answer"])
+        # Add feedback buttons
+        col1, col2, _ = st.columns([1, 1, 3])
+        with col1:
+            if st.button("👍 Helpful"):
+                answer_dic["feedback"] = "helpful"
+                feedback_log.record(answer_dic)
+                st.success("Thank you for your feedback!")
+        with col2:
+            if st.button("👎 Not Helpful"):
+                answer_dic["feedback"] = "not helpful"
+                feedback_log.record(answer_dic)
+                st.info(
+                    "Thank you for your feedback! We'll work on improving our responses."
+                )
+
+    with st.sidebar.expander("Resource cache"):
+        st.json(registry.stats())
+        if response_cache is not None:
+            st.json(response_cache.stats())
+        if hasattr(vectordb, "pool_status"):
+            st.json(vectordb.pool_status())
+        st.json(feedback_log.stats())
+        if context_packer is not None:
+            st.json(context_packer.stats())
+        if tracer.enabled:
+            st.json(tracer.snapshot())
 
     # Footer with information about the project
     st.markdown("---")
@@ -0,0 +1,333 @@
+"""
+api.py
+
+Headless asyncio HTTP service for the TravelSEA Advisor RAG pipeline.
+
+Concurrent questions are micro-batched into single query-embedding forward
+passes; vector searches use the pooled async Postgres engine (or worker threads
+for the in-memory backend) and LLM calls are awaited concurrently, so one
+process can serve many users at once.
+
+Endpoints:
+    GET  /health   service status and batching statistics
+    GET  /metrics  Prometheus metrics (when tracing is enabled)
+    POST /query    {"question": "..."} -> {"answer": "...", "sources": [...]}
+
+Usage:
+    python api.py --config config.yaml [--port 8000] [--stub-llm]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+from llama_index.core.schema import QueryBundle
+
+from utils.config import load_config
+from utils.query_batcher import QueryEmbeddingBatcher
+from utils.rag import build_prompt, retrieve_nodes
+from utils.resources import (
+    initialize_context_packer,
+    initialize_llm,
+    initialize_response_cache,
+    initialize_tracing,
+    initialize_vector_db,
+    initialize_vector_db_engine,
+)
+from utils.stubs import StubLLM
+from utils.tracing import PROMETHEUS_CONTENT_TYPE, tracer
+
+load_dotenv()
+
+MAX_BODY_BYTES = 1 << 20
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class RAGService:
+    """Async RAG pipeline: batched query embedding, threaded retrieval, async LLM."""
+
+    def __init__(self, retriever, llm, embed_model, response_cache=None,
+                 max_batch_size=16, max_wait_ms=5.0, async_retrieval=False,
+                 vectordb=None, context_packer=None):
+        self.retriever = retriever
+        self.context_packer = context_packer
+        self.async_retrieval = async_retrieval
+        self.vectordb = vectordb
+        self.llm = llm
+        self.response_cache = response_cache
+        self.batcher = QueryEmbeddingBatcher(embed_model, max_batch_size, max_wait_ms)
+        self.started = None
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def start(self):
+        self.batcher.start()
+        self.started = time.time()
+
+    async def close(self):
+        await self.batcher.close()
+
+    async def _generate(self, prompt):
+        if hasattr(self.llm, "ainvoke"):
+            message = await self.llm.ainvoke(prompt)
+            return getattr(message, "content", message)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.llm.predict, prompt)
+
+    async def answer(self, question):
+        """Answer one question; safe to call concurrently."""
+        with tracer.trace("api_request") as trace:
+            result = await self._answer(question)
+            trace.set("cached", result["cached"])
+            return result
+
+    async def _answer(self, question):
+        start = time.perf_counter()
+
+        if self.response_cache is not None:
+            cached = self.response_cache.get_exact(question)
+            if cached is not None:
+                return {"answer": cached, "sources": [], "cached": True}
+
+        # Includes the time spent waiting for the micro-batch to fill
+        with tracer.span("embed_query"):
+            embedding = await self.batcher.embed(question)
+
+        if self.response_cache is not None:
+            cached = self.response_cache.get_semantic(embedding, question)
+            if cached is not None:
+                return {"answer": cached, "sources": [], "cached": True}
+
+        query_bundle = QueryBundle(query_str=question, embedding=embedding)
+        if self.async_retrieval:
+            with tracer.span("retrieve"):
+                nodes = await self.retriever.aretrieve(query_bundle)
+        else:
+            loop = asyncio.get_running_loop()
+            # Run in a copy of the context so spans in the worker join this trace
+            nodes = await loop.run_in_executor(
+                None,
+                functools.partial(
+                    contextvars.copy_context().run,
+                    retrieve_nodes,
+                    query_bundle,
+                    self.retriever,
+                ),
+            )
+        retrieved = time.perf_counter()
+
+        prompt = build_prompt(question, nodes, self.context_packer)
+        with tracer.span("generate"):
+            answer = await self._generate(prompt)
+        finished = time.perf_counter()
+
+        if self.response_cache is not None:
+            self.response_cache.put(question, answer, embedding, latency=finished - start)
+
+        return {
+            "answer": answer,
+            "sources": [
+                {
+                    "document_id": node.metadata.get("document_id"),
+                    "pdf_name": node.metadata.get("pdf_name"),
+                    "score": node.score,
+                }
+                for node in nodes
+            ],
+            "cached": False,
+            "timings": {
+                "retrieval_seconds": retrieved - start,
+                "generation_seconds": finished - retrieved,
+                "total_seconds": finished - start,
+            },
+        }
+
+    def health(self):
+        health = {
+            "status": "ok",
+            "uptime_seconds": time.time() - self.started if self.started else 0.0,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "embedding_batches": self.batcher.stats(),
+        }
+        if self.context_packer is not None:
+            health["context_packing"] = self.context_packer.stats()
+        if hasattr(self.vectordb, "pool_status"):
+            health["db_pool"] = self.vectordb.pool_status()
+        return health
+
+    async def handle(self, method, path, body):
+        """Route one HTTP request and return (status, JSON-serializable payload)."""
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.health()
+
+        if path == "/metrics":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, tracer.render_prometheus().encode()
+
+        if path == "/query":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                question = json.loads(body or b"{}").get("question", "").strip()
+            except (ValueError, AttributeError):
+                return 400, {"error": "body must be a JSON object"}
+            if not question:
+                return 400, {"error": "missing 'question'"}
+
+            self.requests += 1
+            self.in_flight += 1
+            try:
+                return 200, await self.answer(question)
+            except Exception as e:
+                self.errors += 1
+                return 500, {"error": f"{type(e).__name__}: {e}"}
+            finally:
+                self.in_flight -= 1
+
+        return 404, {"error": f"unknown path {path}"}
+
+
+async def read_request(reader):
+    """Parse a minimal HTTP/1.1 request; returns (method, path, body) or None."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("payload too large")
+    body = await reader.readexactly(length) if length else b""
+
+    return method.upper(), path.split("?", 1)[0], body
+
+
+async def write_response(writer, status, payload, content_type="application/json"):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+    writer.close()
+
+
+def make_connection_handler(service):
+    async def handle_connection(reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is None:
+                writer.close()
+                return
+            status, payload = await service.handle(*request)
+        except ValueError as e:
+            status, payload = (413 if "too large" in str(e) else 400), {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        # Only the metrics endpoint returns a pre-rendered (bytes) payload
+        content_type = (
+            PROMETHEUS_CONTENT_TYPE if isinstance(payload, bytes) else "application/json"
+        )
+        await write_response(writer, status, payload, content_type)
+
+    return handle_connection
+
+
+async def serve(service, host, port):
+    """Run the HTTP server until cancelled."""
+    service.start()
+    server = await asyncio.start_server(make_connection_handler(service), host, port)
+    print(f"TravelSEA API listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def build_service(config, stub_llm=False):
+    """Create the RAGService from the app configuration."""
+    # The service exposes /metrics itself, so no separate metrics server
+    initialize_tracing(config.tracing.model_copy(update={"metrics_port": None}))
+
+    if stub_llm:
+        llm = StubLLM(latency=config.api.stub_llm_latency)
+    else:
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            raise RuntimeError("OPENAI_API_KEY is not set (use --stub-llm to run offline)")
+        llm = initialize_llm(config.llm, openai_api_key)
+
+    vectordb = initialize_vector_db(config)
+    retriever = initialize_vector_db_engine(config)
+
+    return RAGService(
+        retriever,
+        llm,
+        vectordb.embedding_model,
+        response_cache=initialize_response_cache(config.response_cache, vectordb),
+        max_batch_size=config.api.max_batch_size,
+        max_wait_ms=config.api.max_wait_ms,
+        # The retriever returned in retriever_only mode exposes aretrieve, which
+        # runs on the Postgres store's async engine instead of a worker thread.
+        async_retrieval=(
+            config.vector_store.backend == "postgres" and config.retrieval.retriever_only
+        ),
+        vectordb=vectordb,
+        context_packer=initialize_context_packer(config.context_packing),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TravelSEA Advisor HTTP API")
+    parser.add_argument("--config", default="config.yaml", help="Path to configuration file")
+    parser.add_argument("--host", help="Override api.host from the config")
+    parser.add_argument("--port", type=int, help="Override api.port from the config")
+    parser.add_argument(
+        "--stub-llm",
+        action="store_true",
+        help="Answer with a deterministic local stub instead of OpenAI",
+    )
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    service = build_service(config, stub_llm=args.stub_llm)
+
+    asyncio.run(
+        serve(service, args.host or config.api.host, args.port or config.api.port)
+    )
+
+
+if __name__ == "__main__":
+    main()
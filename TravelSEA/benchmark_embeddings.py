@@ -0,0 +1,227 @@
+"""
+benchmark_embeddings.py
+
+Compares the embedding inference backends (see utils/embedding_backends.py)
+against the reference HuggingFaceEmbedding model on the same chunks and
+ground-truth questions:
+
+- load and warmup time;
+- document throughput (chunks/s) and batched query throughput (queries/s);
+- single-query latency percentiles, the query-time cost in the app;
+- drift: cosine similarity of each vector to the reference vector;
+- top-k agreement: the fraction of the reference top-k chunks of each
+  question (searched among the sampled chunks) the backend still returns.
+
+Usage:
+    python benchmark_embeddings.py --config config.yaml [--documents 512]
+        [--queries 256] [--backends huggingface torch torch_int8 onnx]
+        [--num-threads 4] [--batch-size 32] [--output-dir ../data/benchmarks]
+"""
+
+import argparse
+import gc
+import pickle
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+from utils.config import load_config
+from utils.embedding_backends import (
+    EMBEDDING_BACKENDS,
+    create_embedding_model,
+    warmup_embedding,
+)
+from utils.evaluation import latency_summary, load_ground_truth, write_results
+from utils.query_batcher import embed_queries
+
+
+def load_texts(documents_path, ground_truth_path, num_documents, num_queries, seed):
+    """Sample chunk texts and ground-truth questions."""
+    with open(documents_path, "rb") as f:
+        documents = pickle.load(f)
+    documents = random.Random(seed).sample(documents, min(num_documents, len(documents)))
+    questions = [
+        gt["question"] for gt in load_ground_truth(ground_truth_path, num_queries, seed)
+    ]
+    return [doc["content"] for doc in documents], questions
+
+
+def cosine_drift(reference, vectors):
+    """Per-row cosine similarity between two embedding matrices."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (reference * vectors).sum(axis=1)
+
+
+def top_k(query_vectors, document_vectors, k):
+    scores = query_vectors @ document_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def topk_agreement(reference_topk, topk):
+    """Mean fraction of the reference top-k also found in the backend's top-k."""
+    overlaps = [
+        len(set(reference) & set(candidate)) / len(reference)
+        for reference, candidate in zip(reference_topk, topk)
+    ]
+    return float(np.mean(overlaps))
+
+
+def run_backend(backend, model_name, documents, questions, num_threads, batch_size,
+                max_length, onnx_dir, latency_queries):
+    """Build one backend and measure it; returns (metrics, document and query vectors)."""
+    start = time.perf_counter()
+    embed_model = create_embedding_model(
+        model_name,
+        backend=backend,
+        num_threads=num_threads,
+        batch_size=batch_size,
+        max_length=max_length,
+        onnx_dir=onnx_dir,
+    )
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warmup_embedding(embed_model)
+    warmup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    document_vectors = np.asarray(embed_model.get_text_embedding_batch(documents))
+    document_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    query_vectors = np.asarray(embed_queries(embed_model, questions))
+    query_seconds = time.perf_counter() - start
+
+    latencies = []
+    for question in questions[:latency_queries]:
+        query_start = time.perf_counter()
+        embed_model.get_query_embedding(question)
+        latencies.append(time.perf_counter() - query_start)
+
+    metrics = {
+        "backend": backend,
+        "load_s": load_seconds,
+        "warmup_s": warmup_seconds,
+        "documents_per_s": len(documents) / document_seconds,
+        "queries_per_s": len(questions) / query_seconds,
+        **latency_summary(latencies),
+    }
+    if hasattr(embed_model, "stats"):
+        metrics["padding_ratio"] = embed_model.stats()["padding_ratio"]
+    return metrics, document_vectors, query_vectors
+
+
+def print_table(rows):
+    header = (
+        f"{'backend':<12}{'load_s':>8}{'docs/s':>9}{'queries/s':>11}{'p50_ms':>9}"
+        f"{'p95_ms':>9}{'cos_mean':>10}{'cos_min':>9}{'top_k':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['backend']:<12}{row['load_s']:>8.1f}{row['documents_per_s']:>9.1f}"
+            f"{row['queries_per_s']:>11.1f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}"
+            f"{row['cosine_mean']:>10.5f}{row['cosine_min']:>9.5f}"
+            f"{row['topk_agreement']:>7.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark embedding inference backends for TravelSEA Advisor"
+    )
+    parser.add_argument("--config", default="config.yaml", help="Path to configuration file")
+    parser.add_argument("--documents-path", default="../data/docs_processed.pickle")
+    parser.add_argument("--ground-truth", default="../data/GT_docs_parsed_gpt-4o.bin")
+    parser.add_argument("--documents", type=int, default=512, help="Chunks to embed")
+    parser.add_argument("--queries", type=int, default=256, help="Questions to embed")
+    parser.add_argument(
+        "--latency-queries", type=int, default=100, help="Questions timed one by one"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--backends", nargs="+", choices=EMBEDDING_BACKENDS,
+        default=["huggingface", "torch", "torch_int8", "onnx"],
+        help="Backends to compare; huggingface always runs first as the reference",
+    )
+    parser.add_argument("--num-threads", type=int, help="Intra-op threads (embedding_model.num_threads)")
+    parser.add_argument("--batch-size", type=int, help="Batch size (embedding_model.batch_size)")
+    parser.add_argument("--top-k", type=int, default=5, help="k of the top-k agreement")
+    parser.add_argument("--output-dir", default="../data/benchmarks")
+    args = parser.parse_args()
+
+    embedding_config = load_config(args.config).embedding_model
+    num_threads = args.num_threads or embedding_config.num_threads
+    batch_size = args.batch_size or embedding_config.batch_size
+
+    documents, questions = load_texts(
+        args.documents_path, args.ground_truth, args.documents, args.queries, args.seed
+    )
+    print(f"Embedding {len(documents)} chunks and {len(questions)} questions")
+
+    backends = ["huggingface"] + [b for b in args.backends if b != "huggingface"]
+    rows = []
+    reference = None
+    for backend in backends:
+        try:
+            metrics, document_vectors, query_vectors = run_backend(
+                backend,
+                embedding_config.embed_model_name,
+                documents,
+                questions,
+                num_threads,
+                batch_size,
+                embedding_config.max_length,
+                embedding_config.onnx_path,
+                args.latency_queries,
+            )
+        except ImportError as e:
+            print(f"Skipping {backend}: {e}")
+            continue
+
+        ranking = top_k(query_vectors, document_vectors, args.top_k)
+        if reference is None:
+            reference = (document_vectors, query_vectors, ranking)
+
+        drift = np.concatenate(
+            [
+                cosine_drift(reference[0], document_vectors),
+                cosine_drift(reference[1], query_vectors),
+            ]
+        )
+        metrics["cosine_mean"] = float(drift.mean())
+        metrics["cosine_min"] = float(drift.min())
+        metrics["topk_agreement"] = topk_agreement(reference[2], ranking)
+        rows.append(metrics)
+        print(
+            f"{backend}: {metrics['documents_per_s']:.1f} chunks/s, "
+            f"p50 query {metrics['p50_ms']:.2f}ms, cosine to reference "
+            f"{metrics['cosine_mean']:.5f} (min {metrics['cosine_min']:.5f})"
+        )
+
+        # Free the model before loading the next backend
+        gc.collect()
+
+    print()
+    print_table(rows)
+
+    results = {
+        "created": datetime.now().isoformat(),
+        "embedding_model": embedding_config.embed_model_name,
+        "documents": len(documents),
+        "queries": len(questions),
+        "num_threads": num_threads,
+        "batch_size": batch_size,
+        "top_k": args.top_k,
+        "results": rows,
+    }
+    json_path, csv_path = write_results(results, args.output_dir, "embeddings")
+    print(f"\nResults written to {json_path} and {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
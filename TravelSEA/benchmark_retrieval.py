@@ -0,0 +1,294 @@
+"""
+benchmark_retrieval.py
+
+Benchmarks retrieval configurations on the ground-truth questions: hit rate and
+MRR of the source chunk, per-query latency percentiles and throughput.
+
+Query embeddings are computed once up front and shared by every configuration,
+so the reported latencies are those of the search itself.
+
+Usage:
+    python benchmark_retrieval.py --config config.yaml [--limit 500]
+        [--backends postgres memory] [--modes default sparse hybrid]
+        [--similarity-top-k 2 4] [--sparse-top-k 4 8] [--routing off on]
+        [--quantization none int8 binary] [--output-dir ../data/benchmarks]
+
+Quantized runs (memory backend) also report recall_vs_float, the fraction of
+the float32 results of the same configuration they still return.
+"""
+
+import argparse
+import itertools
+import time
+from datetime import datetime
+
+from llama_index.core.schema import QueryBundle
+from tqdm import tqdm
+
+from utils.config import load_config
+from utils.evaluation import (
+    hit_rate,
+    latency_summary,
+    load_ground_truth,
+    mrr,
+    relevance,
+    write_results,
+)
+from utils.query_batcher import embed_queries
+from utils.query_router import RoutedRetriever
+from utils.resources import initialize_vector_db
+
+
+def sweep_configurations(modes, similarity_top_ks, sparse_top_ks, ef_searches):
+    """
+    Expand the sweep into retrieval configurations, skipping parameters a mode
+    ignores (sparse_top_k for dense search, similarity_top_k for sparse search).
+    """
+    seen = set()
+    for mode, k, sparse_k, ef_search in itertools.product(
+        modes, similarity_top_ks, sparse_top_ks, ef_searches
+    ):
+        if mode == "default":
+            sparse_k = None
+        elif mode == "sparse":
+            k, ef_search = None, None
+        key = (mode, k, sparse_k, ef_search)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield {
+            "mode": mode,
+            "similarity_top_k": k,
+            "sparse_top_k": sparse_k,
+            "ef_search": ef_search,
+        }
+
+
+def retriever_kwargs(retrieval_config):
+    kwargs = {"vector_store_query_mode": retrieval_config["mode"]}
+    if retrieval_config["similarity_top_k"] is not None:
+        kwargs["similarity_top_k"] = retrieval_config["similarity_top_k"]
+    if retrieval_config["sparse_top_k"] is not None:
+        kwargs["sparse_top_k"] = retrieval_config["sparse_top_k"]
+        if retrieval_config["mode"] == "sparse":
+            # Sparse-only search returns similarity_top_k results in llama-index
+            kwargs["similarity_top_k"] = retrieval_config["sparse_top_k"]
+    if retrieval_config["ef_search"] is not None:
+        kwargs["ef_search"] = retrieval_config["ef_search"]
+    return kwargs
+
+
+def embed_ground_truth(embed_model, ground_truth, batch_size=64):
+    """Embed all questions once; returns the embeddings and per-query embed time."""
+    questions = [gt["question"] for gt in ground_truth]
+    embeddings = []
+    start = time.perf_counter()
+    for i in tqdm(range(0, len(questions), batch_size), desc="Embedding questions"):
+        embeddings.extend(embed_queries(embed_model, questions[i : i + batch_size]))
+    elapsed = time.perf_counter() - start
+    return embeddings, elapsed / max(len(questions), 1)
+
+
+def run_configuration(retriever, ground_truth, embeddings, warmup=5):
+    """
+    Run every question through a retriever and collect quality and latency.
+
+    Returns:
+        tuple: Metrics dict and the retrieved document_ids of every question.
+    """
+    bundles = [
+        QueryBundle(query_str=gt["question"], embedding=embedding)
+        for gt, embedding in zip(ground_truth, embeddings)
+    ]
+
+    for bundle in bundles[:warmup]:
+        retriever.retrieve(bundle)
+
+    relevance_total = []
+    latencies = []
+    retrieved_ids = []
+    start = time.perf_counter()
+    for gt, bundle in zip(ground_truth, bundles):
+        query_start = time.perf_counter()
+        nodes = retriever.retrieve(bundle)
+        latencies.append(time.perf_counter() - query_start)
+        relevance_total.append(relevance(nodes, gt))
+        retrieved_ids.append([node.metadata.get("document_id") for node in nodes])
+    wall_time = time.perf_counter() - start
+
+    metrics = {
+        "queries": len(bundles),
+        "hit_rate": hit_rate(relevance_total),
+        "mrr": mrr(relevance_total),
+        **latency_summary(latencies),
+        "qps": len(bundles) / wall_time if wall_time else None,
+    }
+    return metrics, retrieved_ids
+
+
+def recall_against(reference_ids, retrieved_ids):
+    """Mean fraction of each reference result list that was also retrieved."""
+    recalls = [
+        len(set(reference) & set(retrieved)) / len(reference)
+        for reference, retrieved in zip(reference_ids, retrieved_ids)
+        if reference
+    ]
+    return sum(recalls) / len(recalls) if recalls else None
+
+
+def print_table(rows):
+    header = (
+        f"{'backend':<9}{'mode':<9}{'k':>4}{'sparse_k':>9}{'ef':>5}{'route':>6}{'quant':>7}"
+        f"{'hit_rate':>10}{'mrr':>8}{'p50_ms':>9}{'p95_ms':>9}{'p99_ms':>9}{'qps':>9}"
+        f"{'recall_vs_f32':>14}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['backend']:<9}{row['mode']:<9}"
+            f"{row['similarity_top_k'] or '-':>4}{row['sparse_top_k'] or '-':>9}"
+            f"{row['ef_search'] or '-':>5}{row['routing']:>6}{row['quantization'] or '-':>7}"
+            f"{row['hit_rate']:>10.3f}{row['mrr']:>8.3f}"
+            f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+            f"{row['qps']:>9.1f}"
+            + (
+                f"{row['recall_vs_float']:>14.3f}"
+                if row.get("recall_vs_float") is not None else f"{'-':>14}"
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark retrieval quality and latency for TravelSEA Advisor"
+    )
+    parser.add_argument("--config", default="config.yaml", help="Path to configuration file")
+    parser.add_argument(
+        "--ground-truth",
+        default="../data/GT_docs_parsed_gpt-4o.bin",
+        help="Flattened ground-truth questions",
+    )
+    parser.add_argument("--limit", type=int, help="Sample this many questions")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the question sample")
+    parser.add_argument(
+        "--backends", nargs="+", choices=["postgres", "memory"],
+        help="Vector store backends (defaults to vector_store.backend)",
+    )
+    parser.add_argument(
+        "--modes", nargs="+", default=["default", "sparse", "hybrid"],
+        choices=["default", "sparse", "hybrid"],
+    )
+    parser.add_argument("--similarity-top-k", nargs="+", type=int, default=[2, 4])
+    parser.add_argument("--sparse-top-k", nargs="+", type=int, default=[4])
+    parser.add_argument(
+        "--ef-search", nargs="+", type=int, default=[None],
+        help="hnsw.ef_search values to sweep (postgres backend)",
+    )
+    parser.add_argument(
+        "--routing", nargs="+", choices=["off", "on"], default=["off"],
+        help="Run each configuration without and/or with country routing",
+    )
+    parser.add_argument(
+        "--quantization", nargs="+", choices=["none", "int8", "binary"],
+        help="Dense vector quantizations to sweep (memory backend; "
+        "defaults to vector_store.quantization)",
+    )
+    parser.add_argument("--rescore-multiplier", type=int, help="Candidates rescored per result")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed queries per configuration")
+    parser.add_argument("--output-dir", default="../data/benchmarks")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    ground_truth = load_ground_truth(args.ground_truth, args.limit, args.seed)
+    print(f"Loaded {len(ground_truth)} ground-truth questions")
+
+    backends = args.backends or [config.vector_store.backend]
+
+    rows = []
+    float_results = {}
+    embeddings, embed_seconds = None, None
+    for backend in backends:
+        backend_config = config.model_copy(
+            update={
+                "vector_store": config.vector_store.model_copy(update={"backend": backend})
+            }
+        )
+        vectordb = initialize_vector_db(backend_config)
+        if embeddings is None:
+            embeddings, embed_seconds = embed_ground_truth(
+                vectordb.embedding_model, ground_truth
+            )
+
+        # ef_search only applies to pgvector's HNSW index, quantization to the
+        # memory backend; float ("none") runs first as the recall reference.
+        ef_searches = args.ef_search if backend == "postgres" else [None]
+        if backend == "memory":
+            quantizations = sorted(
+                args.quantization or [config.vector_store.quantization],
+                key=lambda q: q != "none",
+            )
+        else:
+            quantizations = [None]
+
+        for quantization in quantizations:
+            if quantization is not None:
+                vectordb.set_quantization(
+                    quantization,
+                    args.rescore_multiplier or config.vector_store.rescore_multiplier,
+                )
+            for retrieval_config in sweep_configurations(
+                args.modes, args.similarity_top_k, args.sparse_top_k, ef_searches
+            ):
+                for routing in args.routing:
+                    kwargs = retriever_kwargs(retrieval_config)
+                    if routing == "on":
+                        retriever = RoutedRetriever(vectordb, **kwargs)
+                    else:
+                        retriever = vectordb.as_retriever(**kwargs)
+                    metrics, retrieved_ids = run_configuration(
+                        retriever, ground_truth, embeddings, args.warmup
+                    )
+
+                    key = (backend, routing, *retrieval_config.values())
+                    row = {
+                        "backend": backend,
+                        **retrieval_config,
+                        "routing": routing,
+                        "quantization": quantization,
+                        **metrics,
+                    }
+                    if quantization is not None:
+                        row["vector_mb"] = vectordb.vector_memory_bytes() / 2**20
+                    if quantization == "none":
+                        float_results[key] = (metrics, retrieved_ids)
+                    elif key in float_results:
+                        reference, reference_ids = float_results[key]
+                        row["recall_vs_float"] = recall_against(reference_ids, retrieved_ids)
+                        row["mrr_delta_vs_float"] = metrics["mrr"] - reference["mrr"]
+                    rows.append(row)
+                    print(
+                        f"{backend} {retrieval_config} routing={routing} "
+                        f"quantization={quantization}: "
+                        f"hit_rate={metrics['hit_rate']:.3f} mrr={metrics['mrr']:.3f} "
+                        f"p95={metrics['p95_ms']:.2f}ms"
+                    )
+
+    print()
+    print_table(rows)
+
+    results = {
+        "created": datetime.now().isoformat(),
+        "ground_truth": args.ground_truth,
+        "queries": len(ground_truth),
+        "seed": args.seed,
+        "embedding_model": config.embedding_model.embed_model_name,
+        "query_embedding_ms": 1000 * embed_seconds if embed_seconds else None,
+        "results": rows,
+    }
+    json_path, csv_path = write_results(results, args.output_dir, "retrieval")
+    print(f"\nResults written to {json_path} and {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""
+generate_ground_truth.py
+
+Generates the ground-truth questions used by the retrieval benchmarks: for
+every chunk the chat model writes a few questions the chunk answers. Chunks are
+read from the per-file chunk cache written by prep.py (or a legacy
+docs_processed.pickle) and keyed on their stable, content-derived document_id;
+the positional ids of the legacy pickle collide across header sections.
+
+Requests run concurrently (bounded by --concurrency) and are retried with
+exponential backoff and jitter on rate limits, timeouts and server errors; a
+rate-limit response pauses every worker for its retry-after time. Each parsed
+answer is appended to a JSONL checkpoint as soon as it arrives, so an
+interrupted run resumes with the document_ids that are still missing; a chunk
+that fails for any reason is reported and retried by the next run. Answers
+are validated while parsing and re-requested when they do not contain a JSON
+list of questions.
+
+Usage:
+    python generate_ground_truth.py [--documents ../data/chunk_cache]
+        [--model gpt-4o] [--concurrency 16] [--limit 100]
+        [--base-url http://localhost:11434/v1/] [--stub]
+
+Writes ../data/GT_docs_<model>.bin (chunks with their raw ground_truth, as
+produced by notebooks/02_generate_ground_truth.ipynb) and
+../data/GT_docs_parsed_<model>.bin (one dict per question, as produced by
+notebooks/03_evaluate_retrieval_options.ipynb).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import random
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from tqdm import tqdm
+
+from utils.chunk_cache import MANIFEST_NAME, ChunkCache
+from utils.process_and_index_documents import assign_chunk_ids
+
+PROMPT_TEMPLATE = """
+You are an AI model assisting in developing a sustainable tourism recommender system for Southeast Asia.
+Your task is to generate 4 questions that a user might ask when planning a trip to this region with a focus on sustainability.
+The questions should be based on the provided record, which contains information from sources like WikiVoyage about travel destinations, ethical travel practices, and sustainable tourism tips.
+
+The record includes:
+
+topic: {metadata}
+text: {content}
+
+Formulate 4 clear and complete questions based on the provided record. These questions should be relevant to sustainable travel and tourism in Southeast Asia and should encourage users to think about ethical and eco-friendly travel options.
+Ensure the questions are varied and concise, using as few words as possible from the original text.
+
+Provide the output in parsable JSON format without using code blocks:
+
+["question1", "question2", ..., "question5"]
+""".strip()
+
+_decoder = json.JSONDecoder()
+
+
+class InvalidAnswer(ValueError):
+    """The model's answer does not contain a JSON list of questions."""
+
+
+def parse_questions(text, min_questions=1):
+    """
+    Extract the list of questions from a model answer.
+
+    Scans the answer for JSON values, so code fences, leading prose or trailing
+    remarks around the list are tolerated. The first list is validated: its
+    items must be non-empty strings, which are stripped and deduplicated.
+
+    Raises:
+        InvalidAnswer: If no valid list with at least min_questions is found.
+    """
+    position = text.find("[")
+    while position != -1:
+        try:
+            value, _ = _decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            position = text.find("[", position + 1)
+            continue
+
+        if isinstance(value, list):
+            if not all(isinstance(item, str) for item in value):
+                raise InvalidAnswer(f"List items are not all strings: {value!r:.200}")
+            questions = list(dict.fromkeys(item.strip() for item in value if item.strip()))
+            if len(questions) < min_questions:
+                raise InvalidAnswer(f"Expected at least {min_questions} questions, got {len(questions)}")
+            return questions
+        position = text.find("[", position + 1)
+
+    raise InvalidAnswer(f"No JSON list in answer: {text!r:.200}")
+
+
+def _retryable_errors():
+    errors = [asyncio.TimeoutError, TimeoutError, ConnectionError]
+    try:
+        import openai
+    except ImportError:
+        return tuple(errors)
+    return tuple(
+        errors
+        + [
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+        ]
+    )
+
+
+def _retry_after(error):
+    """Seconds the server asked us to wait (Retry-After header), if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Checkpoint:
+    """Append-only JSONL record of the finished documents."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = None
+
+    def load(self):
+        """Return {document_id: record} of the finished documents."""
+        records = {}
+        if not self.path.exists():
+            return records
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Line cut short by an interrupted run; it is regenerated
+                    continue
+                records[record["document_id"]] = record
+        return records
+
+    def append(self, record):
+        if self._file is None:
+            self._file = open(self.path, "a+", buffering=1)
+            if self._file.tell():
+                self._file.seek(self._file.tell() - 1)
+                if self._file.read(1) != "\n":
+                    # Terminate a line cut short by an interrupted run
+                    self._file.write("\n")
+        self._file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+class QuestionGenerator:
+    """
+    Sends the ground-truth prompts with bounded concurrency and retries.
+
+    Parameters:
+        client: openai.AsyncOpenAI or utils.stubs.StubChatClient.
+        model (str): Chat model name.
+        concurrency (int): Maximum requests in flight.
+        max_attempts (int): Attempts per document before it is given up.
+        timeout (float): Seconds before a request is abandoned and retried.
+        base_delay (float): First backoff delay in seconds, doubled per attempt.
+        max_delay (float): Upper bound of the backoff delay.
+    """
+
+    def __init__(self, client, model, concurrency=16, max_attempts=6, timeout=60.0,
+                 base_delay=1.0, max_delay=60.0):
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = _retryable_errors()
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "invalid": 0}
+        self._resume_at = 0.0
+
+    def _backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def _wait_for_rate_limit(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _request(self, prompt):
+        await self._wait_for_rate_limit()
+        self.stats["requests"] += 1
+        response = await asyncio.wait_for(
+            self.client.chat.completions.create(
+                model=self.model, messages=[{"role": "user", "content": prompt}]
+            ),
+            self.timeout,
+        )
+        return response.choices[0].message.content or ""
+
+    async def generate(self, doc):
+        """Return the checkpoint record for doc; raises after max_attempts failures."""
+        prompt = PROMPT_TEMPLATE.format(**doc)
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.stats["retries"] += 1
+            try:
+                raw = await self._request(prompt)
+                questions = parse_questions(raw)
+            except InvalidAnswer as e:
+                self.stats["invalid"] += 1
+                last_error = e
+                continue
+            except self.retryable as e:
+                last_error = e
+                delay = _retry_after(e)
+                if delay is not None or type(e).__name__ == "RateLimitError":
+                    # Pause every worker, not only this one, until the limit resets
+                    self.stats["rate_limited"] += 1
+                    delay = delay if delay is not None else self._backoff(attempt)
+                    self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                else:
+                    await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            return {
+                "document_id": doc["metadata"]["document_id"],
+                "model": self.model,
+                "questions": questions,
+                "raw": raw,
+            }
+
+        raise RuntimeError(
+            f"Giving up on {doc['metadata']['document_id']} after "
+            f"{self.max_attempts} attempts: {last_error!r}"
+        )
+
+    async def run(self, documents, checkpoint):
+        """Generate questions for documents, appending each result to checkpoint."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failures = {}
+        progress = tqdm(total=len(documents), desc="Generating questions")
+
+        async def worker(doc):
+            async with semaphore:
+                try:
+                    record = await self.generate(doc)
+                except Exception as e:
+                    # Record the failure and keep going; the next run retries it
+                    failures[doc["metadata"]["document_id"]] = f"{type(e).__name__}: {e}"
+                else:
+                    checkpoint.append(record)
+                progress.update()
+
+        try:
+            await asyncio.gather(*(worker(doc) for doc in documents))
+        finally:
+            progress.close()
+            checkpoint.close()
+        return failures
+
+
+def load_documents(path):
+    """
+    Load the chunk dicts from a chunk cache directory or a pickled list and
+    (re)assign their stable document_ids.
+    """
+    path = Path(path)
+    if (path / MANIFEST_NAME).exists():
+        # Splitter params only matter for freshness checks, not for reading
+        cache = ChunkCache(path, splitter_params={})
+        documents = list(cache.iter_documents(sorted(cache.manifest["files"])))
+    else:
+        with open(path, "rb") as f:
+            documents = pickle.load(f)
+    return assign_chunk_ids(documents)
+
+
+def unique_documents(documents):
+    """Drop the chunks whose document_id was already seen, with a warning."""
+    unique, seen, colliding = [], set(), set()
+    for doc in documents:
+        document_id = doc["metadata"]["document_id"]
+        if document_id in seen:
+            colliding.add(document_id)
+            continue
+        seen.add(document_id)
+        unique.append(doc)
+    if colliding:
+        print(f"Warning: skipping {len(documents) - len(unique)} chunks with "
+              f"{len(colliding)} colliding document_ids")
+    return unique
+
+
+def build_outputs(documents, records):
+    """
+    Join the records with their chunks into the notebook formats: the chunks
+    with ground_truth (JSON string of the questions) and the flattened list with
+    one dict per question.
+    """
+    ground_truth, flattened = [], []
+    for doc in documents:
+        record = records.get(doc["metadata"]["document_id"])
+        if record is None:
+            continue
+        ground_truth.append({**doc, "ground_truth": json.dumps(record["questions"])})
+        flattened_doc = {**doc["metadata"], "content": doc["content"]}
+        for question in record["questions"]:
+            flattened.append({**flattened_doc, "question": question})
+    return ground_truth, flattened
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate ground-truth questions for TravelSEA Advisor"
+    )
+    parser.add_argument(
+        "--documents",
+        default="../data/chunk_cache",
+        help="Chunk cache directory or legacy docs_processed.pickle",
+    )
+    parser.add_argument("--output-dir", default="../data")
+    parser.add_argument("--model", default="gpt-4o", help="Chat model name")
+    parser.add_argument(
+        "--base-url", help="OpenAI-compatible endpoint, e.g. http://localhost:11434/v1/ for ollama"
+    )
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument("--max-attempts", type=int, default=6, help="Attempts per chunk")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds per request")
+    parser.add_argument("--limit", type=int, help="Only the first N chunks")
+    parser.add_argument(
+        "--checkpoint",
+        help="Checkpoint file (defaults to <output-dir>/ground_truth_checkpoint_<model>.jsonl)",
+    )
+    parser.add_argument(
+        "--stub", action="store_true", help="Use the offline stub model instead of the API"
+    )
+    args = parser.parse_args()
+
+    documents = unique_documents(load_documents(args.documents))
+    if args.limit:
+        documents = documents[: args.limit]
+
+    if args.stub:
+        from utils.stubs import StubChatClient
+
+        client = StubChatClient(latency=0.05)
+    else:
+        from openai import AsyncOpenAI
+
+        load_dotenv()
+        # Retries are handled here, with a shared rate-limit pause
+        client = AsyncOpenAI(
+            base_url=args.base_url,
+            api_key=os.getenv("OPENAI_API_KEY") or ("ollama" if args.base_url else None),
+            max_retries=0,
+        )
+
+    output_dir = Path(args.output_dir)
+    checkpoint = Checkpoint(
+        args.checkpoint or output_dir / f"ground_truth_checkpoint_{args.model}.jsonl"
+    )
+    records = checkpoint.load()
+    pending = [doc for doc in documents if doc["metadata"]["document_id"] not in records]
+    print(f"{len(documents)} chunks, {len(records)} already in {checkpoint.path}, "
+          f"{len(pending)} to generate")
+
+    generator = QuestionGenerator(
+        client, args.model, args.concurrency, args.max_attempts, args.timeout
+    )
+    start = time.perf_counter()
+    failures = asyncio.run(generator.run(pending, checkpoint))
+    elapsed = time.perf_counter() - start
+    print(
+        f"Generated {len(pending) - len(failures)} chunks in {elapsed:.1f}s "
+        f"({generator.stats['requests']} requests, {generator.stats['retries']} retries, "
+        f"{generator.stats['rate_limited']} rate limited, "
+        f"{generator.stats['invalid']} invalid answers)"
+    )
+    for document_id, error in failures.items():
+        print(f"  failed {document_id}: {error}")
+    if failures:
+        print(f"{len(failures)} chunks failed; rerun to retry them")
+
+    ground_truth, flattened = build_outputs(documents, checkpoint.load())
+    ground_truth_path = output_dir / f"GT_docs_{args.model}.bin"
+    parsed_path = output_dir / f"GT_docs_parsed_{args.model}.bin"
+    with open(ground_truth_path, "wb") as f:
+        pickle.dump(ground_truth, f)
+    with open(parsed_path, "wb") as f:
+        pickle.dump(flattened, f)
+    print(f"Wrote {len(ground_truth)} chunks to {ground_truth_path} and "
+          f"{len(flattened)} questions to {parsed_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+loadtest.py
+
+Load-testing harness for the RAG pipeline. Replays questions from a JSONL
+request log (or samples them from the ground truth) through get_rag_response
+at a fixed concurrency or a Poisson arrival rate, with a deterministic stub
+LLM in place of OpenAI, and reports throughput, per-stage latency histograms,
+error rates and the saturation point of the sweep.
+
+By default retrieval runs against an in-memory index of data/docs_processed.pickle
+embedded with the hashing stub, so the test runs fully offline. Use
+--backend config to load the configured vector store and embedding model instead.
+
+Usage:
+    python loadtest.py [--requests-log requests.jsonl] [--concurrency 1 2 4 8 16]
+    python loadtest.py --rate 5 10 20 40 --duration 30 --llm-latency 0.8
+"""
+
+import argparse
+import json
+import pickle
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from utils.config import load_config
+from utils.evaluation import latency_summary, load_ground_truth
+from utils.memory_storage import InMemoryVectorDB
+from utils.query_router import QueryRouter, RoutedRetriever
+from utils.rag import get_rag_response
+from utils.resources import initialize_context_packer, initialize_vector_db
+from utils.response_cache import ResponseCache
+from utils.stubs import HashingEmbedding, StubLLM
+
+STAGES = ["embed", "retrieve", "generate", "total"]
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf")]
+
+_stage_times = threading.local()
+
+
+def _record_stage(stage, seconds):
+    timings = getattr(_stage_times, "timings", None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class _TimedEmbedding:
+    """Forwards query embedding to the model and records the time spent."""
+
+    def __init__(self, embed_model):
+        self._embed_model = embed_model
+
+    def get_query_embedding(self, query):
+        start = time.perf_counter()
+        try:
+            return self._embed_model.get_query_embedding(query)
+        finally:
+            _record_stage("embed", time.perf_counter() - start)
+
+
+class _TimedRetriever:
+    """Forwards retrieval to the retriever and records the time spent."""
+
+    def __init__(self, retriever):
+        self._retriever = retriever
+
+    def retrieve(self, query):
+        start = time.perf_counter()
+        try:
+            return self._retriever.retrieve(query)
+        finally:
+            _record_stage("retrieve", time.perf_counter() - start)
+
+
+class _TimedLLM:
+    """Forwards generation to the LLM and records the time spent."""
+
+    def __init__(self, llm):
+        self._llm = llm
+
+    def predict(self, prompt):
+        start = time.perf_counter()
+        try:
+            return self._llm.predict(prompt)
+        finally:
+            _record_stage("generate", time.perf_counter() - start)
+
+
+def load_questions(requests_log=None, ground_truth=None, limit=None, seed=42):
+    """
+    Read questions from a JSONL request log (objects with a "question" or
+    "query" field, or bare JSON strings) or sample them from the ground truth.
+    """
+    if requests_log:
+        questions = []
+        with open(requests_log, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    questions.append(record)
+                elif record.get("question") or record.get("query"):
+                    questions.append(record.get("question") or record.get("query"))
+        if not questions:
+            raise ValueError(f"No questions found in {requests_log}")
+        return questions[:limit] if limit else questions
+
+    return [gt["question"] for gt in load_ground_truth(ground_truth, limit, seed)]
+
+
+def build_offline_vectordb(documents_path, embed_dim):
+    """Index the processed documents in memory with the hashing stub embedding."""
+    with open(documents_path, "rb") as f:
+        documents = pickle.load(f)
+
+    vectordb = InMemoryVectorDB(None, embed_dim=embed_dim)
+    vectordb.build_index(HashingEmbedding(embed_dim=embed_dim), load=False)
+    vectordb.add_documents(documents)
+    return vectordb
+
+
+def histogram(latencies):
+    """Count latencies (seconds) per bucket, keyed by the bucket's upper bound in ms."""
+    labels = ["+inf" if bound == float("inf") else f"<={bound}" for bound in BUCKETS_MS]
+    counts = dict.fromkeys(labels, 0)
+    for latency in latencies:
+        ms = latency * 1000
+        index = next(i for i, bound in enumerate(BUCKETS_MS) if ms <= bound)
+        counts[labels[index]] += 1
+    return counts
+
+
+class LoadTest:
+    """Runs questions through get_rag_response and collects per-request results."""
+
+    def __init__(self, questions, retriever, llm, embed_model, response_cache=None,
+                 context_packer=None):
+        self.questions = questions
+        self.context_packer = context_packer
+        self.retriever = _TimedRetriever(retriever)
+        self.llm = _TimedLLM(llm)
+        self.embed_model = _TimedEmbedding(embed_model)
+        self.response_cache = response_cache
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _next_question(self):
+        with self._lock:
+            question = self.questions[self._next % len(self.questions)]
+            self._next += 1
+        return question
+
+    def _request(self, question, scheduled=None):
+        _stage_times.timings = {}
+        start = time.perf_counter()
+        error = None
+        try:
+            get_rag_response(
+                question,
+                self.retriever,
+                self.llm,
+                response_cache=self.response_cache,
+                embed_model=self.embed_model,
+                context_packer=self.context_packer,
+            )
+        except Exception as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+
+        # Without a response cache the retriever embeds the query itself, so
+        # embedding time is part of the retrieve stage.
+        timings = _stage_times.timings
+        _stage_times.timings = None
+        # In open-loop runs latency is measured from the scheduled arrival, so
+        # time spent queued behind busy workers is counted.
+        timings["total"] = finished - (scheduled if scheduled is not None else start)
+        if scheduled is not None:
+            timings["queue"] = start - scheduled
+        return {"timings": timings, "error": error, "finished": finished}
+
+    def run_closed(self, concurrency, num_requests):
+        """Each of concurrency workers sends requests back to back."""
+        results = []
+        results_lock = threading.Lock()
+        remaining = iter(range(num_requests))
+        remaining_lock = threading.Lock()
+
+        def worker():
+            while True:
+                with remaining_lock:
+                    if next(remaining, None) is None:
+                        return
+                result = self._request(self._next_question())
+                with results_lock:
+                    results.append(result)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - start
+
+    def run_open(self, rate, duration, max_in_flight, seed=42):
+        """Send requests with exponential inter-arrival times at rate per second."""
+        rng = random.Random(seed)
+        futures = []
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            start = time.perf_counter()
+            scheduled = start
+            while scheduled - start < duration:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self._request, self._next_question(), scheduled))
+                scheduled += rng.expovariate(rate)
+            results = [future.result() for future in futures]
+        return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed, level):
+    """Aggregate one load level: throughput, errors and per-stage latencies."""
+    errors = Counter(result["error"] for result in results if result["error"])
+    ok = [result for result in results if not result["error"]]
+
+    stage_latencies = defaultdict(list)
+    for result in ok:
+        for stage, seconds in result["timings"].items():
+            stage_latencies[stage].append(seconds)
+
+    return {
+        **level,
+        "requests": len(results),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "errors": dict(errors),
+        "stages": {
+            stage: {
+                **latency_summary(latencies),
+                "histogram": histogram(latencies),
+            }
+            for stage, latencies in stage_latencies.items()
+        },
+    }
+
+
+def find_saturation(levels, min_gain=0.1):
+    """
+    Return the first load level past which throughput stops growing: adding
+    load raises throughput by less than min_gain (relative) or, for arrival
+    rates, the service completes noticeably fewer requests than offered.
+    """
+    for previous, current in zip(levels, levels[1:]):
+        offered = current.get("rate")
+        if offered and current["throughput_rps"] < (1 - min_gain) * offered:
+            return previous
+        if current["throughput_rps"] < (1 + min_gain) * previous["throughput_rps"]:
+            return previous
+    return None
+
+
+def print_level(summary):
+    level = (
+        f"rate={summary['rate']}/s" if summary.get("rate") else
+        f"concurrency={summary['concurrency']}"
+    )
+    total = summary["stages"].get("total", {})
+    print(
+        f"{level:<18} {summary['throughput_rps']:>7.2f} req/s  "
+        f"p50={total.get('p50_ms') or 0:>8.1f}ms  p95={total.get('p95_ms') or 0:>8.1f}ms  "
+        f"p99={total.get('p99_ms') or 0:>8.1f}ms  errors={summary['error_rate']:.1%}"
+    )
+    for stage in STAGES[:-1] + ["queue"]:
+        if stage in summary["stages"]:
+            stats = summary["stages"][stage]
+            print(
+                f"{'':<18} {stage:<9} p50={stats['p50_ms']:>8.1f}ms  "
+                f"p95={stats['p95_ms']:>8.1f}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the TravelSEA RAG pipeline")
+    parser.add_argument("--config", default="config.yaml", help="Path to configuration file")
+    parser.add_argument("--requests-log", help="JSONL file with one question per line")
+    parser.add_argument(
+        "--ground-truth",
+        default="../data/GT_docs_parsed_gpt-4o.bin",
+        help="Sample questions from here when no request log is given",
+    )
+    parser.add_argument("--num-questions", type=int, default=1000)
+    parser.add_argument(
+        "--backend",
+        choices=["offline", "config"],
+        default="offline",
+        help="offline: in-memory index with the hashing stub embedding; "
+        "config: the vector store and embedding model from the config",
+    )
+    parser.add_argument("--documents", default="../data/docs_processed.pickle")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument(
+        "--rate", nargs="+", type=float,
+        help="Poisson arrival rates (req/s) to sweep instead of fixed concurrency",
+    )
+    parser.add_argument("--requests-per-level", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per rate level")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Stub LLM latency (s)")
+    parser.add_argument(
+        "--response-cache", action="store_true", help="Enable the answer cache"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", default="../data/load_tests")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    questions = load_questions(
+        args.requests_log, args.ground_truth, args.num_questions, args.seed
+    )
+    print(f"Loaded {len(questions)} questions")
+
+    if args.backend == "offline":
+        vectordb = build_offline_vectordb(args.documents, config.embedding_model.embed_dim)
+    else:
+        vectordb = initialize_vector_db(config)
+
+    retrieval_config = config.retrieval
+    retriever_kwargs = dict(
+        vector_store_query_mode=retrieval_config.query_mode,
+        similarity_top_k=retrieval_config.similarity_top_k,
+        sparse_top_k=retrieval_config.sparse_top_k,
+    )
+    if retrieval_config.routing:
+        retriever = RoutedRetriever(
+            vectordb,
+            include_general_guides=retrieval_config.routing_include_general_guides,
+            **retriever_kwargs,
+        )
+    else:
+        retriever = vectordb.as_retriever(**retriever_kwargs)
+    llm = StubLLM(latency=args.llm_latency)
+
+    levels = []
+    for level in (
+        [{"rate": rate} for rate in args.rate] if args.rate
+        else [{"concurrency": c} for c in args.concurrency]
+    ):
+        # A fresh cache per level, so levels do not warm each other up
+        response_cache = None
+        if args.response_cache:
+            cache_config = config.response_cache
+            response_cache = ResponseCache(
+                max_entries=cache_config.max_entries,
+                ttl_seconds=cache_config.ttl_seconds,
+                similarity_threshold=cache_config.similarity_threshold,
+                semantic=cache_config.semantic,
+                scope_fn=QueryRouter().route if cache_config.semantic else None,
+            )
+        load_test = LoadTest(
+            questions, retriever, llm, vectordb.embedding_model, response_cache,
+            context_packer=initialize_context_packer(config.context_packing),
+        )
+
+        if "rate" in level:
+            results, elapsed = load_test.run_open(
+                level["rate"], args.duration, args.max_in_flight, args.seed
+            )
+        else:
+            results, elapsed = load_test.run_closed(
+                level["concurrency"], args.requests_per_level
+            )
+
+        summary = summarize(results, elapsed, level)
+        levels.append(summary)
+        print_level(summary)
+
+    saturation = find_saturation(levels)
+    if saturation is None:
+        print("\nNo saturation within the tested range")
+    else:
+        level = {k: saturation[k] for k in ("rate", "concurrency") if k in saturation}
+        print(
+            f"\nSaturates at {level}: {saturation['throughput_rps']:.2f} req/s; "
+            "more load only adds latency"
+        )
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output_path, "w") as f:
+        json.dump(
+            {
+                "created": datetime.now().isoformat(),
+                "backend": args.backend,
+                "questions": len(questions),
+                "llm_latency": args.llm_latency,
+                "response_cache": args.response_cache,
+                "levels": levels,
+                "saturation": saturation,
+            },
+            f,
+            indent=4,
+        )
+    print(f"Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,69 +3,111 @@ init_vector_db.py
 
 This script initializes the vector database for the TravelSEA Advisor application.
 It processes PDF documents, creates embeddings, and stores them in a PostgreSQL database.
-Processed documents are cached to avoid reprocessing.
+Processed documents are cached per PDF file to avoid reprocessing.
 
 Usage:
-    python prep.py --config config.yaml
+    python prep.py --config config.yaml [--mode rebuild|incremental]
 """
 
 import argparse
-import pickle
+import json
+from functools import cached_property, partial
 from pathlib import Path
 
-import psycopg2
 import yaml
-from langchain_text_splitters import (
-    MarkdownHeaderTextSplitter,
-    RecursiveCharacterTextSplitter,
-)
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from tqdm import tqdm
 
-# from marker.logger import configure_logging
-# from marker.models import load_all_models
+from utils.chunk_cache import ChunkCache, file_hash
+from utils.index_sync import add_content_hashes, embedding_model_id
 from utils.process_and_index_documents import (
+    assign_chunk_ids,
+    convert_pdfs_parallel,
     download_and_process_pdf_file,
     list_pdf_files,
+    load_marker_models,
+    split_markdown_document,
 )
-from utils.vector_storage import PGVectorDB
+
+# psycopg2, the text splitters, the embedding model and the vector store
+# backends are imported where they are first needed: a run that only reads
+# the chunk cache never loads the splitters, a memory-backend run never
+# loads psycopg2.
 
 
 class VectorDBInitializer:
     """Handles the initialization of the vector database."""
 
-    def __init__(self, db_config, processing_config):
+    def __init__(
+        self, db_config, processing_config, embedding_config, cache_config=None,
+        store_config=None,
+    ):
         self.db_config = db_config
         self.processing_config = processing_config
-
-        # Initialize splitters
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=processing_config["chunk_size"],
-            chunk_overlap=processing_config["chunk_overlap"],
+        self.embedding_config = embedding_config
+        self.cache_config = cache_config or {}
+        self.store_config = store_config or {}
+        self.backend = self.store_config.get("backend", "postgres")
+
+        headers_to_split_on = [
+            ("#", "Header 1"),
+            ("##", "Header 2"),
+            ("###", "Header 3"),
+        ]
+        self.splitter_params = {
+            "chunk_size": processing_config["chunk_size"],
+            "chunk_overlap": processing_config["chunk_overlap"],
+            "headers_to_split_on": headers_to_split_on,
+        }
+
+    @cached_property
+    def text_splitter(self):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.splitter_params["chunk_size"],
+            chunk_overlap=self.splitter_params["chunk_overlap"],
         )
 
-        self.markdown_splitter = MarkdownHeaderTextSplitter(
-            headers_to_split_on=[
-                ("#", "Header 1"),
-                ("##", "Header 2"),
-                ("###", "Header 3"),
-            ]
+    @cached_property
+    def markdown_splitter(self):
+        from langchain_text_splitters import MarkdownHeaderTextSplitter
+
+        return MarkdownHeaderTextSplitter(
+            headers_to_split_on=self.splitter_params["headers_to_split_on"]
         )
 
-    def setup_database(self):
-        """Creates a fresh database for vector storage."""
+    def setup_database(self, fresh=True):
+        """
+        Creates the database for vector storage.
+
+        With fresh=True the database is dropped and re-created; otherwise it is
+        only created when it does not exist yet, so existing rows can be synced.
+        """
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
         try:
             conn = psycopg2.connect(
                 host=self.db_config["host"],
                 user=self.db_config["username"],
                 password=self.db_config["password"],
                 database="postgres",
+                connect_timeout=self.db_config.get("pool", {}).get("connect_timeout", 10),
             )
             conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
 
             with conn.cursor() as cursor:
-                cursor.execute(f"DROP DATABASE IF EXISTS {self.db_config['name']}")
+                if fresh:
+                    cursor.execute(f"DROP DATABASE IF EXISTS {self.db_config['name']}")
+                else:
+                    cursor.execute(
+                        "SELECT 1 FROM pg_database WHERE datname = %s",
+                        (self.db_config["name"],),
+                    )
+                    if cursor.fetchone():
+                        print(f"Database {self.db_config['name']} already exists")
+                        conn.close()
+                        return
                 cursor.execute(f"CREATE DATABASE {self.db_config['name']}")
 
             print(f"Database {self.db_config['name']} created successfully")
@@ -75,32 +117,77 @@ class VectorDBInitializer:
             print(f"Database setup failed: {str(e)}")
             raise
 
-    def process_documents(self):
-        """Process all PDF documents or load from cache if available."""
-        cache_path = (
-            Path(self.processing_config["data_directory"]) / "docs_processed.pickle"
-        )
+    def open_chunk_cache(self):
+        """Open the per-file chunk cache, importing the legacy pickle once."""
+        data_directory = self.processing_config["data_directory"]
+        cache = ChunkCache(Path(data_directory) / "chunk_cache", self.splitter_params)
 
-        # Check if cached processed documents exist
-        if cache_path.exists():
-            print("Found cached processed documents. Loading from cache...")
+        # One-time import of the legacy all-in-one pickle cache
+        legacy_cache_path = Path(data_directory) / "docs_processed.pickle"
+        if legacy_cache_path.exists():
             try:
-                with open(cache_path, "rb") as f:
-                    documents = pickle.load(f)
-                print(f"Successfully loaded {len(documents)} documents from cache")
-                return documents
+                cache.import_legacy_pickle(legacy_cache_path, data_directory)
             except Exception as e:
-                print(f"Error loading cached documents: {str(e)}")
-                print("Proceeding with document processing...")
+                print(f"Error importing legacy cache: {str(e)}")
+        return cache
+
+    def process_documents(self):
+        """
+        Process PDF documents, reusing cached chunks for files that did not change.
+
+        Chunks are cached per PDF, keyed by the PDF content hash and the splitter
+        configuration; only missing or stale files are converted again.
+        """
+        data_directory = self.processing_config["data_directory"]
+        cache = self.open_chunk_cache()
 
-        # Process documents if no cache exists or loading cache failed
         try:
-            filenames = list_pdf_files(self.processing_config["data_directory"])
-            print(f"Found {len(filenames)} PDF files to process")
+            filenames = list_pdf_files(data_directory)
+            stale_filenames = cache.stale_files(filenames, data_directory)
+            print(
+                f"Found {len(filenames)} PDF files, "
+                f"{len(stale_filenames)} need processing"
+            )
+
+            if stale_filenames:
+                self._process_stale_files(stale_filenames, cache)
 
-            configure_logging()
-            model_lst = load_all_models()
-            documents = []
+            documents = list(cache.iter_documents(filenames))
+            print(f"Loaded {len(documents)} document chunks")
+            return documents
+        except Exception as e:
+            print(f"Document processing failed: {str(e)}")
+            raise
+
+    def _process_stale_files(self, filenames, cache):
+        """Convert and split the given PDFs and store their chunks in the cache."""
+        data_directory = self.processing_config["data_directory"]
+        num_workers = self.processing_config.get("num_workers", 1)
+
+        if num_workers > 1:
+            failed = []
+            for filename, mdfile, error in tqdm(
+                convert_pdfs_parallel(filenames, data_directory, num_workers),
+                total=len(filenames),
+                desc="Processing documents",
+            ):
+                if error:
+                    print(f"Failed to process {filename}: {error}")
+                    failed.append(filename)
+                    continue
+
+                cache.write(
+                    filename,
+                    file_hash(Path(data_directory) / filename),
+                    split_markdown_document(
+                        filename, mdfile, self.text_splitter, self.markdown_splitter
+                    ),
+                )
+
+            if failed:
+                print(f"{len(failed)} file(s) failed to process: {failed}")
+        else:
+            model_lst = load_marker_models()
 
             for filename in tqdm(filenames, desc="Processing documents"):
                 print(f"Processing file: {filename}")
@@ -109,55 +196,232 @@ class VectorDBInitializer:
                     self.text_splitter,
                     self.markdown_splitter,
                     model_lst,
-                    reference_folder=self.processing_config["data_directory"],
+                    reference_folder=data_directory,
+                )
+                cache.write(
+                    filename, file_hash(Path(data_directory) / filename), splitted_doc
                 )
-                documents.extend(splitted_doc)
 
-            # Cache the processed documents
-            print("Caching processed documents...")
-            try:
-                with open(cache_path, "wb") as f:
-                    pickle.dump(documents, f)
-                print("Successfully cached processed documents")
-            except Exception as e:
-                print(f"Error caching documents: {str(e)}")
+    def create_vector_db(self, fresh=False):
+        """Connect to the configured vector store and attach the embedding model."""
+        if self.backend == "memory":
+            from utils.memory_storage import InMemoryVectorDB
 
-            return documents
-        except Exception as e:
-            print(f"Document processing failed: {str(e)}")
-            raise
+            vectordb = InMemoryVectorDB(
+                self.store_config["memory_path"],
+                embed_dim=self.embedding_config["embed_dim"],
+            )
+            vectordb.build_index(self.create_embedding_model(), load=not fresh)
+            return vectordb
+
+        from utils.vector_storage import PGVectorDB
+
+        vectordb = PGVectorDB(
+            self.db_config["name"],
+            self.db_config["host"],
+            self.db_config["password"],
+            self.db_config["username"],
+            self.db_config["port"],
+            self.db_config["table_name"],
+            ann_config=self.db_config.get("ann_index"),
+            pool_config=self.db_config.get("pool"),
+        )
+
+        vectordb.build_index(self.create_embedding_model())
+
+        return vectordb
+
+    def create_embedding_model(self):
+        """Create the embedding model, behind the embedding cache if enabled."""
+        embedding_config = self.embedding_config
+        model_name = embedding_config["embed_model_name"]
+        embed_batch_size = embedding_config.get("batch_size", 32)
+
+        def build():
+            from utils.embedding_backends import create_embedding_model
+
+            return create_embedding_model(
+                model_name,
+                backend=embedding_config.get("backend", "huggingface"),
+                num_threads=embedding_config.get("num_threads"),
+                batch_size=embed_batch_size,
+                max_length=embedding_config.get("max_length", 512),
+                onnx_dir=embedding_config.get("onnx_path", "../data/onnx"),
+            )
+
+        if not self.cache_config.get("enabled", False):
+            return build()
+
+        from utils.embedding_cache import create_cached_embedding
+
+        return create_cached_embedding(
+            model_name,
+            embedding_config["embed_dim"],
+            build,
+            directory=self.cache_config["directory"],
+            backend=embedding_config.get("backend", "huggingface"),
+            dtype=self.cache_config.get("dtype", "float16"),
+            max_entries=self.cache_config.get("max_entries", 200000),
+            embed_batch_size=embed_batch_size,
+        )
+
+    def add_content_hashes(self, documents):
+        """Tag every chunk with a hash of its content and processing parameters."""
+        # Vectors of another backend (e.g. int8) differ, so it is part of the hash
+        return add_content_hashes(
+            documents,
+            self.splitter_params,
+            embedding_model_id(
+                self.embedding_config["embed_model_name"],
+                self.embedding_config.get("backend", "huggingface"),
+            ),
+        )
+
+    def create_deduplicator(self):
+        """Chunk deduplicator configured by processing.dedup, or None when disabled."""
+        dedup_config = self.processing_config.get("dedup") or {}
+        if not dedup_config.get("enabled", False):
+            return None
+
+        from utils.dedup import ChunkDeduplicator
+
+        return ChunkDeduplicator(
+            threshold=dedup_config.get("threshold", 0.85),
+            num_perm=dedup_config.get("num_perm", 128),
+            bands=dedup_config.get("bands", 16),
+            shingle_size=dedup_config.get("shingle_size", 5),
+            scope=dedup_config.get("scope", "corpus"),
+        )
+
+    def prepare_chunks(self, documents, deduplicator=None):
+        """Assign stable ids, drop duplicate chunks and add content hashes."""
+        documents = assign_chunk_ids(documents)
+        if deduplicator is not None:
+            documents = list(deduplicator.filter(documents))
+        return self.add_content_hashes(documents)
+
+    def report_duplicates(self, deduplicator):
+        """Print dedup statistics and write the dropped chunk ids with their canonical chunk."""
+        if deduplicator is None:
+            return
+
+        stats = deduplicator.stats()
+        print(
+            "Deduplication: {chunks} chunks, {kept} kept, {exact} exact and "
+            "{near} near duplicates dropped ({cross_pdf} across PDFs, "
+            "{dropped_chars} characters)".format(**stats)
+        )
+        path = Path(self.processing_config["data_directory"]) / "chunk_cache" / "duplicates.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"stats": stats, "duplicates": deduplicator.duplicates}, f, indent=2)
+        print(f"Duplicate chunk ids written to {path}")
 
     def initialize_vector_db(self, documents):
         """Initialize and populate the vector database."""
         try:
-            vectordb = PGVectorDB(
-                self.db_config["name"],
-                self.db_config["host"],
-                self.db_config["password"],
-                self.db_config["username"],
-                self.db_config["port"],
-                self.db_config["table_name"],
-            )
+            vectordb = self.create_vector_db(fresh=True)
 
-            embedding_model = HuggingFaceEmbedding(
-                model_name=self.processing_config["embedding_model_name"]
+            deduplicator = self.create_deduplicator()
+            vectordb.add_documents(
+                self.prepare_chunks(documents, deduplicator),
+                batch_size=self.processing_config.get("insert_batch_size", 256),
             )
-            vectordb.build_index(embedding_model)
-
-            for doc in tqdm(documents, desc="Adding documents to vector DB"):
-                vectordb.add_document(doc)
+            self.report_duplicates(deduplicator)
+            if self.backend == "memory":
+                vectordb.save()
+            else:
+                # ANN indexes are built once after the bulk load, not maintained per row
+                vectordb.build_search_indexes()
+                self.print_index_status(vectordb)
 
             print("Vector database initialization completed successfully")
         except Exception as e:
             print(f"Vector database initialization failed: {str(e)}")
             raise
 
+    @staticmethod
+    def print_index_status(vectordb):
+        """Print the indexes on the vector table with their size and scan count."""
+        print("Index status:")
+        for index in vectordb.index_status():
+            print(f"  {index['name']} ({index['size']}, {index['scans']} scans)")
+            print(f"    {index['definition']}")
+
+    def ingest(self, fresh=True):
+        """
+        Convert, chunk, embed and insert the PDFs as one streaming pipeline
+        (see utils/ingestion_pipeline.py), instead of processing the whole
+        corpus before embedding starts. fresh=False syncs incrementally.
+        """
+        from utils.ingestion_pipeline import ingest_pdfs
+
+        data_directory = self.processing_config["data_directory"]
+        try:
+            vectordb = self.create_vector_db(fresh=fresh)
+            deduplicator = self.create_deduplicator()
+            summary = ingest_pdfs(
+                vectordb,
+                list_pdf_files(data_directory),
+                data_directory,
+                self.open_chunk_cache(),
+                self.text_splitter,
+                self.markdown_splitter,
+                partial(self.prepare_chunks, deduplicator=deduplicator),
+                incremental=not fresh,
+                num_workers=self.processing_config.get("num_workers", 1),
+                batch_size=self.processing_config.get("insert_batch_size", 256),
+                queue_size=self.processing_config.get("queue_size", 4),
+            )
+            self.report_duplicates(deduplicator)
+            if self.backend == "memory":
+                vectordb.save()
+            else:
+                # ANN indexes are built once after the bulk load, not maintained per row
+                vectordb.build_search_indexes()
+                self.print_index_status(vectordb)
+
+            print("Vector database ingestion completed successfully")
+            return summary
+        except Exception as e:
+            print(f"Vector database ingestion failed: {str(e)}")
+            raise
+
+    def sync_vector_db(self, documents):
+        """Embed and upsert only new or changed chunks and delete orphaned ones."""
+        try:
+            vectordb = self.create_vector_db()
+
+            deduplicator = self.create_deduplicator()
+            summary = vectordb.sync_documents(
+                self.prepare_chunks(documents, deduplicator),
+                batch_size=self.processing_config.get("insert_batch_size", 256),
+            )
+            self.report_duplicates(deduplicator)
+            if self.backend == "memory":
+                vectordb.save()
+            else:
+                vectordb.build_search_indexes()
+                self.print_index_status(vectordb)
+
+            print("Vector database sync completed successfully")
+            return summary
+        except Exception as e:
+            print(f"Vector database sync failed: {str(e)}")
+            raise
+
 
 def load_config(config_path):
     """Load configuration from YAML file."""
     with open(config_path, "r") as f:
         config = yaml.safe_load(f)
-    return config["database"], config["processing"]
+    return (
+        config["database"],
+        config["processing"],
+        config["embedding_model"],
+        config.get("embedding_cache"),
+        config.get("vector_store"),
+    )
 
 
 def main():
@@ -165,26 +429,48 @@ def main():
         description="Initialize vector database for TravelSEA Advisor"
     )
     parser.add_argument("--config", required=True, help="Path to configuration file")
+    parser.add_argument(
+        "--mode",
+        choices=["rebuild", "incremental"],
+        help="Drop and rebuild the database, or only sync changed chunks "
+        "(defaults to processing.sync_mode in the config)",
+    )
     args = parser.parse_args()
 
     try:
         # Load configuration
-        db_config, processing_config = load_config(args.config)
+        (
+            db_config, processing_config, embedding_config, cache_config, store_config
+        ) = load_config(args.config)
+
+        mode = args.mode or processing_config.get("sync_mode", "rebuild")
 
         # Initialize and run the database setup
-        initializer = VectorDBInitializer(db_config, processing_config)
+        initializer = VectorDBInitializer(
+            db_config, processing_config, embedding_config, cache_config, store_config
+        )
 
-        # Setup fresh database
+        # Setup fresh database, or keep the existing one when syncing
         print("Setting up database...")
-        initializer.setup_database()
+        if initializer.backend == "postgres":
+            initializer.setup_database(fresh=mode == "rebuild")
+
+        if processing_config.get("streaming", False):
+            print("Running streaming ingestion pipeline...")
+            initializer.ingest(fresh=mode == "rebuild")
+            return
 
         # Process documents or load from cache
         print("Starting document processing or loading from cache...")
         documents = initializer.process_documents()
 
         # Initialize vector database
-        print("Initializing vector database...")
-        initializer.initialize_vector_db(documents)
+        if mode == "incremental":
+            print("Syncing vector database...")
+            initializer.sync_vector_db(documents)
+        else:
+            print("Initializing vector database...")
+            initializer.initialize_vector_db(documents)
 
         print("Vector database initialization completed successfully")
 
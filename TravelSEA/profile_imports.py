@@ -0,0 +1,140 @@
+"""
+profile_imports.py
+
+Measures the import cost of the TravelSEA entry points.
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+and the self and cumulative time of every imported module is reported, both
+per module and aggregated per top-level package. Cold start is the median
+wall time of importing the module in a fresh interpreter, minus the median
+startup time of a bare interpreter.
+
+With --check the script exits with status 1 when a module's cold start is
+over its budget (startup.budget_ms in the config), so it can gate CI.
+
+Usage:
+    python profile_imports.py --config config.yaml [--modules TravelSEA_app prep]
+        [--repeat 5] [--top 20] [--check] [--budget-ms 1500]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from utils.config import load_config
+
+ROOT = Path(__file__).parent
+
+
+def _run_import(module, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", f"import {module}" if module else "pass"]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip()}")
+    return elapsed, result.stderr
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into dicts with module, self_ms and
+    cumulative_ms, and depth (nesting level in the import tree).
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        entries.append(
+            {
+                "module": name.strip(),
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            }
+        )
+    return entries
+
+
+def package_totals(entries):
+    """Self time summed per top-level package, slowest first."""
+    totals = defaultdict(float)
+    for entry in entries:
+        totals[entry["module"].split(".", 1)[0]] += entry["self_ms"]
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def cold_start_ms(module, repeat):
+    """Median import time of module in a fresh interpreter, net of interpreter startup."""
+    baseline = statistics.median(_run_import(None)[0] for _ in range(repeat))
+    total = statistics.median(_run_import(module)[0] for _ in range(repeat))
+    return 1000 * max(total - baseline, 0.0)
+
+
+def print_profile(module, entries, top):
+    total = sum(entry["self_ms"] for entry in entries)
+    print(f"\n{module}: {len(entries)} modules imported, {total:.1f} ms import time")
+
+    print(f"  {'package':<40} {'self ms':>10} {'share':>7}")
+    for package, self_ms in package_totals(entries)[:top]:
+        print(f"  {package:<40} {self_ms:>10.1f} {self_ms / total:>7.1%}")
+
+    print(f"\n  {'module':<50} {'self ms':>10} {'cumul. ms':>10}")
+    for entry in sorted(entries, key=lambda e: -e["self_ms"])[:top]:
+        print(f"  {entry['module']:<50} {entry['self_ms']:>10.1f} {entry['cumulative_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Profile the import time of the TravelSEA Advisor entry points"
+    )
+    parser.add_argument("--config", default="config.yaml", help="Path to configuration file")
+    parser.add_argument(
+        "--modules", nargs="+",
+        help="Modules to profile (defaults to the modules in startup.budget_ms)",
+    )
+    parser.add_argument("--repeat", type=int, help="Cold starts per module (startup.repeat)")
+    parser.add_argument("--top", type=int, default=20, help="Rows per table")
+    parser.add_argument(
+        "--check", action="store_true", help="Exit with status 1 when a module is over budget"
+    )
+    parser.add_argument("--budget-ms", type=float, help="Budget for every module")
+    args = parser.parse_args()
+
+    startup_config = load_config(args.config).startup
+    modules = args.modules or list(startup_config.budget_ms)
+    repeat = args.repeat or startup_config.repeat
+
+    over_budget = []
+    results = []
+    for module in modules:
+        _, stderr = _run_import(module, importtime=True)
+        print_profile(module, parse_importtime(stderr), args.top)
+
+        elapsed_ms = cold_start_ms(module, repeat)
+        budget_ms = args.budget_ms or startup_config.budget_ms.get(module)
+        results.append((module, elapsed_ms, budget_ms))
+        if budget_ms is not None and elapsed_ms > budget_ms:
+            over_budget.append(module)
+
+    print(f"\nCold start (median of {repeat}, interpreter startup excluded):")
+    for module, elapsed_ms, budget_ms in results:
+        budget = f"budget {budget_ms:.0f} ms" if budget_ms is not None else "no budget"
+        status = "OVER BUDGET" if module in over_budget else "ok"
+        print(f"  {module:<30} {elapsed_ms:>8.1f} ms  ({budget}) {status}")
+
+    if args.check and over_budget:
+        print(f"\nStartup budget exceeded by: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the application modules the way the entry points do (utils.*)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.schema import NodeWithScore, TextNode  # noqa: E402
+
+from api import RAGService  # noqa: E402
+from utils.response_cache import ResponseCache  # noqa: E402
+from utils.stubs import HashingEmbedding, StubLLM  # noqa: E402
+
+
+class FakeRetriever:
+    def retrieve(self, query):
+        return [
+            NodeWithScore(
+                node=TextNode(
+                    text="Hoi An is best explored on foot.",
+                    metadata={"document_id": "abc", "pdf_name": "Vietnam.pdf"},
+                ),
+                score=0.9,
+            )
+        ]
+
+
+def run_service(requests, response_cache=None):
+    llm = StubLLM()
+    service = RAGService(
+        FakeRetriever(), llm, HashingEmbedding(embed_dim=64), response_cache=response_cache
+    )
+
+    async def run():
+        service.start()
+        try:
+            return await asyncio.gather(
+                *(service.handle(method, path, body) for method, path, body in requests)
+            )
+        finally:
+            await service.close()
+
+    return asyncio.run(run()), service, llm
+
+
+def query(question):
+    return "POST", "/query", json.dumps({"question": question}).encode()
+
+
+def test_query_returns_answer_and_sources():
+    [(status, payload)], service, llm = run_service([query("What to see in Hoi An?")])
+    assert status == 200
+    assert payload["answer"].startswith("Stub answer")
+    assert payload["sources"] == [
+        {"document_id": "abc", "pdf_name": "Vietnam.pdf", "score": 0.9}
+    ]
+    assert llm.calls == 1
+
+
+def test_concurrent_queries_are_embedded_in_one_batch():
+    questions = [f"Question number {i}?" for i in range(6)]
+    responses, service, llm = run_service([query(q) for q in questions])
+    assert [status for status, _ in responses] == [200] * 6
+    assert llm.calls == 6
+    assert service.batcher.stats()["batches"] == 1
+
+
+def test_repeated_question_is_served_from_cache():
+    cache = ResponseCache()
+    llm = StubLLM()
+    service = RAGService(FakeRetriever(), llm, HashingEmbedding(embed_dim=64), response_cache=cache)
+
+    async def run():
+        service.start()
+        try:
+            first = await service.handle(*query("Is Hue worth a visit?"))
+            second = await service.handle(*query("Is Hue worth a visit?"))
+            return first, second
+        finally:
+            await service.close()
+
+    (_, first), (_, second) = asyncio.run(run())
+    assert second["cached"] and second["answer"] == first["answer"]
+    assert llm.calls == 1
+
+
+@pytest.mark.parametrize(
+    "request_, status",
+    [
+        (("GET", "/query", b""), 405),
+        (("POST", "/query", b"not json"), 400),
+        (("POST", "/query", b'{"question": " "}'), 400),
+        (("GET", "/nope", b""), 404),
+    ],
+)
+def test_invalid_requests(request_, status):
+    [(got, payload)], _, llm = run_service([request_])
+    assert got == status
+    assert "error" in payload
+    assert llm.calls == 0
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils import tokens
+from utils.context_packing import ContextPacker
+
+TEXT = (
+    "Luang Prabang sits where the Nam Khan meets the Mekong. Alms giving starts at "
+    "dawn on Sakkaline Road; watch quietly and do not photograph the monks up close. "
+    "Kuang Si waterfall is a short ride south and has a bear rescue centre."
+)
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Count with the characters-per-token estimate; tiktoken may need a download
+    monkeypatch.setattr(tokens, "_encoding", lambda model: None)
+
+
+def node(text, score, pdf_name="Laos.pdf"):
+    return SimpleNamespace(text=text, score=score, metadata={"pdf_name": pdf_name})
+
+
+def test_overlapping_chunks_merge_transitively():
+    # a and c only overlap through b, which is retrieved last
+    a, b, c = TEXT[:90], TEXT[60:160], TEXT[130:]
+    packer = ContextPacker(max_tokens=None, min_overlap=20)
+
+    context, stats = packer.pack([node(a, 0.9), node(c, 0.8), node(b, 0.1)])
+
+    assert context == TEXT
+    assert stats["merged_chunks"] == 2
+
+
+def test_other_guides_are_not_merged():
+    packer = ContextPacker(max_tokens=None, min_overlap=20)
+
+    context, stats = packer.pack([node(TEXT, 0.9), node(TEXT, 0.8, "Vietnam.pdf")])
+
+    assert context == TEXT + "\n\n" + TEXT
+    assert stats["merged_chunks"] == 0
+
+
+def test_over_budget_blocks_are_dropped_and_savings_never_negative():
+    packer = ContextPacker(max_tokens=70)
+    saved = []
+
+    context, stats = packer.pack([node(TEXT, 0.9), node("Vientiane " * 40, 0.5)])
+    saved.append(stats["tokens_saved"])
+    assert context == TEXT
+    assert stats["dropped_chunks"] == 1
+
+    # A single block longer than the budget is truncated, never dropped
+    context, stats = packer.pack([node(TEXT * 3, 0.9)])
+    saved.append(stats["tokens_saved"])
+    assert context
+    assert stats["tokens_out"] == 70
+
+    # Per-block token counts can add up to more than the joined text
+    _, stats = packer.pack([node("ab", 0.9, "A.pdf"), node("cd", 0.8, "B.pdf")])
+    saved.append(stats["tokens_saved"])
+    assert stats["tokens_out"] > stats["tokens_in"]
+    assert stats["tokens_saved"] == 0
+
+    cumulative = packer.stats()
+    assert cumulative["tokens_saved"] == sum(saved)
+    assert 0.0 <= cumulative["saved_rate"] <= 1.0
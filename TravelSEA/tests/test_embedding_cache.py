@@ -0,0 +1,104 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("llama_index.core")
+
+from utils.embedding_cache import (  # noqa: E402
+    EmbeddingCache,
+    cache_key,
+    cache_model_id,
+    create_cached_embedding,
+)
+from utils.stubs import HashingEmbedding  # noqa: E402
+
+MODEL = "BAAI/bge-large-en-v1.5"
+
+
+def test_backends_get_separate_keys_and_directories(tmp_path):
+    assert cache_model_id(MODEL) == MODEL
+    ids = {cache_model_id(MODEL, backend) for backend in ("huggingface", "torch_int8", "onnx")}
+    assert len(ids) == 3
+    assert len({cache_key(model_id, "text", "Hanoi") for model_id in ids}) == 3
+
+    reference = EmbeddingCache(tmp_path, cache_model_id(MODEL), 4, max_entries=8)
+    quantized = EmbeddingCache(tmp_path, cache_model_id(MODEL, "torch_int8"), 4, max_entries=8)
+    assert reference.cache_dir != quantized.cache_dir
+
+
+def test_vectors_are_not_shared_across_backends(tmp_path):
+    calls = []
+
+    def factory(backend):
+        def build():
+            calls.append(backend)
+            return HashingEmbedding(embed_dim=8)
+
+        return build
+
+    reference = create_cached_embedding(MODEL, 8, factory("huggingface"), tmp_path)
+    reference.get_text_embedding_batch(["Hoi An old town"])
+
+    quantized = create_cached_embedding(
+        MODEL, 8, factory("torch_int8"), tmp_path, backend="torch_int8"
+    )
+    quantized.get_text_embedding_batch(["Hoi An old town"])
+
+    # The int8 model had to compute the vector instead of reading the float32 one
+    assert calls == ["huggingface", "torch_int8"]
+
+
+def vector(value, dim=4):
+    return np.full(dim, value, dtype=np.float32)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL, 4, max_entries=2)
+    cache.put_many(["a", "b"], [vector(1), vector(2)])
+    cache.get_many(["a"])
+    cache.put_many(["c"], [vector(3)])
+
+    a, b, c = cache.get_many(["a", "b", "c"])
+    assert b is None
+    assert a[0] == 1 and c[0] == 3
+
+
+def test_journal_is_replayed_and_compacted(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL, 4, max_entries=2, compact_ratio=1.5)
+    cache.put_many(["a", "b", "c", "d"], [vector(i) for i in range(4)])
+    cache.flush()
+    journal = cache.cache_dir / "index.log"
+    # Two evictions left four lines for two live entries: compacted on flush
+    assert journal.read_text().count("\n") == 2
+    with open(journal, "a") as f:
+        f.write("e 1")  # line cut short by a crash
+    cache._lock_file.close()
+
+    reopened = EmbeddingCache(tmp_path, MODEL, 4, max_entries=2)
+    a, c, d = reopened.get_many(["a", "c", "d"])
+    assert a is None
+    assert c[0] == 2 and d[0] == 3
+
+
+def test_legacy_json_index_is_imported(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL, 4, max_entries=4)
+    cache.put_many(["a", "b"], [vector(1), vector(2)])
+    cache.flush()
+    cache._lock_file.close()
+    legacy = cache.cache_dir / "index.json"
+    legacy.write_text('{"a": [0, 7], "b": [1, 3]}')
+    (cache.cache_dir / "index.log").unlink()
+
+    reopened = EmbeddingCache(tmp_path, MODEL, 4, max_entries=4)
+    assert not legacy.exists()
+    assert list(reopened._index) == ["b", "a"]
+    assert reopened.get_many(["a"])[0][0] == 1
+
+
+def test_second_process_opens_read_only_with_warning(tmp_path, capsys):
+    EmbeddingCache(tmp_path, MODEL, 4, max_entries=4)
+    reader = EmbeddingCache(tmp_path, MODEL, 4, max_entries=4)
+
+    assert reader.stats()["read_only"]
+    assert "read-only" in capsys.readouterr().out
+    reader.put_many(["a"], [vector(1)])
+    assert reader.get_many(["a"]) == [None]
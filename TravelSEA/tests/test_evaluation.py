@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.evaluation import hit_rate, mrr, relevance  # noqa: E402
+
+
+def node(document_id, legacy_id, pdf_name, text):
+    return SimpleNamespace(
+        metadata={
+            "document_id": document_id,
+            "legacy_document_id": legacy_id,
+            "pdf_name": pdf_name,
+        },
+        text=text,
+    )
+
+
+EXPECTED = {
+    "document_id": "1a2b3c4d5e",  # legacy id
+    "pdf_name": "Vietnam.pdf",
+    "content": "Hoi An is best explored on foot.",
+    "question": "How should I explore Hoi An?",
+}
+
+
+def test_stable_id_matches():
+    expected = {**EXPECTED, "document_id": "0123456789abcdef"}
+    nodes = [node("0123456789abcdef", "1a2b3c4d5e", "Vietnam.pdf", "anything")]
+    assert relevance(nodes, expected) == [True]
+
+
+def test_legacy_id_matches_only_the_same_chunk():
+    nodes = [
+        # Same legacy id (same part index), other section of the same guide
+        node("aaaaaaaaaaaaaaaa", "1a2b3c4d5e", "Vietnam.pdf", "Hue has a citadel."),
+        # Same legacy id and text, other guide
+        node("bbbbbbbbbbbbbbbb", "1a2b3c4d5e", "Laos.pdf", EXPECTED["content"]),
+        node("cccccccccccccccc", "1a2b3c4d5e", "Vietnam.pdf", EXPECTED["content"]),
+    ]
+    assert relevance(nodes, EXPECTED) == [False, False, True]
+
+
+def test_metrics_count_the_collision_free_match():
+    nodes = [
+        node("aaaaaaaaaaaaaaaa", "1a2b3c4d5e", "Vietnam.pdf", "Hue has a citadel."),
+        node("cccccccccccccccc", "1a2b3c4d5e", "Vietnam.pdf", EXPECTED["content"]),
+    ]
+    relevance_total = [relevance(nodes, EXPECTED)]
+    assert hit_rate(relevance_total) == 1.0
+    assert mrr(relevance_total) == 0.5
@@ -0,0 +1,32 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.feedback_log import iter_feedback, migrate_json_feedback
+
+ENTRIES = [{"question": f"q{i}", "feedback": "helpful"} for i in range(20)]
+
+
+def test_migration_runs_once(tmp_path):
+    json_path = tmp_path / "feedback.json"
+    json_path.write_text(json.dumps(ENTRIES))
+    log_path = tmp_path / "feedback" / "feedback.jsonl"
+
+    assert migrate_json_feedback(json_path, log_path) == len(ENTRIES)
+    assert migrate_json_feedback(json_path, log_path) == 0
+    assert not json_path.exists()
+    assert (tmp_path / "feedback.json.migrated").exists()
+    assert len(list(iter_feedback(log_path))) == len(ENTRIES)
+
+
+def test_concurrent_migrations_import_each_entry_once(tmp_path):
+    json_path = tmp_path / "feedback.json"
+    json_path.write_text(json.dumps(ENTRIES))
+    log_path = tmp_path / "feedback.jsonl"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        counts = list(pool.map(lambda _: migrate_json_feedback(json_path, log_path), range(8)))
+
+    assert sorted(counts) == [0] * 7 + [len(ENTRIES)]
+    assert [entry["question"] for entry in iter_feedback(log_path)] == [
+        entry["question"] for entry in ENTRIES
+    ]
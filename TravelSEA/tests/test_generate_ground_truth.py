@@ -0,0 +1,87 @@
+import asyncio
+import pickle
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("tqdm")
+
+from generate_ground_truth import (  # noqa: E402
+    Checkpoint,
+    QuestionGenerator,
+    load_documents,
+    unique_documents,
+)
+from utils.process_and_index_documents import assign_chunk_ids  # noqa: E402
+from utils.stubs import StubChatClient  # noqa: E402
+
+
+def _chunk(content, header, part, document_id=None):
+    return {
+        "metadata": {
+            "document_id": document_id,
+            "pdf_name": "Laos.pdf",
+            "pdf_part": part,
+            "Header 1": header,
+        },
+        "content": content,
+    }
+
+
+def test_load_documents_replaces_colliding_legacy_ids(tmp_path):
+    # Positional ids of the legacy pickle: part 0 of every section collides
+    documents = [
+        _chunk("Vientiane is the capital.", "Vientiane", 0, "aaaa"),
+        _chunk("Luang Prabang has temples.", "Luang Prabang", 0, "aaaa"),
+    ]
+    path = tmp_path / "docs_processed.pickle"
+    with open(path, "wb") as f:
+        pickle.dump(documents, f)
+
+    loaded = load_documents(path)
+
+    ids = [doc["metadata"]["document_id"] for doc in loaded]
+    assert len(set(ids)) == 2
+    assert "aaaa" not in ids
+
+
+def test_unique_documents_skips_colliding_ids(capsys):
+    documents = [
+        _chunk("first", "A", 0, "same"),
+        _chunk("second", "B", 0, "same"),
+        _chunk("third", "C", 1, "other"),
+    ]
+
+    unique = unique_documents(documents)
+
+    assert [doc["content"] for doc in unique] == ["first", "third"]
+    assert "colliding" in capsys.readouterr().out
+
+
+class _FailingCompletions:
+    def __init__(self, completions, fail_on):
+        self._completions = completions
+        self._fail_on = fail_on
+
+    async def create(self, model, messages):
+        if self._fail_on in messages[0]["content"]:
+            raise KeyError("unexpected response shape")
+        return await self._completions.create(model=model, messages=messages)
+
+
+def test_unexpected_error_is_recorded_and_others_finish(tmp_path):
+    client = StubChatClient()
+    client.chat.completions = _FailingCompletions(client.chat.completions, "Luang Prabang")
+    documents = assign_chunk_ids([
+        _chunk("Vientiane is the capital.", "Vientiane", 0),
+        _chunk("Luang Prabang has temples.", "Luang Prabang", 0),
+    ])
+    checkpoint = Checkpoint(tmp_path / "checkpoint.jsonl")
+
+    failures = asyncio.run(QuestionGenerator(client, "stub").run(documents, checkpoint))
+
+    failed_id = documents[1]["metadata"]["document_id"]
+    assert list(failures) == [failed_id]
+    assert failures[failed_id].startswith("KeyError")
+    assert list(checkpoint.load()) == [documents[0]["metadata"]["document_id"]]
+
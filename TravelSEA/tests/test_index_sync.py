@@ -0,0 +1,87 @@
+import pytest
+
+from utils.index_sync import CONTENT_HASH_KEY, sync_vector_db
+
+
+class FakeNode:
+    def __init__(self, document):
+        self.node_id = document["metadata"]["document_id"]
+        self.content_hash = document["metadata"][CONTENT_HASH_KEY]
+
+
+class FakeVectorDB:
+    """Stores node_id -> content hash and records every write transaction."""
+
+    def __init__(self, rows):
+        self.rows = dict(rows)
+        self.transactions = []
+        self.refreshes = 0
+
+    def stored_content_hashes(self):
+        return dict(self.rows)
+
+    def to_node(self, document):
+        return FakeNode(document)
+
+    def embed_nodes(self, nodes):
+        return nodes
+
+    def delete_nodes(self, node_ids, refresh=True):
+        self.transactions.append(("delete", sorted(node_ids), []))
+        for node_id in node_ids:
+            del self.rows[node_id]
+
+    def replace_nodes(self, node_ids, nodes, refresh=True):
+        self.transactions.append(("replace", sorted(node_ids), [n.node_id for n in nodes]))
+        for node_id in node_ids:
+            del self.rows[node_id]
+        for node in nodes:
+            self.rows[node.node_id] = node.content_hash
+
+    def refresh(self):
+        self.refreshes += 1
+
+
+def doc(document_id, content_hash):
+    return {"metadata": {"document_id": document_id, CONTENT_HASH_KEY: content_hash},
+            "content": ""}
+
+
+def test_updated_chunks_are_deleted_in_their_insert_transaction():
+    vectordb = FakeVectorDB({"keep": "h1", "change": "old", "gone": "h3"})
+
+    summary = sync_vector_db(
+        vectordb, [doc("keep", "h1"), doc("change", "new"), doc("add", "h4")], batch_size=1
+    )
+
+    assert summary == {"added": 1, "updated": 1, "removed": 1, "unchanged": 1}
+    assert vectordb.rows == {"keep": "h1", "change": "new", "add": "h4"}
+    assert vectordb.transactions == [
+        ("delete", ["gone"], []),
+        ("replace", [], ["add"]),
+        ("replace", ["change"], ["change"]),
+    ]
+    assert vectordb.refreshes == 1
+
+
+def test_failed_embedding_keeps_the_old_rows():
+    vectordb = FakeVectorDB({"change": "old"})
+
+    def fail(nodes):
+        raise ConnectionError("embedding service down")
+
+    vectordb.embed_nodes = fail
+    with pytest.raises(ConnectionError):
+        sync_vector_db(vectordb, [doc("change", "new")])
+
+    assert vectordb.rows == {"change": "old"}
+
+
+def test_stored_rows_without_hash_are_replaced_not_duplicated():
+    vectordb = FakeVectorDB({"legacy": None})
+
+    summary = sync_vector_db(vectordb, [doc("legacy", "h1")])
+
+    assert summary == {"added": 0, "updated": 1, "removed": 0, "unchanged": 0}
+    assert vectordb.rows == {"legacy": "h1"}
+    assert vectordb.transactions == [("replace", ["legacy"], ["legacy"])]
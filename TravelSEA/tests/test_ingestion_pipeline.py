@@ -0,0 +1,166 @@
+import time
+
+import pytest
+
+pytest.importorskip("tqdm")
+
+from utils.chunk_cache import ChunkCache  # noqa: E402
+from utils.ingestion_pipeline import Pipeline, Stage, file_hash, ingest_pdfs  # noqa: E402
+
+
+def slow_stage(seconds):
+    def run(items):
+        for item in items:
+            time.sleep(seconds)
+            yield item
+
+    return run
+
+
+def test_pipeline_preserves_order_and_overlaps_stages():
+    stages = [Stage(name, slow_stage(0.02)) for name in ("a", "b", "c")]
+    result = Pipeline(stages, queue_size=2, report_interval=None).run(range(10))
+
+    # Serial time would be 3 stages x 10 items x 20 ms
+    assert result["wall_s"] < 0.5
+    assert [stage["units"] for stage in result["stages"]] == [10, 10, 10]
+
+
+def test_pipeline_stage_error_propagates():
+    def fail(items):
+        for item in items:
+            if item == 3:
+                raise ValueError("bad item")
+            yield item
+
+    stages = [Stage("source", slow_stage(0)), Stage("fail", fail), Stage("sink", slow_stage(0))]
+    with pytest.raises(RuntimeError, match="fail"):
+        Pipeline(stages, report_interval=None).run(range(100))
+
+
+class FakeNode:
+    def __init__(self, document):
+        self.node_id = document["metadata"]["document_id"]
+        self.metadata = document["metadata"]
+
+
+class FakeVectorDB:
+    """Records inserts, deletes and refreshes; rows map node_id -> metadata."""
+
+    def __init__(self, rows=None):
+        self.rows = dict(rows or {})
+        self.refreshes = 0
+        self.calls = []
+
+    def to_node(self, document):
+        return FakeNode(document)
+
+    def embed_nodes(self, nodes):
+        return nodes
+
+    def insert_nodes(self, nodes, refresh=True):
+        self.calls.append(("insert", refresh))
+        for node in nodes:
+            self.rows[node.node_id] = node.metadata
+
+    def delete_nodes(self, node_ids, refresh=True):
+        self.calls.append(("delete", refresh))
+        for node_id in node_ids:
+            self.rows.pop(node_id, None)
+
+    def replace_nodes(self, node_ids, nodes, refresh=True):
+        self.calls.append(("replace", refresh))
+        for node_id in node_ids:
+            self.rows.pop(node_id, None)
+        for node in nodes:
+            self.rows[node.node_id] = node.metadata
+
+    def stored_content_hashes(self):
+        return {node_id: metadata.get("content_hash") for node_id, metadata in self.rows.items()}
+
+    def stored_node_ids(self, pdf_names):
+        return [
+            node_id for node_id, metadata in self.rows.items()
+            if metadata.get("pdf_name") in pdf_names
+        ]
+
+    def refresh(self):
+        self.refreshes += 1
+
+
+def chunk(pdf_name, i):
+    return {
+        "metadata": {"document_id": f"{pdf_name}-{i}", "pdf_name": pdf_name, "pdf_part": i},
+        "content": f"chunk {i} of {pdf_name}",
+    }
+
+
+def tag(chunks):
+    for document in chunks:
+        document["metadata"]["content_hash"] = document["content"]
+    return chunks
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    for name in ("A.pdf", "B.pdf"):
+        (tmp_path / name).write_bytes(name.encode())
+    cache = ChunkCache(tmp_path / "chunk_cache", {"chunk_size": 500})
+    return tmp_path, cache
+
+
+def run_ingest(corpus, vectordb, incremental):
+    data_directory, cache = corpus
+    # A.pdf is cached and fresh; B.pdf needs conversion
+    cache.write("A.pdf", file_hash(data_directory / "A.pdf"), [chunk("A.pdf", i) for i in range(5)])
+    return ingest_pdfs(
+        vectordb, ["A.pdf", "B.pdf"], data_directory, cache,
+        text_splitter=None, markdown_splitter=None, prepare_chunks=tag,
+        incremental=incremental, batch_size=2, report_interval=None,
+    )
+
+
+def test_batches_are_inserted_without_refresh_and_refreshed_once(corpus, monkeypatch):
+    monkeypatch.setattr(
+        "utils.ingestion_pipeline.convert_pdfs_parallel",
+        lambda files, directory, workers: iter([("B.pdf", None, "conversion failed")]),
+    )
+    vectordb = FakeVectorDB()
+    summary = run_ingest(corpus, vectordb, incremental=False)
+
+    assert summary["added"] == 5
+    assert len(vectordb.rows) == 5
+    assert all(refresh is False for _, refresh in vectordb.calls)
+    assert vectordb.refreshes == 1
+
+
+def test_failed_file_keeps_its_stored_rows(corpus, monkeypatch):
+    monkeypatch.setattr(
+        "utils.ingestion_pipeline.convert_pdfs_parallel",
+        lambda files, directory, workers: iter([("B.pdf", None, "conversion failed")]),
+    )
+    stored = {
+        "B.pdf-0": {"pdf_name": "B.pdf", "content_hash": "old"},
+        "gone-0": {"pdf_name": "Gone.pdf", "content_hash": "old"},
+    }
+    vectordb = FakeVectorDB(stored)
+    summary = run_ingest(corpus, vectordb, incremental=True)
+
+    assert summary["failed"] == ["B.pdf"]
+    assert summary["removed"] == 1
+    assert "B.pdf-0" in vectordb.rows
+    assert "gone-0" not in vectordb.rows
+
+
+def test_stored_rows_without_hash_are_updated(corpus, monkeypatch):
+    monkeypatch.setattr(
+        "utils.ingestion_pipeline.convert_pdfs_parallel",
+        lambda files, directory, workers: iter([("B.pdf", None, "conversion failed")]),
+    )
+    vectordb = FakeVectorDB({"A.pdf-0": {"pdf_name": "A.pdf"}})
+    summary = run_ingest(corpus, vectordb, incremental=True)
+
+    assert summary["added"] == 4
+    assert summary["updated"] == 1
+    assert vectordb.rows["A.pdf-0"]["content_hash"] == "chunk 0 of A.pdf"
+    assert len(vectordb.rows) == 5
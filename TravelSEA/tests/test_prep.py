@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+
+yaml = pytest.importorskip("yaml")
+pytest.importorskip("tqdm")
+
+from prep import VectorDBInitializer, load_config  # noqa: E402
+from utils.index_sync import CONTENT_HASH_KEY  # noqa: E402
+
+CONFIG_PATH = Path(__file__).resolve().parents[1] / "config.yaml"
+
+
+def initializer(backend):
+    db_config, processing_config, embedding_config, cache_config, store_config = (
+        load_config(CONFIG_PATH)
+    )
+    embedding_config = {**embedding_config, "backend": backend}
+    return VectorDBInitializer(
+        db_config, processing_config, embedding_config, cache_config, store_config
+    )
+
+
+def content_hash(backend):
+    document = {"metadata": {"document_id": "a", "pdf_name": "Laos.pdf"}, "content": "Pakse"}
+    initializer(backend).add_content_hashes([document])
+    return document["metadata"][CONTENT_HASH_KEY]
+
+
+def test_prep_reads_the_embedding_model_section():
+    _, processing_config, embedding_config, _, _ = load_config(CONFIG_PATH)
+
+    assert "embedding_model_name" not in processing_config
+    assert embedding_config["embed_model_name"]
+
+
+def test_content_hash_depends_on_the_embedding_backend():
+    assert content_hash("huggingface") == content_hash("huggingface")
+    assert content_hash("huggingface") != content_hash("torch_int8")
+
+
+def test_new_modes_are_off_by_default():
+    _, processing_config, _, cache_config, _ = load_config(CONFIG_PATH)
+
+    assert processing_config["sync_mode"] == "rebuild"
+    assert not processing_config["streaming"]
+    assert not processing_config["dedup"]["enabled"]
+    assert not cache_config["enabled"]
+
+    with open(CONFIG_PATH) as f:
+        config = yaml.safe_load(f)
+    assert not config["retrieval"]["routing"]
+    assert not config["context_packing"]["enabled"]
+    assert not config["response_cache"]["enabled"]
+    assert not config["response_cache"]["semantic"]
+    assert config["tracing"]["metrics_port"] is None
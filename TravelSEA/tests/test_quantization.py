@@ -0,0 +1,27 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.quantization import Int8Quantizer  # noqa: E402
+
+
+def test_int8_scores_match_the_dequantized_dot_products():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((1000, 64)).astype(np.float32)
+    query = rng.standard_normal(64).astype(np.float32)
+    quantizer = Int8Quantizer().fit(vectors)
+    codes = quantizer.encode(vectors)
+
+    # Block size that does not divide the row count
+    scores = quantizer.scores(codes, query, batch_size=300)
+
+    expected = (codes * quantizer.scale) @ query
+    assert scores.dtype == np.float32
+    np.testing.assert_allclose(scores, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_int8_scores_of_no_vectors():
+    quantizer = Int8Quantizer(scale=np.ones(8, dtype=np.float32))
+    codes = np.empty((0, 8), dtype=np.int8)
+
+    assert quantizer.scores(codes, np.ones(8, dtype=np.float32)).shape == (0,)
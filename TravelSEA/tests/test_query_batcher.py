@@ -0,0 +1,74 @@
+import asyncio
+
+from utils.query_batcher import QueryEmbeddingBatcher, embed_queries
+
+
+class CountingEmbedding:
+    """Embeds a query as [len(query)] and records the size of every batch."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def get_query_embedding_batch(self, queries):
+        if self.fail:
+            raise RuntimeError("embedding failed")
+        self.batches.append(len(queries))
+        return [[float(len(query))] for query in queries]
+
+
+def test_embed_queries_uses_batch_call():
+    model = CountingEmbedding()
+    assert embed_queries(model, ["a", "bb"]) == [[1.0], [2.0]]
+    assert model.batches == [2]
+
+
+def test_concurrent_queries_share_a_batch():
+    model = CountingEmbedding()
+    queries = [f"question {'x' * i}" for i in range(8)]
+
+    async def run():
+        batcher = QueryEmbeddingBatcher(model, max_batch_size=16, max_wait_ms=50)
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.embed(q) for q in queries)), batcher.stats()
+        finally:
+            await batcher.close()
+
+    vectors, stats = asyncio.run(run())
+    assert vectors == [[float(len(q))] for q in queries]
+    assert model.batches == [8]
+    assert stats["batches"] == 1 and stats["queries"] == 8
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = CountingEmbedding()
+
+    async def run():
+        batcher = QueryEmbeddingBatcher(model, max_batch_size=3, max_wait_ms=50)
+        batcher.start()
+        try:
+            await asyncio.gather(*(batcher.embed(str(i)) for i in range(7)))
+        finally:
+            await batcher.close()
+
+    asyncio.run(run())
+    assert sum(model.batches) == 7
+    assert max(model.batches) <= 3
+
+
+def test_embedding_errors_reach_every_waiting_query():
+    model = CountingEmbedding(fail=True)
+
+    async def run():
+        batcher = QueryEmbeddingBatcher(model, max_batch_size=4, max_wait_ms=20)
+        batcher.start()
+        try:
+            return await asyncio.gather(
+                *(batcher.embed(str(i)) for i in range(3)), return_exceptions=True
+            )
+        finally:
+            await batcher.close()
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from utils.query_router import QueryRouter  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def router():
+    return QueryRouter()
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("Best eco-lodges in Vietnam?", ["Vietnam.pdf"]),
+        ("How do I get from Ho Chi Minh City to the Mekong Delta?", ["Vietnam.pdf"]),
+        ("Is siem reap worth three days?", ["Cambodia.pdf"]),
+        ("Trekking near Luang Prabang or Chiang Rai", ["Laos.pdf", "Thailand.pdf"]),
+        ("Wildlife tours in Borneo", ["Brunei.pdf", "Indonesia.pdf", "Malaysia.pdf"]),
+        ("What is the best time to visit Hue?", ["Vietnam.pdf"]),
+        ("Ferries from Bali to Java", ["Indonesia.pdf"]),
+        ("Motorbiking around Pai", ["Thailand.pdf"]),
+    ],
+)
+def test_routes_country_questions(router, question, expected):
+    assert router.route(question) == expected
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What hue is the sea at sunset?",
+        "Are there pagan festivals worth seeing?",
+        "Where can I learn to code in java while travelling?",
+        "Where can I find good Thai food?",
+        "Is there a flores-style market nearby?",
+        "Which apple pai recipes are local?",
+        "How do I keep my backpack light?",
+    ],
+)
+def test_common_words_do_not_route(router, question):
+    assert router.route(question) == []
+
+
+def test_longest_alias_wins():
+    router = QueryRouter(country_aliases={"A.pdf": ["ho chi minh"], "B.pdf": ["ho chi minh city"]})
+    assert router.route("Flights to Ho Chi Minh City") == ["B.pdf"]
+
+
+def test_custom_case_sensitive_aliases():
+    router = QueryRouter(
+        country_aliases={"Vietnam.pdf": ["vietnam"]}, case_sensitive_aliases={"Hue": ["Vietnam.pdf"]}
+    )
+    assert router.route("Trains to Hue") == ["Vietnam.pdf"]
+    assert router.route("a warm hue") == []
@@ -0,0 +1,132 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.schema import NodeWithScore, TextNode  # noqa: E402
+
+from utils.query_router import RoutedRetriever  # noqa: E402
+from utils.rag import get_rag_response, stream_rag_response  # noqa: E402
+from utils.response_cache import ResponseCache  # noqa: E402
+from utils.stubs import HashingEmbedding, StubLLM  # noqa: E402
+
+QUESTIONS = [
+    "What are the best eco-lodges in Vietnam?",
+    "How do I get from Bangkok to Chiang Mai by train?",
+    "Which beaches are quiet in the rainy season?",
+]
+
+
+class FakeRetriever:
+    """Returns two fixed chunks and counts the retrievals."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def retrieve(self, query):
+        self.calls += 1
+        return [
+            NodeWithScore(
+                node=TextNode(text=f"Context chunk {i}", metadata={"pdf_name": "Vietnam.pdf"}),
+                score=1.0 - i / 10,
+            )
+            for i in range(2)
+        ]
+
+    async def aretrieve(self, query):
+        return self.retrieve(query)
+
+
+class FakeVectorDB:
+    def __init__(self):
+        self.retriever = FakeRetriever()
+
+    def as_retriever(self, **kwargs):
+        return self.retriever
+
+
+def make_retriever(routing):
+    if routing:
+        return RoutedRetriever(FakeVectorDB())
+    return FakeRetriever()
+
+
+@pytest.mark.parametrize("routing", [False, True])
+def test_one_generation_call_per_question(routing):
+    llm = StubLLM()
+    retriever = make_retriever(routing)
+
+    for expected_calls, question in enumerate(QUESTIONS, start=1):
+        answer = get_rag_response(question, retriever, llm)
+        assert answer.startswith("Stub answer")
+        assert llm.calls == expected_calls
+
+
+@pytest.mark.parametrize("routing", [False, True])
+def test_one_generation_call_per_question_with_cache(routing):
+    llm = StubLLM()
+    retriever = make_retriever(routing)
+    response_cache = ResponseCache()
+    embed_model = HashingEmbedding(embed_dim=64)
+
+    for expected_calls, question in enumerate(QUESTIONS, start=1):
+        get_rag_response(
+            question, retriever, llm, response_cache=response_cache, embed_model=embed_model
+        )
+        assert llm.calls == expected_calls
+
+    # Repeated questions are served from the cache without generating again
+    for question in QUESTIONS:
+        get_rag_response(
+            question, retriever, llm, response_cache=response_cache, embed_model=embed_model
+        )
+    assert llm.calls == len(QUESTIONS)
+    assert response_cache.stats()["exact_hits"] == len(QUESTIONS)
+
+
+@pytest.mark.parametrize("routing", [False, True])
+def test_stream_makes_one_generation_call(routing):
+    llm = StubLLM()
+    retriever = make_retriever(routing)
+
+    for expected_calls, question in enumerate(QUESTIONS, start=1):
+        stream = stream_rag_response(question, retriever, llm)
+        text = "".join(stream.tokens())
+        assert text == stream.text
+        assert llm.calls == expected_calls
+
+
+class RecordingTrace:
+    def __init__(self):
+        self.finished_with = []
+
+    def set(self, key, value):
+        pass
+
+    def record(self, name, seconds):
+        pass
+
+    def finish(self, error=None):
+        self.finished_with.append(error)
+
+
+class FailingStreamLLM(StubLLM):
+    def stream(self, prompt):
+        yield "partial "
+        raise ConnectionError("stream dropped")
+
+
+def test_stream_error_finishes_trace_and_skips_cache():
+    response_cache = ResponseCache()
+    stream = stream_rag_response(
+        QUESTIONS[0], make_retriever(False), FailingStreamLLM(), response_cache=response_cache
+    )
+    stream._trace = trace = RecordingTrace()
+
+    with pytest.raises(ConnectionError):
+        for _ in stream.tokens():
+            pass
+
+    assert trace.finished_with == ["ConnectionError"]
+    assert stream.text == "partial "
+    assert response_cache.stats()["entries"] == 0
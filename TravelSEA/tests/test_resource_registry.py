@@ -0,0 +1,46 @@
+import threading
+import time
+
+from utils.resource_registry import ResourceRegistry, config_hash
+
+
+def test_resource_is_built_once_per_config(capsys):
+    registry = ResourceRegistry()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return object()
+
+    first = registry.get_or_build("model", config_hash({"name": "a"}), build)
+    assert registry.get_or_build("model", config_hash({"name": "a"}), build) is first
+    registry.get_or_build("model", config_hash({"name": "b"}), build)
+
+    assert len(builds) == 2
+    stats = registry.stats()[f"model:{config_hash({'name': 'a'})}"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["build_seconds"] is not None
+    assert capsys.readouterr().out == ""
+
+
+def test_concurrent_requests_share_one_build():
+    registry = ResourceRegistry()
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get_or_build("llm", "k", build)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert len({id(resource) for resource in results}) == 1
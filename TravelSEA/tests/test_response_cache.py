@@ -0,0 +1,52 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.response_cache import ResponseCache  # noqa: E402
+
+VECTOR = [1.0, 0.0, 0.0]
+NEAR_VECTOR = [0.99, 0.05, 0.0]
+
+
+def country_scope(question):
+    return [country for country in ("Vietnam", "Cambodia") if country in question]
+
+
+def test_exact_tier_is_always_on():
+    cache = ResponseCache()
+    cache.put("What to see in Vietnam?", "Hoi An", VECTOR)
+    assert cache.get_exact("what to see in vietnam") == "Hoi An"
+
+
+def test_semantic_tier_is_off_by_default():
+    cache = ResponseCache()
+    cache.put("What to see in Vietnam?", "Hoi An", VECTOR)
+    assert cache.get_semantic(NEAR_VECTOR, "Things to see in Vietnam") is None
+
+
+def test_semantic_hit_within_the_same_scope():
+    cache = ResponseCache(semantic=True, scope_fn=country_scope)
+    cache.put("What to see in Vietnam?", "Hoi An", VECTOR)
+    assert cache.get_semantic(NEAR_VECTOR, "Things to see in Vietnam") == "Hoi An"
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_semantic_hit_never_crosses_countries():
+    cache = ResponseCache(semantic=True, scope_fn=country_scope)
+    cache.put("What to see in Vietnam?", "Hoi An", VECTOR)
+    # Same embedding, different country
+    assert cache.get_semantic(VECTOR, "What to see in Cambodia?") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_index_version_change_clears_the_semantic_tier():
+    version = {"value": 1}
+    cache = ResponseCache(
+        semantic=True, index_version_fn=lambda: version["value"], version_check_seconds=0
+    )
+    cache.get_exact("warm up the version check")
+    cache.put("What to see in Vietnam?", "Hoi An", VECTOR)
+
+    version["value"] = 2
+    assert cache.get_semantic(VECTOR, "Things to see in Vietnam") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,78 @@
+import importlib.util
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Packages that must only be imported when a resource that needs them is built
+HEAVY_PACKAGES = [
+    "llama_index",
+    "langchain_openai",
+    "langchain_text_splitters",
+    "openai",
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "sqlalchemy",
+    "psycopg2",
+    "marker",
+]
+
+
+def imported_packages(module):
+    code = (
+        f"import json, sys; import {module}; "
+        f"print(json.dumps(sorted({{name.split('.')[0] for name in sys.modules}})))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    return set(json.loads(result.stdout))
+
+
+@pytest.mark.parametrize("module", ["utils.rag", "utils.resources", "utils.tracing"])
+def test_module_does_not_import_heavy_packages(module):
+    assert not imported_packages(module) & set(HEAVY_PACKAGES)
+
+
+def test_parse_importtime():
+    pytest.importorskip("pydantic")
+    from profile_imports import package_totals, parse_importtime
+
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |   numpy.core",
+            "import time:       300 |        400 | numpy",
+            "import time:        50 |         50 | utils.rag",
+            "unrelated line",
+        ]
+    )
+    entries = parse_importtime(stderr)
+    assert [entry["module"] for entry in entries] == ["numpy.core", "numpy", "utils.rag"]
+    assert entries[0] == {
+        "module": "numpy.core", "self_ms": 0.1, "cumulative_ms": 0.1, "depth": 1
+    }
+    assert entries[1]["depth"] == 0
+    assert package_totals(entries) == [("numpy", 0.4), ("utils", 0.05)]
+
+
+def test_entry_points_within_startup_budget():
+    pytest.importorskip("pydantic")
+    from profile_imports import cold_start_ms
+    from utils.config import load_config
+
+    startup_config = load_config(str(ROOT / "config.yaml")).startup
+    for module, budget_ms in startup_config.budget_ms.items():
+        if importlib.util.find_spec(module) is None:
+            continue
+        try:
+            elapsed_ms = cold_start_ms(module, startup_config.repeat)
+        except RuntimeError as e:
+            pytest.skip(f"{module} cannot be imported here: {e}")
+        assert elapsed_ms <= budget_ms, f"{module} cold start {elapsed_ms:.0f} ms > {budget_ms} ms"
@@ -0,0 +1,106 @@
+import pytest
+
+pytest.importorskip("llama_index.core")
+pytest.importorskip("tqdm")
+
+from llama_index.core.schema import QueryBundle  # noqa: E402
+from sqlalchemy import create_engine, event, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from utils.vector_storage import (  # noqa: E402
+    SearchParamsRetriever,
+    _instrument_sessions,
+    search_session_class,
+    search_statements,
+)
+
+
+def test_only_the_configured_method_is_set():
+    assert search_statements("hnsw", ef_search=40, probes=10) == (
+        "SET LOCAL hnsw.ef_search = 40",
+    )
+    assert search_statements("ivfflat", ef_search=40, probes=10) == (
+        "SET LOCAL ivfflat.probes = 10",
+    )
+    assert search_statements("none", ef_search=40, probes=10) == ()
+    assert search_statements("hnsw", probes=10) == ()
+
+
+@pytest.mark.parametrize("value", ["40; RESET ALL", 0, -5, 4.5, True])
+def test_invalid_values_are_rejected(value):
+    with pytest.raises(ValueError):
+        search_statements("hnsw", ef_search=value)
+
+
+@pytest.fixture
+def recorded():
+    """A session factory whose executed SQL is recorded (and not run by SQLite)."""
+    engine = create_engine("sqlite://")
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        return "SELECT 1", parameters
+
+    factory = sessionmaker(
+        engine, class_=search_session_class(search_statements("hnsw", ef_search=40))
+    )
+    return factory, statements
+
+
+def query(factory):
+    with factory() as session, session.begin():
+        session.execute(text("SELECT embedding FROM data"))
+
+
+def test_defaults_are_set_inside_every_transaction(recorded):
+    factory, statements = recorded
+
+    query(factory)
+    query(factory)
+
+    assert statements == [
+        "SET LOCAL hnsw.ef_search = 40",
+        "SELECT embedding FROM data",
+    ] * 2
+
+
+class SessionRetriever:
+    def __init__(self, factory):
+        self.factory = factory
+
+    def retrieve(self, query_bundle):
+        query(self.factory)
+        return []
+
+
+def test_retriever_overrides_apply_to_its_own_queries_only(recorded):
+    factory, statements = recorded
+    retriever = SearchParamsRetriever(
+        SessionRetriever(factory), search_statements("hnsw", ef_search=200)
+    )
+
+    retriever.retrieve(QueryBundle(query_str="quiet beaches in Vietnam"))
+    query(factory)
+
+    assert statements == [
+        "SET LOCAL hnsw.ef_search = 200",
+        "SELECT embedding FROM data",
+        "SET LOCAL hnsw.ef_search = 40",
+        "SELECT embedding FROM data",
+    ]
+
+
+def test_connection_acquisitions_are_timed_per_engine(recorded):
+    factory, statements = recorded
+    stats = {"checkouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+    _instrument_sessions(factory.class_, {factory.kw["bind"]: stats})
+
+    query(factory)
+    query(factory)
+
+    assert stats["checkouts"] == 2
+    assert 0.0 <= stats["max_wait_seconds"] <= stats["wait_seconds"]
+    # Still one SET LOCAL per transaction, before the query
+    assert statements[:2] == ["SET LOCAL hnsw.ef_search = 40", "SELECT embedding FROM data"]
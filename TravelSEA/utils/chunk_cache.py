@@ -0,0 +1,139 @@
+"""
+chunk_cache.py
+
+Per-file cache of processed (converted and split) document chunks.
+
+Each source PDF gets its own gzip-compressed JSON Lines file, keyed by the PDF's
+content hash and the splitter configuration, so a changed PDF or a changed
+chunk_size/chunk_overlap only invalidates the affected entries. Chunks are read
+back lazily, one line at a time.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_hash(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkCache:
+    """On-disk chunk cache with one entry per source file."""
+
+    def __init__(self, cache_dir, splitter_params):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.params_hash = hashlib.sha256(
+            json.dumps(splitter_params, sort_keys=True).encode()
+        ).hexdigest()
+        self.manifest_path = self.cache_dir / MANIFEST_NAME
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        return {"files": {}, "legacy_imported": False}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_fresh(self, pdf_name, pdf_hash):
+        """Whether the cached entry matches the given PDF hash and splitter params."""
+        entry = self.manifest["files"].get(pdf_name)
+        return (
+            entry is not None
+            and entry["pdf_hash"] == pdf_hash
+            and entry["params_hash"] == self.params_hash
+            and (self.cache_dir / entry["path"]).exists()
+        )
+
+    def stale_files(self, filenames, reference_folder):
+        """Return the PDF files whose cache entries are missing or out of date."""
+        return [
+            filename
+            for filename in filenames
+            if not self.is_fresh(filename, file_hash(Path(reference_folder) / filename))
+        ]
+
+    def write(self, pdf_name, pdf_hash, chunks):
+        """Store the chunks of one PDF, replacing any previous entry for it."""
+        entry_path = f"{Path(pdf_name).stem}-{pdf_hash[:12]}-{self.params_hash[:12]}.jsonl.gz"
+        tmp_path = self.cache_dir / (entry_path + ".tmp")
+
+        count = 0
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                count += 1
+        os.replace(tmp_path, self.cache_dir / entry_path)
+
+        previous = self.manifest["files"].get(pdf_name)
+        if previous and previous["path"] != entry_path:
+            (self.cache_dir / previous["path"]).unlink(missing_ok=True)
+
+        self.manifest["files"][pdf_name] = {
+            "pdf_hash": pdf_hash,
+            "params_hash": self.params_hash,
+            "path": entry_path,
+            "n_chunks": count,
+        }
+        self._save_manifest()
+        return count
+
+    def iter_chunks(self, pdf_name):
+        """Lazily yield the cached chunks of one PDF."""
+        entry = self.manifest["files"][pdf_name]
+        with gzip.open(self.cache_dir / entry["path"], "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def iter_documents(self, filenames):
+        """Lazily yield the cached chunks of all given PDFs that have an entry."""
+        for filename in filenames:
+            if filename in self.manifest["files"]:
+                yield from self.iter_chunks(filename)
+
+    def import_legacy_pickle(self, pickle_path, reference_folder):
+        """
+        One-time import of the monolithic docs_processed.pickle.
+
+        The pickle is assumed to have been produced from the current PDFs with
+        the current splitter configuration. Files missing from the data folder
+        are skipped. Later calls are no-ops.
+        """
+        if self.manifest.get("legacy_imported"):
+            return 0
+
+        with open(pickle_path, "rb") as f:
+            documents = pickle.load(f)
+
+        by_file = {}
+        for document in documents:
+            by_file.setdefault(document["metadata"]["pdf_name"], []).append(document)
+
+        imported = 0
+        for pdf_name, chunks in by_file.items():
+            pdf_path = Path(reference_folder) / pdf_name
+            if not pdf_path.exists() or pdf_name in self.manifest["files"]:
+                continue
+            imported += self.write(pdf_name, file_hash(pdf_path), chunks)
+
+        self.manifest["legacy_imported"] = True
+        self._save_manifest()
+        print(f"Imported {imported} chunks from legacy cache {pickle_path}")
+        return imported
@@ -0,0 +1,165 @@
+"""
+config.py
+
+Typed configuration for the TravelSEA Advisor services, loaded from config.yaml.
+"""
+
+from typing import Dict, Optional
+
+import yaml
+from pydantic import BaseModel
+
+
+class AppConfig(BaseModel):
+    class Config:
+        arbitrary_types_allowed = True
+
+    class Database(BaseModel):
+        class AnnIndex(BaseModel):
+            # "hnsw", "ivfflat" or "none"
+            method: str = "hnsw"
+            m: int = 16
+            ef_construction: int = 64
+            lists: int = 100
+            # Query-time settings, applied with SET LOCAL inside each query
+            # transaction (ef_search for hnsw, probes for ivfflat)
+            ef_search: Optional[int] = 40
+            probes: Optional[int] = 10
+
+        class Pool(BaseModel):
+            # Connections kept open / upper bound under load
+            min_size: int = 2
+            max_size: int = 10
+            # Seconds to wait for a free connection before failing
+            timeout: float = 30
+            # Seconds after which a connection is replaced
+            recycle: int = 1800
+            pre_ping: bool = True
+            statement_timeout_ms: Optional[int] = 30000
+            connect_timeout: Optional[int] = 10
+
+        name: str
+        host: str
+        password: str
+        username: str
+        port: int
+        table_name: str
+        ann_index: AnnIndex = AnnIndex()
+        pool: Pool = Pool()
+
+    class EmbeddingModel(BaseModel):
+        embed_model_name: str
+        embed_dim: int
+        # Inference backend: "huggingface" (reference), "torch", "torch_int8"
+        # (dynamic int8 quantization) or "onnx" (needs optimum[onnxruntime])
+        backend: str = "huggingface"
+        # Intra-op CPU threads; None keeps the library default
+        num_threads: Optional[int] = None
+        batch_size: int = 32
+        max_length: int = 512
+        onnx_path: str = "../data/onnx"
+
+    class LLM(BaseModel):
+        openai_model: str
+        temperature: float
+
+    class Retrieval(BaseModel):
+        # When True, only the index retriever runs and ChatOpenAI is the single
+        # generation call. When False, the llama-index query engine is used,
+        # which synthesizes (and discards) an extra answer with its own LLM.
+        retriever_only: bool = True
+        query_mode: str = "hybrid"
+        similarity_top_k: int = 2
+        sparse_top_k: int = 4
+        # Restrict retrieval to the guides of the countries a question mentions
+        routing: bool = False
+        # Also search the responsible/sustainable travel guides for routed questions
+        routing_include_general_guides: bool = True
+
+    class EmbeddingCache(BaseModel):
+        enabled: bool = False
+        directory: str = "../data/embedding_cache"
+        dtype: str = "float16"
+        max_entries: int = 200000
+
+    class ResponseCache(BaseModel):
+        enabled: bool = False
+        max_entries: int = 1000
+        ttl_seconds: int = 3600
+        # Semantic tier: answers of similar questions about the same countries
+        semantic: bool = False
+        similarity_threshold: float = 0.95
+        version_check_seconds: int = 60
+
+    class VectorStore(BaseModel):
+        # "postgres" (pgvector hybrid search) or "memory" (in-process NumPy + BM25)
+        backend: str = "postgres"
+        memory_path: str = "../data/memory_index"
+        # Memory backend: search "int8" (4x smaller) or "binary" (32x smaller)
+        # codes and rescore rescore_multiplier * top_k candidates in float32
+        quantization: str = "none"
+        rescore_multiplier: int = 4
+
+    class API(BaseModel):
+        host: str = "127.0.0.1"
+        port: int = 8000
+        # Concurrent queries are embedded together, up to this many per batch
+        max_batch_size: int = 16
+        # How long the first query of a batch waits for others to join it
+        max_wait_ms: float = 5.0
+        stub_llm_latency: float = 0.5
+
+    class FeedbackLog(BaseModel):
+        path: str = "../data/feedback/feedback.jsonl"
+        # Rotate once the log reaches this size, keeping backup_count old files
+        max_bytes: int = 10 * 1024 * 1024
+        backup_count: int = 5
+        flush_interval_seconds: float = 1.0
+        # Old JSON array format, imported once into the log
+        legacy_json_path: str = "../feedback.json"
+
+    class ContextPacking(BaseModel):
+        # Merge overlapping chunks and cap the context at max_tokens
+        enabled: bool = False
+        max_tokens: Optional[int] = 1500
+        # Shared characters needed to merge neighbouring chunks of one guide
+        min_overlap_chars: int = 20
+        max_overlap_chars: int = 200
+        tokenizer_model: str = "gpt-4o"
+
+    class Tracing(BaseModel):
+        # Per-stage spans, counters and Prometheus metrics; no-ops when disabled
+        enabled: bool = False
+        # Write one structured JSON line per request (to log_path, or stdout)
+        log_requests: bool = False
+        log_path: Optional[str] = None
+        # Serve /metrics on this port from processes without an HTTP API (the
+        # app); off unless set. Bound to metrics_host, loopback by default.
+        metrics_port: Optional[int] = None
+        metrics_host: str = "127.0.0.1"
+
+    class Startup(BaseModel):
+        # Import-time budgets (median over repeat cold starts, excluding the
+        # interpreter's own startup) checked by profile_imports.py --check
+        budget_ms: Dict[str, float] = {"TravelSEA_app": 1500, "prep": 500}
+        repeat: int = 5
+
+    database: Database
+    embedding_model: EmbeddingModel
+    llm: LLM
+    retrieval: Retrieval = Retrieval()
+    vector_store: VectorStore = VectorStore()
+    embedding_cache: EmbeddingCache = EmbeddingCache()
+    response_cache: ResponseCache = ResponseCache()
+    api: API = API()
+    feedback_log: FeedbackLog = FeedbackLog()
+    context_packing: ContextPacking = ContextPacking()
+    tracing: Tracing = Tracing()
+    startup: Startup = Startup()
+
+
+def load_config(config_path):
+    """Load configuration from YAML file."""
+    with open(config_path, "r") as f:
+        config_dict = yaml.safe_load(f)
+    return AppConfig(**config_dict)
@@ -0,0 +1,153 @@
+"""
+context_packing.py
+
+Assembles the prompt context from retrieved nodes under a token budget.
+
+Chunks are split with an overlap, so neighbouring chunks of the same guide
+that are retrieved together repeat up to chunk_overlap characters. The packer
+merges such neighbours (and drops chunks contained in another one) until no
+two blocks of the same guide overlap any more, orders
+the resulting blocks by retrieval score and adds them until the token budget
+is used up.
+"""
+
+import threading
+
+from utils.tokens import count_tokens
+from utils.tracing import tracer
+
+
+def _overlap(head, tail, min_overlap, max_overlap):
+    """Length of the longest suffix of head that is a prefix of tail (0 if < min_overlap)."""
+    for size in range(min(len(head), len(tail), max_overlap), min_overlap - 1, -1):
+        if head.endswith(tail[:size]):
+            return size
+    return 0
+
+
+class _Block:
+    def __init__(self, node):
+        self.text = node.text.strip()
+        self.score = node.score if node.score is not None else 0.0
+        self.pdf_name = node.metadata.get("pdf_name")
+        self.nodes = [node]
+
+    def absorb(self, other, text):
+        self.text = text
+        self.score = max(self.score, other.score)
+        self.nodes.extend(other.nodes)
+
+
+class ContextPacker:
+    """
+    Builds the context string for the prompt.
+
+    Parameters:
+        max_tokens (int): Token budget of the context; None for no limit.
+        min_overlap (int): Minimum shared characters to merge two chunks.
+        max_overlap (int): Longest overlap searched for (at least chunk_overlap).
+        model (str): Model whose tokenizer counts the tokens.
+    """
+
+    def __init__(self, max_tokens=1500, min_overlap=20, max_overlap=200, model="gpt-4o"):
+        self.max_tokens = max_tokens
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.model = model
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0,
+                          "merged_chunks": 0, "dropped_chunks": 0}
+
+    def _combined_text(self, existing, block):
+        """Text of the two blocks merged, or None when they do not overlap."""
+        if existing.pdf_name != block.pdf_name:
+            return None
+        if block.text in existing.text:
+            return existing.text
+        if existing.text in block.text:
+            return block.text
+        size = _overlap(existing.text, block.text, self.min_overlap, self.max_overlap)
+        if size:
+            return existing.text + block.text[size:]
+        size = _overlap(block.text, existing.text, self.min_overlap, self.max_overlap)
+        if size:
+            return block.text + existing.text[size:]
+        return None
+
+    def _merge(self, nodes):
+        """Deduplicate and merge overlapping chunks of the same guide."""
+        blocks = []
+        merged = 0
+        for node in sorted(nodes, key=lambda n: -(n.score or 0.0)):
+            block = _Block(node)
+            # A merged block can now overlap a block it did not overlap before
+            # (A+C bridged by B), so keep merging until it matches none.
+            while True:
+                for i, existing in enumerate(blocks):
+                    text = self._combined_text(existing, block)
+                    if text is not None:
+                        existing.absorb(block, text)
+                        block = blocks.pop(i)
+                        merged += 1
+                        break
+                else:
+                    break
+            blocks.append(block)
+
+        return sorted(blocks, key=lambda b: -b.score), merged
+
+    def pack(self, nodes):
+        """
+        Return (context, stats) for the retrieved nodes.
+
+        stats holds the token count of the naive concatenation and of the packed
+        context, and how many chunks were merged into a neighbour or dropped.
+        """
+        naive_context = "\n\n".join(node.text for node in nodes)
+        tokens_in = count_tokens(naive_context, self.model)
+
+        blocks, merged = self._merge(nodes)
+
+        parts, used, dropped = [], 0, 0
+        separator_tokens = count_tokens("\n\n", self.model)
+        for block in blocks:
+            tokens = count_tokens(block.text, self.model) + (separator_tokens if parts else 0)
+            if self.max_tokens is not None and used + tokens > self.max_tokens:
+                if not parts:
+                    # Never send an empty context: keep the head of the best block.
+                    ratio = self.max_tokens / max(tokens, 1)
+                    parts.append(block.text[: int(len(block.text) * ratio)])
+                    used = self.max_tokens
+                else:
+                    dropped += len(block.nodes)
+                continue
+            parts.append(block.text)
+            used += tokens
+
+        context = "\n\n".join(parts)
+        stats = {
+            "tokens_in": tokens_in,
+            "tokens_out": used,
+            "tokens_saved": max(tokens_in - used, 0),
+            "merged_chunks": merged,
+            "dropped_chunks": dropped,
+        }
+
+        with self._lock:
+            self._counters["requests"] += 1
+            for key in ("tokens_in", "tokens_out", "tokens_saved", "merged_chunks",
+                        "dropped_chunks"):
+                self._counters[key] += stats[key]
+        tracer.increment("context_tokens_saved", stats["tokens_saved"])
+        tracer.observe("context_tokens", used)
+
+        return context, stats
+
+    def stats(self):
+        """Cumulative token savings over all packed contexts."""
+        with self._lock:
+            counters = dict(self._counters)
+        counters["saved_rate"] = (
+            counters["tokens_saved"] / counters["tokens_in"] if counters["tokens_in"] else 0.0
+        )
+        return counters
@@ -0,0 +1,165 @@
+"""
+dedup.py
+
+Exact and near-duplicate detection for document chunks before embedding.
+
+Exact duplicates are found by a hash of the normalized text. Near duplicates
+use MinHash signatures of word shingles with LSH banding: chunks sharing a band
+become candidates, and a candidate is a duplicate when its estimated Jaccard
+similarity to an already kept chunk reaches the threshold. Chunks are
+processed as a stream and the first occurrence is kept, so the pass fits the
+ingestion pipeline.
+
+WikiVoyage exports repeat boilerplate sections across countries; with
+scope="corpus" those are kept once for the whole corpus, with scope="pdf" once
+per guide (so a pdf_name filter still finds them).
+"""
+
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+# Mersenne prime of the universal hash family (a * x + b) mod p of the
+# MinHash permutations; with a, b, x < p the product fits in 64 bits
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace and punctuation."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class ChunkDeduplicator:
+    """
+    Streaming exact and MinHash/LSH near-duplicate filter for chunk dicts.
+
+    Parameters:
+        threshold (float): Estimated Jaccard similarity at which a chunk is a
+            near duplicate.
+        num_perm (int): MinHash signature length.
+        bands (int): LSH bands; num_perm must be a multiple. With r = num_perm /
+            bands rows per band, pairs above (1 / bands) ** (1 / r) similarity
+            are likely to become candidates.
+        shingle_size (int): Words per shingle.
+        min_words (int): Shorter chunks are only checked for exact duplicates.
+        scope (str): "corpus" to deduplicate across guides, "pdf" within each guide.
+        seed (int): Seed of the MinHash permutations (fixed for reproducible runs).
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, bands=16, shingle_size=5, min_words=8,
+                 scope="corpus", seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        if scope not in ("corpus", "pdf"):
+            raise ValueError(f"Unknown dedup scope {scope!r}; expected 'corpus' or 'pdf'")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.scope = scope
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+        self._exact = {}
+        self._buckets = defaultdict(list)
+        self._signatures = {}
+        self._pdf_names = {}
+        self.duplicates = {}
+        self._counters = {"chunks": 0, "kept": 0, "exact": 0, "near": 0,
+                          "cross_pdf": 0, "dropped_chars": 0}
+
+    def _signature(self, words):
+        shingles = {
+            " ".join(words[i : i + self.shingle_size])
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode()) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        ) % _PRIME
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def _scope_key(self, chunk):
+        return chunk["metadata"]["pdf_name"] if self.scope == "pdf" else ""
+
+    def _band_keys(self, scope_key, signature):
+        for band in range(self.bands):
+            rows = signature[band * self.rows : (band + 1) * self.rows]
+            yield scope_key, band, rows.tobytes()
+
+    def check(self, chunk):
+        """
+        Return None for a new chunk (which is registered) or
+        (kind, canonical document_id, similarity) for a duplicate.
+        """
+        document_id = chunk["metadata"]["document_id"]
+        scope_key = self._scope_key(chunk)
+        normalized = normalize_text(chunk["content"])
+
+        exact_key = (scope_key, hashlib.sha1(normalized.encode()).hexdigest())
+        canonical = self._exact.get(exact_key)
+        if canonical is not None:
+            return "exact", canonical, 1.0
+
+        words = normalized.split()
+        signature = None
+        if len(words) >= max(self.min_words, self.shingle_size):
+            signature = self._signature(words)
+            band_keys = list(self._band_keys(scope_key, signature))
+            candidates = dict.fromkeys(
+                candidate for key in band_keys for candidate in self._buckets.get(key, ())
+            )
+            best, best_similarity = None, 0.0
+            for candidate in candidates:
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity > best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is not None and best_similarity >= self.threshold:
+                return "near", best, best_similarity
+
+            for key in band_keys:
+                self._buckets[key].append(document_id)
+            self._signatures[document_id] = signature
+
+        self._exact[exact_key] = document_id
+        self._pdf_names[document_id] = chunk["metadata"]["pdf_name"]
+        return None
+
+    def filter(self, chunks):
+        """Yield the chunks that are not duplicates of an earlier chunk."""
+        for chunk in chunks:
+            self._counters["chunks"] += 1
+            duplicate = self.check(chunk)
+            if duplicate is None:
+                self._counters["kept"] += 1
+                yield chunk
+                continue
+
+            kind, canonical, similarity = duplicate
+            metadata = chunk["metadata"]
+            self._counters[kind] += 1
+            self._counters["dropped_chars"] += len(chunk["content"])
+            if self._pdf_names[canonical] != metadata["pdf_name"]:
+                self._counters["cross_pdf"] += 1
+            self.duplicates[metadata["document_id"]] = {
+                "canonical": canonical,
+                "kind": kind,
+                "similarity": round(similarity, 4),
+                "pdf_name": metadata["pdf_name"],
+            }
+
+    def stats(self):
+        """Counts of kept, exact and near-duplicate chunks and the share dropped."""
+        stats = dict(self._counters)
+        dropped = stats["exact"] + stats["near"]
+        stats["dropped_rate"] = dropped / stats["chunks"] if stats["chunks"] else 0.0
+        return stats
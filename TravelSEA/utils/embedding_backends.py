@@ -0,0 +1,251 @@
+"""
+embedding_backends.py
+
+Selectable CPU inference backends for the embedding model.
+
+"huggingface" is the reference path (llama-index HuggingFaceEmbedding on
+sentence-transformers). The other backends run the same encoder directly on
+the tokenizer output and add:
+
+- length-bucketed batching: texts are sorted by token count before batching,
+  so each batch is padded to the length of similar texts, not the longest one;
+- an explicit intra-op thread count;
+- a warmup pass per sequence-length bucket at startup.
+
+"torch" runs the float32 PyTorch model, "torch_int8" the same model with
+dynamically int8-quantized linear layers, and "onnx" an ONNX Runtime export
+(needs the optional optimum[onnxruntime] package; the export is written to
+onnx_dir once and reused).
+"""
+
+import re
+import threading
+from pathlib import Path
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+EMBEDDING_BACKENDS = ("huggingface", "torch", "torch_int8", "onnx")
+
+# Sequence lengths (tokens) run once by warmup()
+WARMUP_LENGTHS = (16, 64, 128, 256, 512)
+
+
+def _set_torch_threads(num_threads):
+    if num_threads:
+        import torch
+
+        # Process-wide: also applies to any other torch model in this process
+        torch.set_num_threads(num_threads)
+
+
+def _load_torch_model(model_name, quantize):
+    import torch
+    from transformers import AutoModel
+
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+    if quantize:
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model
+
+
+def _load_onnx_model(model_name, onnx_dir, num_threads):
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+    except ImportError as e:
+        raise ImportError(
+            "The onnx embedding backend requires optimum with ONNX Runtime: "
+            "pip install 'optimum[onnxruntime]'"
+        ) from e
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = (
+        onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    )
+    if num_threads:
+        session_options.intra_op_num_threads = num_threads
+        session_options.inter_op_num_threads = 1
+
+    export_path = Path(onnx_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    kwargs = {"session_options": session_options, "provider": "CPUExecutionProvider"}
+    if (export_path / "model.onnx").exists():
+        return ORTModelForFeatureExtraction.from_pretrained(export_path, **kwargs)
+
+    print(f"Exporting {model_name} to ONNX in {export_path}")
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True, **kwargs)
+    model.save_pretrained(export_path)
+    return model
+
+
+class OptimizedEmbedding(BaseEmbedding):
+    """
+    llama-index embedding model running a sentence encoder with length-bucketed
+    batches on the "torch", "torch_int8" or "onnx" backend.
+
+    Query and text instructions, pooling and normalization follow the
+    sentence-transformers configuration of the reference model (CLS pooling
+    and L2 normalization for the BGE models).
+    """
+
+    _backend: str = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _model: Any = PrivateAttr()
+    _max_length: int = PrivateAttr()
+    _pooling: str = PrivateAttr()
+    _normalize: bool = PrivateAttr()
+    _query_instruction: str = PrivateAttr()
+    _text_instruction: str = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _stats: dict = PrivateAttr()
+
+    def __init__(self, model_name, backend="torch", num_threads=None, embed_batch_size=32,
+                 max_length=512, pooling="cls", normalize=True, onnx_dir="../data/onnx",
+                 **kwargs):
+        from llama_index.embeddings.huggingface.utils import (
+            get_query_instruct_for_model,
+            get_text_instruct_for_model,
+        )
+        from transformers import AutoTokenizer
+
+        super().__init__(model_name=model_name, embed_batch_size=embed_batch_size, **kwargs)
+        self._backend = backend
+        self._max_length = max_length
+        self._pooling = pooling
+        self._normalize = normalize
+        self._query_instruction = get_query_instruct_for_model(model_name) or ""
+        self._text_instruction = get_text_instruct_for_model(model_name) or ""
+        self._lock = threading.Lock()
+        self._stats = {"texts": 0, "batches": 0, "tokens": 0, "padded_tokens": 0}
+
+        _set_torch_threads(num_threads)
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if backend == "onnx":
+            self._model = _load_onnx_model(model_name, onnx_dir, num_threads)
+        elif backend in ("torch", "torch_int8"):
+            self._model = _load_torch_model(model_name, quantize=backend == "torch_int8")
+        else:
+            raise ValueError(
+                f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}"
+            )
+
+    @classmethod
+    def class_name(cls):
+        return "OptimizedEmbedding"
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def _forward(self, features):
+        import torch
+
+        with torch.inference_mode():
+            hidden = self._model(**features).last_hidden_state
+
+        if self._pooling == "cls":
+            vectors = hidden[:, 0]
+        else:
+            mask = features["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            vectors = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        if self._normalize:
+            vectors = torch.nn.functional.normalize(vectors, p=2, dim=1)
+        return vectors.float().cpu().numpy()
+
+    def _embed(self, texts, instruction=""):
+        """Embed texts in batches of similar token length, returned in input order."""
+        if not texts:
+            return []
+
+        encoded = self._tokenizer(
+            [instruction + text for text in texts],
+            truncation=True,
+            max_length=self._max_length,
+        )
+        items = [{key: encoded[key][i] for key in encoded.keys()} for i in range(len(texts))]
+        lengths = [len(item["input_ids"]) for item in items]
+        order = sorted(range(len(texts)), key=lengths.__getitem__)
+
+        vectors = [None] * len(texts)
+        batches, padded = 0, 0
+        for start in range(0, len(order), self.embed_batch_size):
+            batch = order[start : start + self.embed_batch_size]
+            features = self._tokenizer.pad([items[i] for i in batch], return_tensors="pt")
+            for i, vector in zip(batch, self._forward(features)):
+                vectors[i] = vector.tolist()
+            batches += 1
+            padded += len(batch) * max(lengths[i] for i in batch)
+
+        with self._lock:
+            self._stats["texts"] += len(texts)
+            self._stats["batches"] += batches
+            self._stats["tokens"] += sum(lengths)
+            self._stats["padded_tokens"] += padded
+        return vectors
+
+    def warmup(self, lengths=WARMUP_LENGTHS):
+        """Run one forward pass per sequence-length bucket before serving requests."""
+        for length in lengths:
+            if length > self._max_length:
+                continue
+            # Roughly one token per word; truncation caps it at max_length
+            self._embed(["travel " * length])
+
+    def stats(self):
+        """Token counts and the share of padding in the processed batches."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["padding_ratio"] = (
+            1 - stats["tokens"] / stats["padded_tokens"] if stats["padded_tokens"] else 0.0
+        )
+        return stats
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        return self._embed(queries, self._query_instruction)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query], self._query_instruction)[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text], self._text_instruction)[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, self._text_instruction)
+
+
+def create_embedding_model(model_name, backend="huggingface", num_threads=None,
+                           batch_size=32, max_length=512, onnx_dir="../data/onnx"):
+    """Build the embedding model on the selected inference backend."""
+    if backend == "huggingface":
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+        _set_torch_threads(num_threads)
+        return HuggingFaceEmbedding(
+            model_name=model_name, embed_batch_size=batch_size, max_length=max_length
+        )
+
+    return OptimizedEmbedding(
+        model_name,
+        backend=backend,
+        num_threads=num_threads,
+        embed_batch_size=batch_size,
+        max_length=max_length,
+        onnx_dir=onnx_dir,
+    )
+
+
+def warmup_embedding(embed_model):
+    """Warm up an embedding model: per-bucket passes when supported, else one query."""
+    warmup = getattr(embed_model, "warmup", None)
+    if warmup is not None:
+        warmup()
+    else:
+        # The first forward pass triggers lazy weight/kernel initialization.
+        embed_model.get_query_embedding("warmup")
@@ -0,0 +1,357 @@
+"""
+embedding_cache.py
+
+Persistent on-disk embedding cache placed in front of the embedding model.
+
+Vectors are stored in a memory-mapped float16/float32 matrix with a
+hash -> row index, keyed by (model id, embedding kind, normalized text). The
+index is persisted as an append-only journal of "key row" lines, replayed on
+open and compacted when it grows well past the number of live entries. The
+model id includes the inference backend, so vectors of the float32,
+int8-quantized and ONNX backends are never mixed.
+The same cache is used by ingestion (prep.py), query-time embedding in the app
+and the retrieval evaluation, so unchanged chunks are never embedded twice.
+
+Only one process can write to a cache directory at a time; other processes
+open it read-only and compute misses without storing them.
+"""
+
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from utils.embedding_backends import warmup_embedding
+from utils.index_sync import embedding_model_id
+from utils.query_batcher import embed_queries
+from utils.tracing import tracer
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different strings share a cache entry."""
+    return " ".join(text.split())
+
+
+def cache_model_id(model_name, backend="huggingface"):
+    """Cache identity of model_name's vectors on backend (see index_sync.embedding_model_id)."""
+    return embedding_model_id(model_name, backend)
+
+
+def cache_key(model_id, kind, text):
+    """Return the cache key for a text embedded as a "query" or a "text"."""
+    payload = f"{model_id}\0{kind}\0{normalize_text(text)}"
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+JOURNAL_NAME = "index.log"
+
+
+class EmbeddingCache:
+    """Memory-mapped vector store with a journaled key -> row index and LRU bound."""
+
+    def __init__(
+        self, cache_dir, model_id, embed_dim, dtype="float16", max_entries=200000,
+        flush_every=256, compact_ratio=2.0,
+    ):
+        self.model_id = model_id
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+        self.cache_dir = Path(cache_dir) / slug
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.embed_dim = embed_dim
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.compact_ratio = compact_ratio
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._lock_file = open(self.cache_dir / "lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.read_only = False
+        except BlockingIOError:
+            print(
+                f"Warning: embedding cache {self.cache_dir} is locked by another "
+                "process; opening it read-only, so new embeddings are computed "
+                "but not cached"
+            )
+            self.read_only = True
+
+        meta_path = self.cache_dir / "meta.json"
+        vectors_path = self.cache_dir / "vectors.npy"
+        meta = {"embed_dim": embed_dim, "dtype": dtype, "max_entries": max_entries}
+        if meta_path.exists() and vectors_path.exists():
+            with open(meta_path, "r") as f:
+                stored_meta = json.load(f)
+            if stored_meta != meta and not self.read_only:
+                print("Embedding cache settings changed; starting a new cache")
+                vectors_path.unlink()
+                (self.cache_dir / JOURNAL_NAME).unlink(missing_ok=True)
+                (self.cache_dir / "index.json").unlink(missing_ok=True)
+
+        if vectors_path.exists():
+            self._vectors = np.load(
+                vectors_path, mmap_mode="r" if self.read_only else "r+"
+            )
+        elif self.read_only:
+            self._vectors = None
+        else:
+            self._vectors = np.lib.format.open_memmap(
+                vectors_path, mode="w+", dtype=dtype, shape=(max_entries, embed_dim)
+            )
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+        # key -> row, least recently used first
+        self._index = OrderedDict()
+        self._journal_path = self.cache_dir / JOURNAL_NAME
+        self._journal = None
+        self._journal_lines = 0
+        if self._vectors is not None:
+            self._load_index()
+        if not self.read_only:
+            self._import_legacy_index()
+        self._free_rows = sorted(
+            set(range(max_entries)) - set(self._index.values()), reverse=True
+        )
+
+        if not self.read_only:
+            atexit.register(self.flush)
+
+    def _import_legacy_index(self):
+        """Convert the index.json of the first cache layout into the journal."""
+        legacy_path = self.cache_dir / "index.json"
+        if not legacy_path.exists():
+            return
+        # key -> [row, last_used_tick]
+        with open(legacy_path, "r") as f:
+            legacy = json.load(f)
+        for key, (row, _) in sorted(legacy.items(), key=lambda item: item[1][1]):
+            self._index[key] = row
+        self._compact()
+        legacy_path.unlink()
+
+    def _load_index(self):
+        """Replay the journal: each "key row" line (re)assigns row to key."""
+        if not self._journal_path.exists():
+            return
+        owners = {}
+        with open(self._journal_path, "r") as f:
+            for line in f:
+                parts = line.split()
+                if not line.endswith("\n") or len(parts) != 2 or not parts[1].isdigit():
+                    # Line cut short by an interrupted run
+                    continue
+                key, row = parts[0], int(parts[1])
+                previous_owner = owners.get(row)
+                if previous_owner is not None and previous_owner != key:
+                    # The row was evicted and reused
+                    self._index.pop(previous_owner, None)
+                previous_row = self._index.pop(key, None)
+                if previous_row is not None and previous_row != row:
+                    owners.pop(previous_row, None)
+                self._index[key] = row
+                owners[row] = key
+                self._journal_lines += 1
+
+    def _open_journal(self):
+        self._journal = open(self._journal_path, "a+")
+        if self._journal.tell():
+            self._journal.seek(self._journal.tell() - 1)
+            if self._journal.read(1) != "\n":
+                # Terminate a line cut short by an interrupted run
+                self._journal.write("\n")
+
+    def _compact(self):
+        """Rewrite the journal with one line per live entry, in LRU order."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        tmp_path = self._journal_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            for key, row in self._index.items():
+                f.write(f"{key} {row}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._journal_path)
+        self._journal_lines = len(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def get_many(self, keys):
+        """Return a list with a float32 vector for each cached key, or None on a miss."""
+        results = []
+        with self._lock:
+            for key in keys:
+                row = self._index.get(key)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self._index.move_to_end(key)
+                results.append(np.asarray(self._vectors[row], dtype=np.float32))
+
+        misses = sum(vector is None for vector in results)
+        tracer.increment("cache_lookups", len(results) - misses, cache="embedding", result="hit")
+        tracer.increment("cache_lookups", misses, cache="embedding", result="miss")
+        return results
+
+    def put_many(self, keys, vectors):
+        """Store vectors, evicting the least recently used rows when full."""
+        if self.read_only:
+            return
+
+        with self._lock:
+            if self._journal is None:
+                self._open_journal()
+            for key, vector in zip(keys, vectors):
+                row = self._index.get(key)
+                if row is None:
+                    row = self._allocate_row()
+                    self._index[key] = row
+                    self._journal.write(f"{key} {row}\n")
+                    self._journal_lines += 1
+                else:
+                    self._index.move_to_end(key)
+                self._vectors[row] = vector
+                self._dirty += 1
+
+            if self._dirty >= self.flush_every:
+                self._flush_locked()
+
+    def _allocate_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+
+        # Evict the least recently used entry; the journal line of its
+        # successor marks the row as reassigned
+        _, row = self._index.popitem(last=False)
+        return row
+
+    def flush(self):
+        """Persist the memory-mapped vectors and the key index to disk."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.read_only or not self._dirty:
+            return
+
+        # Vectors first, so a journaled row never points at unwritten data
+        self._vectors.flush()
+        if self._journal_lines > self.compact_ratio * max(len(self._index), 1):
+            self._compact()
+        elif self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        self._dirty = 0
+
+    def stats(self):
+        """Return hit/miss counters, the number of cached vectors and the open mode."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._index),
+            "read_only": self.read_only,
+        }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    llama-index embedding model that serves vectors from an EmbeddingCache and
+    only calls the wrapped model for misses.
+
+    The wrapped model is created lazily through embedding_factory, so a run in
+    which every text is cached never loads the model at all.
+    """
+
+    _embedding_factory: Any = PrivateAttr()
+    _inner: Any = PrivateAttr(default=None)
+    _cache: Any = PrivateAttr()
+
+    def __init__(self, model_name, embedding_factory, cache, **kwargs):
+        super().__init__(model_name=model_name, **kwargs)
+        self._embedding_factory = embedding_factory
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    @property
+    def inner(self):
+        """The wrapped embedding model, created on first use."""
+        if self._inner is None:
+            self._inner = self._embedding_factory()
+        return self._inner
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def warmup(self):
+        """Load the wrapped model and run its warmup passes."""
+        warmup_embedding(self.inner)
+
+    def _embed_cached(self, kind, texts, compute):
+        keys = [cache_key(self._cache.model_id, kind, text) for text in texts]
+        vectors = self._cache.get_many(keys)
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = compute([texts[i] for i in missing])
+            self._cache.put_many([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+
+        return [list(map(float, vector)) for vector in vectors]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed_cached(
+            "query", [query], lambda qs: [self.inner.get_query_embedding(q) for q in qs]
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries, computing all cache misses in one model call."""
+        return self._embed_cached(
+            "query", queries, lambda qs: embed_queries(self.inner, qs)
+        )
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_cached(
+            "text", texts, lambda ts: self.inner.get_text_embedding_batch(ts)
+        )
+
+
+def create_cached_embedding(
+    model_name, embed_dim, embedding_factory, directory, backend="huggingface",
+    dtype="float16", max_entries=200000, **kwargs
+):
+    """
+    Wrap the model built by embedding_factory with a persistent embedding cache,
+    kept separately per inference backend.
+    """
+    cache = EmbeddingCache(
+        directory, cache_model_id(model_name, backend), embed_dim, dtype=dtype,
+        max_entries=max_entries,
+    )
+    return CachedEmbedding(model_name, embedding_factory, cache, **kwargs)
@@ -0,0 +1,126 @@
+"""
+evaluation.py
+
+Retrieval quality and latency metrics shared by the benchmark scripts.
+"""
+
+import csv
+import json
+import pickle
+import random
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+
+def load_ground_truth(path, limit=None, seed=42):
+    """
+    Load the flattened ground-truth questions produced by
+    notebooks/02_generate_ground_truth.ipynb (one dict per question with the
+    source chunk's document_id, pdf_name and the question text).
+
+    Parameters:
+        path (str): Path to the GT_docs_parsed_<model>.bin pickle.
+        limit (int): Optional number of questions to sample.
+        seed (int): Seed of the sample, so runs are comparable.
+
+    Returns:
+        list: Ground-truth question dicts.
+    """
+    with open(path, "rb") as f:
+        ground_truth = pickle.load(f)
+
+    if limit and limit < len(ground_truth):
+        ground_truth = random.Random(seed).sample(ground_truth, limit)
+    return ground_truth
+
+
+def is_expected_chunk(node, expected):
+    """
+    Whether a retrieved node is the ground-truth chunk. Ground truth generated
+    before chunk ids were content-derived carries legacy ids, which collide
+    across the sections of a guide; a legacy id only matches together with the
+    same pdf_name and chunk text.
+    """
+    metadata = node.metadata
+    if metadata.get("document_id") == expected["document_id"]:
+        return True
+    return (
+        metadata.get("legacy_document_id") == expected["document_id"]
+        and metadata.get("pdf_name") == expected.get("pdf_name")
+        and node.text.strip() == (expected.get("content") or "").strip()
+    )
+
+
+def relevance(nodes, expected):
+    """Return, for each retrieved node, whether it is the expected ground-truth chunk."""
+    return [is_expected_chunk(node, expected) for node in nodes]
+
+
+def hit_rate(relevance_total):
+    """Fraction of queries with the expected chunk anywhere in the results."""
+    if not relevance_total:
+        return 0.0
+    return sum(any(line) for line in relevance_total) / len(relevance_total)
+
+
+def mrr(relevance_total):
+    """Mean reciprocal rank of the expected chunk (0 when it is not retrieved)."""
+    if not relevance_total:
+        return 0.0
+
+    total_score = 0.0
+    for line in relevance_total:
+        for rank, relevant in enumerate(line):
+            if relevant:
+                total_score += 1 / (rank + 1)
+                break
+    return total_score / len(relevance_total)
+
+
+def latency_summary(latencies):
+    """
+    Summarize per-query latencies (seconds) as milliseconds.
+
+    Returns:
+        dict: mean, p50, p95, p99 and max latency in ms.
+    """
+    if not latencies:
+        return {"mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None,
+                "max_ms": None}
+
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(values.max()),
+    }
+
+
+def write_results(results, output_dir, prefix):
+    """
+    Write benchmark results as JSON and CSV named <prefix>_<timestamp>; the CSV
+    holds results["results"]. Returns both paths.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = output_dir / f"{prefix}_{datetime.now():%Y%m%d_%H%M%S}"
+
+    json_path = stem.with_suffix(".json")
+    with open(json_path, "w") as f:
+        json.dump(results, f, indent=4)
+
+    csv_path = stem.with_suffix(".csv")
+    rows = results["results"]
+    with open(csv_path, "w", newline="") as f:
+        # Rows differ in optional columns (e.g. recall_vs_float for quantized runs)
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    return json_path, csv_path
@@ -0,0 +1,270 @@
+"""
+feedback_log.py
+
+Append-only JSONL log for user feedback on answers.
+
+Entries are queued by the app and written by a background thread, so a
+feedback click never waits on disk. The writer appends batches under an
+exclusive file lock (several app processes can share one log), fsyncs once
+per batch and rotates the file when it grows past max_bytes
+(feedback.jsonl -> feedback.jsonl.1 -> ... -> feedback.jsonl.<backup_count>).
+
+The reader streams the log line by line, oldest rotated file first, so
+aggregating feedback never loads the whole history into memory.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+_STOP = object()
+
+
+class FeedbackLog:
+    """Non-blocking writer for the feedback JSONL log."""
+
+    def __init__(
+        self, path, max_bytes=10 * 1024 * 1024, backup_count=5,
+        flush_interval_seconds=1.0, max_batch_size=256,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval_seconds
+        self.max_batch_size = max_batch_size
+        self.written = 0
+        self.batches = 0
+        self.rotations = 0
+        self.errors = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="feedback-log-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, entry):
+        """Queue one feedback entry; returns immediately."""
+        entry = dict(entry)
+        entry.setdefault("timestamp", datetime.now(timezone.utc).isoformat())
+        self._queue.put(entry)
+
+    def close(self, timeout=5.0):
+        """Write everything still queued and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not _STOP and len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            stop = batch[-1] is _STOP
+            entries = [entry for entry in batch if entry is not _STOP]
+            if entries:
+                try:
+                    self._write(entries)
+                except Exception as e:
+                    # Never take the app down over feedback; report and move on.
+                    self.errors += len(entries)
+                    print(f"Feedback log write failed: {e}", file=sys.stderr)
+            if stop:
+                return
+
+    def _write(self, entries):
+        data = "".join(
+            json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+            for entry in entries
+        ).encode("utf-8")
+
+        with open(self.path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Another process may have rotated the file while we waited.
+                if os.fstat(f.fileno()).st_ino != _inode(self.path):
+                    f.close()
+                    return self._write(entries)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                if f.tell() >= self.max_bytes:
+                    self._rotate()
+            finally:
+                if not f.closed:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+        self.written += len(entries)
+        self.batches += 1
+
+    def _rotate(self):
+        """Shift feedback.jsonl.N -> .N+1 (dropping the oldest) and start a new file."""
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = rotated_path(self.path, i)
+                if source.exists():
+                    os.replace(source, rotated_path(self.path, i + 1))
+            os.replace(self.path, rotated_path(self.path, 1))
+        else:
+            os.truncate(self.path, 0)
+        self.rotations += 1
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "batches": self.batches,
+            "pending": self._queue.qsize(),
+            "rotations": self.rotations,
+            "errors": self.errors,
+        }
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def rotated_path(path, index):
+    path = Path(path)
+    return path.with_name(f"{path.name}.{index}")
+
+
+def log_files(path):
+    """Return the log files from oldest to newest."""
+    path = Path(path)
+    rotated = sorted(
+        (p for p in path.parent.glob(f"{path.name}.*") if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]),
+        reverse=True,
+    )
+    return rotated + ([path] if path.exists() else [])
+
+
+def iter_feedback(path):
+    """Stream feedback entries from the log and its rotated files, oldest first."""
+    for log_file in log_files(path):
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crashed writer; skip it.
+                    continue
+
+
+def summarize_feedback(entries):
+    """
+    Aggregate feedback entries in a single pass.
+
+    Parameters:
+        entries (iterable): Feedback entries, e.g. from iter_feedback.
+
+    Returns:
+        dict: Totals per feedback value, mean answer latency, and helpful /
+        not helpful counts per retrieved document.
+    """
+    totals = Counter()
+    latency_sum, latency_count = 0.0, 0
+    documents = defaultdict(Counter)
+
+    for entry in entries:
+        feedback = entry.get("feedback", "unknown")
+        totals[feedback] += 1
+        if entry.get("total_time") is not None:
+            latency_sum += entry["total_time"]
+            latency_count += 1
+        for document_id in entry.get("document_ids") or []:
+            documents[document_id][feedback] += 1
+
+    total = sum(totals.values())
+    return {
+        "total": total,
+        "feedback": dict(totals),
+        "helpful_rate": totals["helpful"] / total if total else 0.0,
+        "mean_total_time": latency_sum / latency_count if latency_count else None,
+        "documents": {doc_id: dict(counts) for doc_id, counts in documents.items()},
+    }
+
+
+def migrate_json_feedback(json_path, log_path):
+    """
+    One-time import of the old feedback.json array into the JSONL log.
+
+    Runs under the log's file lock, so when several app processes start at
+    once only the first one migrates; the JSON file is renamed to *.migrated
+    afterwards and a missing file counts as already migrated.
+
+    Returns:
+        int: Number of entries migrated.
+    """
+    json_path = Path(json_path)
+    if not json_path.exists():
+        return 0
+
+    log_path = Path(log_path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "a", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Another process may have rotated the log while we waited.
+            if os.fstat(f.fileno()).st_ino != _inode(log_path):
+                f.close()
+                return migrate_json_feedback(json_path, log_path)
+            # ...or migrated the file already.
+            if not json_path.exists():
+                return 0
+
+            try:
+                with open(json_path, "r") as json_file:
+                    data = json.load(json_file)
+            except json.JSONDecodeError:
+                print(f"Could not parse {json_path}; leaving it in place")
+                return 0
+            if not isinstance(data, list):
+                data = [data]
+
+            for entry in data:
+                entry = dict(entry)
+                entry.setdefault("source", "feedback.json")
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+            os.replace(json_path, json_path.with_name(json_path.name + ".migrated"))
+        finally:
+            if not f.closed:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    print(f"Migrated {len(data)} feedback entries from {json_path} to {log_path}")
+    return len(data)
+
+
+if __name__ == "__main__":
+    log = sys.argv[1] if len(sys.argv) > 1 else "../data/feedback/feedback.jsonl"
+    print(json.dumps(summarize_feedback(iter_feedback(log)), indent=4))
@@ -0,0 +1,152 @@
+"""
+index_sync.py
+
+Helpers for incremental re-indexing: content hashes for processed chunks and
+the diff between what is stored in the vector table and a fresh document split.
+"""
+
+import hashlib
+import json
+
+CONTENT_HASH_KEY = "content_hash"
+LEGACY_ID_KEY = "legacy_document_id"
+
+# Bookkeeping metadata left out of the embedded and LLM-visible node text
+EXCLUDED_METADATA_KEYS = [CONTENT_HASH_KEY, LEGACY_ID_KEY]
+
+
+def embedding_model_id(model_name, backend="huggingface"):
+    """
+    Identify the vectors of model_name computed on an inference backend (see
+    embedding_backends). The reference huggingface backend keeps the bare model
+    name, so hashes and caches written before backends existed stay valid.
+    """
+    return model_name if backend == "huggingface" else f"{model_name}@{backend}"
+
+
+def chunk_content_hash(document, splitter_params, embed_model_name):
+    """
+    Hash everything that determines a chunk's stored row and embedding.
+
+    Parameters:
+        document (dict): Chunk dict with "content" and "metadata" keys.
+        splitter_params (dict): Splitter configuration (chunk size, overlap, ...).
+        embed_model_name (str): Embedding model (and backend) identity, see
+            embedding_model_id.
+
+    Returns:
+        str: Hex digest identifying this exact version of the chunk.
+    """
+    metadata = {
+        key: value
+        for key, value in document["metadata"].items()
+        if key != CONTENT_HASH_KEY
+    }
+    payload = json.dumps(
+        {
+            "content": document["content"],
+            "metadata": metadata,
+            "splitter": splitter_params,
+            "embed_model": embed_model_name,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def add_content_hashes(documents, splitter_params, embed_model_name):
+    """Store the content hash of every chunk in its metadata."""
+    for document in documents:
+        document["metadata"][CONTENT_HASH_KEY] = chunk_content_hash(
+            document, splitter_params, embed_model_name
+        )
+    return documents
+
+
+def diff_documents(stored_hashes, documents):
+    """
+    Compare stored chunk hashes against freshly processed documents.
+
+    Parameters:
+        stored_hashes (dict): Mapping of stored document_id to content hash.
+        documents (list): Fresh chunk dicts carrying a content hash in metadata.
+
+    Returns:
+        dict: Lists of documents to add/update and ids to remove, plus the
+        number of unchanged chunks.
+    """
+    fresh = {}
+    for document in documents:
+        fresh[document["metadata"]["document_id"]] = document
+
+    if len(fresh) < len(documents):
+        print(
+            f"Warning: {len(documents) - len(fresh)} chunks share a document_id "
+            "with another chunk; only the last one is kept"
+        )
+
+    added, updated = [], []
+    unchanged = 0
+    for document_id, document in fresh.items():
+        if document_id not in stored_hashes:
+            added.append(document)
+        elif stored_hashes[document_id] != document["metadata"][CONTENT_HASH_KEY]:
+            # Includes rows stored without a hash: replace them, never duplicate
+            updated.append(document)
+        else:
+            unchanged += 1
+
+    removed = [document_id for document_id in stored_hashes if document_id not in fresh]
+
+    return {
+        "added": added,
+        "updated": updated,
+        "removed": removed,
+        "unchanged": unchanged,
+    }
+
+
+def sync_vector_db(vectordb, documents, batch_size=256):
+    """
+    Incrementally bring a vector store in line with documents: embed and upsert
+    only new or changed chunks and delete chunks that no longer exist.
+
+    Parameters:
+        vectordb: Backend with stored_content_hashes, to_node, embed_nodes,
+            delete_nodes, replace_nodes and refresh.
+        documents (list): Document dicts whose metadata carries a content hash.
+        batch_size (int): Number of chunks embedded and written per transaction.
+
+    Returns:
+        dict: Number of added, updated, removed and unchanged chunks.
+    """
+    diff = diff_documents(vectordb.stored_content_hashes(), documents)
+
+    if diff["removed"]:
+        vectordb.delete_nodes(diff["removed"], refresh=False)
+
+    # Updated chunks are replaced batch by batch: the old rows are deleted in
+    # the same transaction that inserts the new ones, after embedding succeeded.
+    updated_ids = {doc["metadata"]["document_id"] for doc in diff["updated"]}
+    to_insert = diff["added"] + diff["updated"]
+    for i in range(0, len(to_insert), batch_size):
+        nodes = vectordb.embed_nodes(
+            [vectordb.to_node(doc) for doc in to_insert[i : i + batch_size]]
+        )
+        replaced = [node.node_id for node in nodes if node.node_id in updated_ids]
+        vectordb.replace_nodes(replaced, nodes, refresh=False)
+
+    vectordb.refresh()
+
+    summary = {
+        "added": len(diff["added"]),
+        "updated": len(diff["updated"]),
+        "removed": len(diff["removed"]),
+        "unchanged": diff["unchanged"],
+    }
+    print(
+        "Sync summary: {added} added, {updated} updated, "
+        "{removed} removed, {unchanged} unchanged".format(**summary)
+    )
+    return summary
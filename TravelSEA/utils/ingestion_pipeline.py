@@ -0,0 +1,374 @@
+"""
+ingestion_pipeline.py
+
+Streaming ingestion from PDF files to indexed rows:
+
+    convert -> header split -> chunk -> embed -> insert
+
+Every stage is a generator running in its own thread; stages are connected by
+bounded queues, so conversion, embedding and database writes overlap while at
+most queue_size items wait between two stages. PDF conversion itself runs in
+the worker processes of convert_pdfs_parallel, embedding and inserts release
+the GIL, so the total time approaches that of the slowest stage instead of the
+sum of all stages.
+
+Each stage reports the units it produced, its busy time (excluding time spent
+waiting for input or for room in the output queue), its throughput and the
+depth of its output queue; the stage with the highest busy time is the
+bottleneck.
+"""
+
+import queue
+import threading
+import time
+from pathlib import Path
+
+from utils.chunk_cache import file_hash
+from utils.index_sync import CONTENT_HASH_KEY
+from utils.process_and_index_documents import chunk_sections, convert_pdfs_parallel
+
+_DONE = object()
+
+
+class _Aborted(Exception):
+    """Raised inside a stage when another stage failed."""
+
+
+class Stage:
+    """
+    One pipeline stage.
+
+    Parameters:
+        name (str): Stage name used in the reports.
+        fn (callable): Generator function taking the iterator of input items
+            and yielding output items.
+        unit (str): What size() counts, e.g. "files" or "chunks".
+        size (callable): Units in one output item (defaults to 1).
+    """
+
+    def __init__(self, name, fn, unit="items", size=None):
+        self.name = name
+        self.fn = fn
+        self.unit = unit
+        self.size = size or (lambda item: 1)
+        self.items = 0
+        self.units = 0
+        self.busy_seconds = 0.0
+        self.input_wait_seconds = 0.0
+        self.output_wait_seconds = 0.0
+        self.depth_samples = []
+
+    def stats(self, wall_seconds):
+        depths = self.depth_samples or [0]
+        return {
+            "stage": self.name,
+            "unit": self.unit,
+            "units": self.units,
+            "busy_s": self.busy_seconds,
+            "input_wait_s": self.input_wait_seconds,
+            "output_wait_s": self.output_wait_seconds,
+            "units_per_busy_s": self.units / self.busy_seconds if self.busy_seconds else None,
+            "units_per_s": self.units / wall_seconds if wall_seconds else None,
+            "queue_depth_mean": sum(depths) / len(depths),
+            "queue_depth_max": max(depths),
+        }
+
+
+class Pipeline:
+    """
+    Runs stages in threads connected by bounded queues.
+
+    Parameters:
+        stages (list): Stage objects, in order; the first one consumes the source.
+        queue_size (int): Capacity of each queue between two stages.
+        report_interval (float): Seconds between progress lines (None: silent).
+    """
+
+    def __init__(self, stages, queue_size=4, report_interval=10.0):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages[1:]]
+        self._abort = threading.Event()
+        self._errors = []
+
+    def _iter_queue(self, stage, q):
+        while True:
+            start = time.perf_counter()
+            try:
+                while True:
+                    try:
+                        item = q.get(timeout=0.1)
+                        break
+                    except queue.Empty:
+                        if self._abort.is_set():
+                            return
+            finally:
+                stage.input_wait_seconds += time.perf_counter() - start
+            if item is _DONE:
+                return
+            yield item
+
+    def _put(self, stage, q, item):
+        start = time.perf_counter()
+        try:
+            while True:
+                if self._abort.is_set():
+                    raise _Aborted()
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            stage.output_wait_seconds += time.perf_counter() - start
+
+    def _run_stage(self, index, source):
+        stage = self.stages[index]
+        inputs = source if index == 0 else self._iter_queue(stage, self.queues[index - 1])
+        output = self.queues[index] if index < len(self.queues) else None
+        start = time.perf_counter()
+        try:
+            for item in stage.fn(inputs):
+                stage.items += 1
+                stage.units += stage.size(item)
+                if output is not None:
+                    self._put(stage, output, item)
+            if output is not None:
+                self._put(stage, output, _DONE)
+        except _Aborted:
+            pass
+        except Exception as e:
+            self._errors.append((stage.name, e))
+            self._abort.set()
+        finally:
+            stage.busy_seconds = (
+                time.perf_counter() - start
+                - stage.input_wait_seconds
+                - stage.output_wait_seconds
+            )
+
+    def _monitor(self, done):
+        last_report = time.perf_counter()
+        while not done.wait(0.5):
+            for stage, q in zip(self.stages, self.queues):
+                stage.depth_samples.append(q.qsize())
+            if self.report_interval and time.perf_counter() - last_report >= self.report_interval:
+                last_report = time.perf_counter()
+                print(
+                    "  "
+                    + " | ".join(
+                        f"{stage.name}: {stage.units} {stage.unit}"
+                        + (f" (queue {q.qsize()}/{self.queue_size})" if q is not None else "")
+                        for stage, q in zip(self.stages, self.queues + [None])
+                    )
+                )
+
+    def run(self, source):
+        """Run all stages to completion; returns per-stage stats and the wall time."""
+        source = iter(source)
+        threads = [
+            threading.Thread(
+                target=self._run_stage, args=(i, source), name=f"ingest-{stage.name}",
+                daemon=True,
+            )
+            for i, stage in enumerate(self.stages)
+        ]
+        done = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(done,), daemon=True)
+
+        start = time.perf_counter()
+        monitor.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        done.set()
+        monitor.join()
+        wall_seconds = time.perf_counter() - start
+
+        if self._errors:
+            name, error = self._errors[0]
+            raise RuntimeError(f"Ingestion stage {name!r} failed: {error}") from error
+
+        return {
+            "wall_s": wall_seconds,
+            "stages": [stage.stats(wall_seconds) for stage in self.stages],
+        }
+
+
+def print_stage_report(result):
+    """Print per-stage throughput and queue depth, marking the bottleneck."""
+    stages = result["stages"]
+    bottleneck = max(stages, key=lambda s: s["busy_s"])["stage"]
+    print(f"Ingestion finished in {result['wall_s']:.1f}s")
+    print(
+        f"  {'stage':<10}{'units':>14}{'busy_s':>9}{'in_wait_s':>11}{'out_wait_s':>12}"
+        f"{'units/busy_s':>14}{'queue_mean':>12}{'queue_max':>11}"
+    )
+    for s in stages:
+        rate = f"{s['units_per_busy_s']:.1f}" if s["units_per_busy_s"] else "-"
+        print(
+            f"  {s['stage']:<10}{s['units']:>7} {s['unit']:<6}{s['busy_s']:>9.1f}"
+            f"{s['input_wait_s']:>11.1f}{s['output_wait_s']:>12.1f}{rate:>14}"
+            f"{s['queue_depth_mean']:>12.1f}{s['queue_depth_max']:>11}"
+            + ("  <- bottleneck" if s["stage"] == bottleneck else "")
+        )
+
+
+def ingest_pdfs(
+    vectordb,
+    filenames,
+    data_directory,
+    cache,
+    text_splitter,
+    markdown_splitter,
+    prepare_chunks,
+    incremental=False,
+    num_workers=1,
+    batch_size=256,
+    queue_size=4,
+    report_interval=10.0,
+):
+    """
+    Convert, split, chunk, embed and insert PDFs as one streaming pipeline.
+
+    Files whose chunk cache entry is fresh skip conversion and splitting; the
+    chunks of converted files are written to the cache as they are produced.
+    With incremental=True, unchanged chunks (same content hash as the stored
+    row) are skipped, changed ones replaced and rows of chunks that no longer
+    exist deleted at the end, as in index_sync.sync_vector_db.
+
+    Parameters:
+        vectordb: Backend with to_node, embed_nodes, replace_nodes and refresh
+            (plus stored_content_hashes, stored_node_ids and delete_nodes for
+            incremental runs).
+        filenames (list): PDF file names inside data_directory.
+        cache (ChunkCache): Per-file chunk cache.
+        prepare_chunks (callable): Takes the chunk dicts of one file and returns
+            the ones to index, with stable ids and content hashes (dropping
+            duplicates, if enabled).
+        num_workers (int): PDF conversion processes.
+        batch_size (int): Chunks embedded and inserted per batch.
+        queue_size (int): Capacity of the queues between stages.
+
+    Returns:
+        dict: Chunk counts (added, updated, removed, unchanged) and stage stats.
+    """
+    pdf_hashes = {f: file_hash(Path(data_directory) / f) for f in filenames}
+    stale = {f for f in filenames if not cache.is_fresh(f, pdf_hashes[f])}
+    print(f"Found {len(filenames)} PDF files, {len(stale)} need processing")
+
+    stored_hashes = vectordb.stored_content_hashes() if incremental else {}
+    seen_ids, updated_ids = set(), set()
+    counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    failed = []
+
+    def convert(files):
+        # Fresh files bypass conversion; their chunks are read from the cache
+        stale_files = []
+        for filename in files:
+            if filename in stale:
+                stale_files.append(filename)
+            else:
+                yield filename, None
+        if not stale_files:
+            return
+        for filename, mdfile, error in convert_pdfs_parallel(
+            stale_files, data_directory, num_workers
+        ):
+            if error:
+                print(f"Failed to process {filename}: {error}")
+                failed.append(filename)
+                # Keep serving the previous version of the file, if any
+                if filename in cache.manifest["files"]:
+                    yield filename, None
+                continue
+            yield filename, mdfile
+
+    def split_headers(documents):
+        for filename, mdfile in documents:
+            if mdfile is None:
+                yield filename, None
+            else:
+                yield filename, markdown_splitter.split_text(mdfile)
+
+    def chunk(documents):
+        for filename, sections in documents:
+            if sections is None:
+                chunks = list(cache.iter_chunks(filename))
+            else:
+                chunks = chunk_sections(filename, sections, text_splitter)
+                cache.write(filename, pdf_hashes[filename], chunks)
+
+            pending = []
+            for document in prepare_chunks(chunks):
+                document_id = document["metadata"]["document_id"]
+                seen_ids.add(document_id)
+                if document_id not in stored_hashes:
+                    counts["added"] += 1
+                elif stored_hashes[document_id] != document["metadata"][CONTENT_HASH_KEY]:
+                    counts["updated"] += 1
+                    updated_ids.add(document_id)
+                else:
+                    counts["unchanged"] += 1
+                    continue
+                pending.append(document)
+            if pending:
+                yield pending
+
+    def embed(chunk_lists):
+        batch = []
+        for chunks in chunk_lists:
+            batch.extend(chunks)
+            while len(batch) >= batch_size:
+                nodes = [vectordb.to_node(doc) for doc in batch[:batch_size]]
+                batch = batch[batch_size:]
+                yield vectordb.embed_nodes(nodes)
+        if batch:
+            yield vectordb.embed_nodes([vectordb.to_node(doc) for doc in batch])
+
+    def insert(node_batches):
+        for nodes in node_batches:
+            # Updated chunks are replaced: the old rows are deleted in the
+            # transaction that inserts the new ones
+            replaced = [node.node_id for node in nodes if node.node_id in updated_ids]
+            vectordb.replace_nodes(replaced, nodes, refresh=False)
+            yield nodes
+
+    pipeline = Pipeline(
+        [
+            Stage("convert", convert, unit="files"),
+            Stage("split", split_headers, unit="files"),
+            Stage("chunk", chunk, unit="chunks", size=len),
+            Stage("embed", embed, unit="chunks", size=len),
+            Stage("insert", insert, unit="chunks", size=len),
+        ],
+        queue_size=queue_size,
+        report_interval=report_interval,
+    )
+    result = pipeline.run(filenames)
+
+    if incremental:
+        # Files that failed without a cached version emitted no chunks; keep
+        # serving their stored rows instead of deleting them as orphans
+        kept = set(vectordb.stored_node_ids(failed)) if failed else set()
+        removed = [
+            doc_id for doc_id in stored_hashes if doc_id not in seen_ids and doc_id not in kept
+        ]
+        if removed:
+            vectordb.delete_nodes(removed, refresh=False)
+        counts["removed"] = len(removed)
+
+    # Searchable again once, instead of after every batch
+    vectordb.refresh()
+
+    print_stage_report(result)
+    print(
+        "Ingestion summary: {added} added, {updated} updated, "
+        "{removed} removed, {unchanged} unchanged".format(**counts)
+    )
+    if failed:
+        print(f"{len(failed)} file(s) failed to process: {failed}")
+
+    return {**counts, "failed": failed, **result}
@@ -0,0 +1,484 @@
+"""
+memory_storage.py
+
+In-process hybrid retrieval backend with the same interface as PGVectorDB.
+
+Dense search is a vectorized dot product over a normalized (memory-mapped)
+embedding matrix; sparse search is BM25 over the chunk content and header
+metadata, as in the minsearch setup of notebook 03. Results of both are
+combined with reciprocal rank fusion and can be filtered on metadata. The index
+is saved to a directory and memory-mapped back in on load.
+
+With quantization set to "int8" or "binary", dense candidates are found with
+compact codes held in memory and only the top candidates are rescored with
+the float vectors, which then stay on disk behind the memory map.
+"""
+
+import json
+import math
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.vector_stores.types import FilterOperator, MetadataFilters
+from tqdm import tqdm
+
+from utils.index_sync import CONTENT_HASH_KEY, EXCLUDED_METADATA_KEYS, sync_vector_db
+from utils.quantization import QUANTIZATION_METHODS, create_quantizer
+from utils.tracing import tracer
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from how i in is it of on or that the this to "
+    "was what when where which who why will with you your".split()
+)
+
+DEFAULT_FIELD_BOOSTS = {"content": 3.0, "Header 1": 1.0, "Header 2": 2.0, "Header 3": 1.0}
+
+# Constant of reciprocal rank fusion, 1 / (k + rank)
+RRF_K = 60
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+class BM25Index:
+    """BM25 over several text fields, each field's term counts weighted by a boost."""
+
+    def __init__(self, field_boosts=None, k1=1.5, b=0.75):
+        self.field_boosts = field_boosts or DEFAULT_FIELD_BOOSTS
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+
+    def fit(self, records):
+        """Index records, each a dict mapping field name to text."""
+        postings = {}
+        doc_lengths = np.zeros(len(records), dtype=np.float32)
+
+        for doc_id, record in enumerate(records):
+            counts = Counter()
+            for field, boost in self.field_boosts.items():
+                for token in tokenize(record.get(field) or ""):
+                    counts[token] += boost
+            doc_lengths[doc_id] = sum(counts.values())
+            for token, weight in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(doc_id)
+                postings[token][1].append(weight)
+
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if len(records) else 0.0
+        self.postings = {
+            token: (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for token, (ids, tfs) in postings.items()
+        }
+        return self
+
+    def scores(self, query):
+        """Return the BM25 score of every document for the query."""
+        n_docs = len(self.doc_lengths)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        if not n_docs:
+            return scores
+
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.avg_length or 1.0))
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            ids, tfs = self.postings[token]
+            idf = math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm[ids])
+        return scores
+
+
+def _top_k(scores, k, mask=None):
+    """Indices of the k highest scores (restricted to mask), best first."""
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class InMemoryVectorDB:
+    """Hybrid dense + BM25 retrieval held in process memory, persisted to a directory."""
+
+    def __init__(self, path=None, embed_dim=1024, field_boosts=None, quantization="none",
+                 rescore_multiplier=4):
+        self.path = Path(path) if path else None
+        self.embed_dim = embed_dim
+        self.field_boosts = field_boosts or DEFAULT_FIELD_BOOSTS
+        self.embedding_model = None
+        self.set_quantization(quantization, rescore_multiplier)
+
+        self._node_ids = []
+        self._texts = []
+        self._metadata = []
+        self._embeddings = np.zeros((0, embed_dim), dtype=np.float32)
+        # Batches inserted with refresh=False, stacked onto _embeddings by refresh()
+        self._pending_embeddings = []
+        self._bm25 = BM25Index(self.field_boosts)
+        self._version = 0
+
+    def build_index(self, embedding_model, load=True):
+        """Attach the embedding model and load the saved index if there is one."""
+        self.embedding_model = embedding_model
+        if load and self.path is not None and (self.path / "nodes.jsonl").exists():
+            self.load()
+
+    def __len__(self):
+        return len(self._node_ids)
+
+    # --- ingestion -------------------------------------------------------
+
+    @staticmethod
+    def to_node(document):
+
+        return TextNode(
+            text=document["content"],
+            metadata=document["metadata"],
+            id_=document["metadata"]["document_id"],
+            excluded_embed_metadata_keys=EXCLUDED_METADATA_KEYS,
+            excluded_llm_metadata_keys=EXCLUDED_METADATA_KEYS,
+        )
+
+    def add_document(self, document):
+
+        self.add_documents([document])
+
+    def embed_nodes(self, nodes):
+        """Embed a batch of nodes with a single batched call to the embedding model."""
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        embeddings = self.embedding_model.get_text_embedding_batch(texts)
+
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+
+        return nodes
+
+    def insert_nodes(self, nodes, refresh=True):
+        """
+        Append already-embedded nodes. refresh=False defers stacking the
+        embedding matrix and re-fitting the BM25 index, for callers that insert
+        several batches and call refresh() once.
+        """
+        if not nodes:
+            return
+        matrix = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self._pending_embeddings.append(matrix)
+
+        for node in nodes:
+            self._node_ids.append(node.node_id)
+            self._texts.append(node.text)
+            self._metadata.append(node.metadata)
+        if refresh:
+            self._refresh()
+
+    def add_documents(self, documents, batch_size=256):
+        """Embed documents in batches and append them to the index."""
+        start = time.perf_counter()
+
+        with tqdm(
+            total=len(documents), desc="Adding documents to memory index", unit="chunk"
+        ) as progress:
+            for i in range(0, len(documents), batch_size):
+                nodes = [self.to_node(doc) for doc in documents[i : i + batch_size]]
+                self.insert_nodes(self.embed_nodes(nodes), refresh=False)
+                progress.update(len(nodes))
+
+        self.refresh()
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"Indexed {len(documents)} chunks in {elapsed:.1f}s "
+            f"({len(documents) / max(elapsed, 1e-9):.1f} chunks/sec)"
+        )
+        return {"chunks": len(documents)}
+
+    def stored_content_hashes(self):
+        """Return a mapping of stored document_id to its content hash."""
+        return {
+            node_id: metadata.get(CONTENT_HASH_KEY)
+            for node_id, metadata in zip(self._node_ids, self._metadata)
+        }
+
+    def stored_node_ids(self, pdf_names):
+        """Return the document_ids of the stored chunks of the given PDFs."""
+        pdf_names = set(pdf_names)
+        return [
+            node_id
+            for node_id, metadata in zip(self._node_ids, self._metadata)
+            if metadata.get("pdf_name") in pdf_names
+        ]
+
+    def delete_nodes(self, node_ids, refresh=True):
+        """Remove all entries whose node_id is in node_ids (see insert_nodes for refresh)."""
+        node_ids = set(node_ids)
+        if not node_ids:
+            return
+        self._stack_pending()
+        keep = [i for i, node_id in enumerate(self._node_ids) if node_id not in node_ids]
+        self._node_ids = [self._node_ids[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+        self._metadata = [self._metadata[i] for i in keep]
+        self._embeddings = np.asarray(self._embeddings)[keep]
+        if refresh:
+            self._refresh()
+
+    def replace_nodes(self, node_ids, nodes, refresh=True):
+        """Delete the entries in node_ids and insert nodes (see insert_nodes for refresh)."""
+        self.delete_nodes(node_ids, refresh=False)
+        self.insert_nodes(nodes, refresh=False)
+        if refresh:
+            self._refresh()
+
+    def sync_documents(self, documents, batch_size=256):
+        """Incrementally add, replace and remove chunks; see index_sync.sync_vector_db."""
+        return sync_vector_db(self, documents, batch_size=batch_size)
+
+    def refresh(self):
+        """Make nodes inserted or deleted with refresh=False searchable."""
+        self._refresh()
+
+    def _stack_pending(self):
+        if self._pending_embeddings:
+            self._embeddings = np.vstack(
+                [np.asarray(self._embeddings)] + self._pending_embeddings
+            )
+            self._pending_embeddings = []
+
+    def _refresh(self):
+        self._stack_pending()
+        records = [
+            {**{k: v for k, v in metadata.items() if isinstance(v, str)}, "content": text}
+            for text, metadata in zip(self._texts, self._metadata)
+        ]
+        self._bm25 = BM25Index(self.field_boosts).fit(records)
+        self._version += 1
+        self._quantizer, self._codes = None, None
+
+    def index_version(self):
+        """Fingerprint of the current contents, changes whenever the index does."""
+        return f"{len(self._node_ids)}:{self._version}"
+
+    # --- persistence -----------------------------------------------------
+
+    def save(self, path=None):
+        """Write the embeddings (.npy) and the node texts/metadata (.jsonl) to disk."""
+        path = Path(path) if path else self.path
+        path.mkdir(parents=True, exist_ok=True)
+
+        self._stack_pending()
+        np.save(path / "embeddings.npy", np.asarray(self._embeddings, dtype=np.float32))
+        with open(path / "nodes.jsonl", "w") as f:
+            for node_id, text, metadata in zip(self._node_ids, self._texts, self._metadata):
+                f.write(
+                    json.dumps({"node_id": node_id, "text": text, "metadata": metadata})
+                    + "\n"
+                )
+        print(f"Saved {len(self._node_ids)} chunks to {path}")
+
+    def load(self, path=None):
+        """Load a saved index; the embedding matrix is memory-mapped, not read."""
+        path = Path(path) if path else self.path
+        start = time.perf_counter()
+
+        self._embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+        self._pending_embeddings = []
+        self._node_ids, self._texts, self._metadata = [], [], []
+        with open(path / "nodes.jsonl", "r") as f:
+            for line in f:
+                record = json.loads(line)
+                self._node_ids.append(record["node_id"])
+                self._texts.append(record["text"])
+                self._metadata.append(record["metadata"])
+        self._refresh()
+
+        print(
+            f"Loaded {len(self._node_ids)} chunks from {path} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    # --- search ----------------------------------------------------------
+
+    def _filter_mask(self, filters):
+        """Boolean mask of documents matching filters (dict or MetadataFilters)."""
+        if not filters:
+            return None
+
+        if isinstance(filters, MetadataFilters):
+            conditions = {}
+            for f in filters.filters:
+                if f.operator == FilterOperator.IN:
+                    conditions[f.key] = list(f.value)
+                elif f.operator == FilterOperator.EQ:
+                    conditions[f.key] = f.value
+                else:
+                    raise ValueError(f"Unsupported filter operator: {f.operator}")
+        else:
+            conditions = filters
+
+        mask = np.ones(len(self._node_ids), dtype=bool)
+        for key, value in conditions.items():
+            allowed = set(value) if isinstance(value, (list, tuple, set)) else {value}
+            mask &= np.fromiter(
+                (metadata.get(key) in allowed for metadata in self._metadata),
+                dtype=bool,
+                count=len(self._metadata),
+            )
+        return mask
+
+    def set_quantization(self, quantization="none", rescore_multiplier=4):
+        """Choose how dense candidates are searched: "none", "int8" or "binary"."""
+        if quantization not in QUANTIZATION_METHODS:
+            raise ValueError(
+                f"Unknown quantization {quantization!r}; expected one of {QUANTIZATION_METHODS}"
+            )
+        self.quantization = quantization
+        self.rescore_multiplier = rescore_multiplier
+        self._quantizer, self._codes = None, None
+
+    def _quantized(self):
+        """Build the codes on first use (streamed from the memory-mapped vectors)."""
+        if self._codes is None:
+            quantizer = create_quantizer(self.quantization)
+            quantizer.fit(self._embeddings)
+            self._codes = quantizer.encode(self._embeddings)
+            self._quantizer = quantizer
+        return self._quantizer, self._codes
+
+    def vector_memory_bytes(self):
+        """Bytes of the matrix scanned by dense search (codes when quantized)."""
+        if self.quantization == "none":
+            return int(np.asarray(self._embeddings).nbytes)
+        return int(self._quantized()[1].nbytes)
+
+    def dense_search(self, query_embedding, top_k, mask=None):
+        """Return (indices, cosine scores) of the top_k nearest chunks."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if self.quantization == "none":
+            scores = np.asarray(self._embeddings) @ query
+            top = _top_k(scores, top_k, mask)
+            return top, scores[top]
+
+        # Candidates from the compact codes, rescored with the float vectors
+        quantizer, codes = self._quantized()
+        candidates = _top_k(
+            quantizer.scores(codes, query), top_k * self.rescore_multiplier, mask
+        )
+        candidates = np.sort(candidates)  # sequential reads from the memory map
+        exact = np.asarray(self._embeddings[candidates], dtype=np.float32) @ query
+        order = np.argsort(-exact)[:top_k]
+        return candidates[order], exact[order]
+
+    def sparse_search(self, query_str, top_k, mask=None):
+        """Return (indices, BM25 scores) of the top_k chunks with a non-zero score."""
+        scores = self._bm25.scores(query_str)
+        positive = scores > 0 if mask is None else mask & (scores > 0)
+        top = _top_k(scores, top_k, positive)
+        return top, scores[top]
+
+    def search(self, query_bundle, mode="hybrid", similarity_top_k=2, sparse_top_k=4,
+               filters=None):
+        """
+        Retrieve chunks for a query.
+
+        Parameters:
+            query_bundle (QueryBundle): Query text and, optionally, its embedding.
+            mode (str): "default"/"dense", "sparse"/"text_search" or "hybrid".
+            similarity_top_k (int): Number of dense results.
+            sparse_top_k (int): Number of BM25 results.
+            filters: Metadata filters, a dict or llama-index MetadataFilters.
+
+        Returns:
+            list: NodeWithScore results, best first.
+        """
+        if not self._node_ids:
+            return []
+
+        mask = self._filter_mask(filters)
+        ranked = []
+
+        if mode in ("default", "dense", "hybrid"):
+            embedding = query_bundle.embedding
+            if embedding is None:
+                embedding = self.embedding_model.get_query_embedding(query_bundle.query_str)
+            with tracer.span("vector_search"):
+                indices, scores = self.dense_search(embedding, similarity_top_k, mask)
+            ranked.append((indices, scores))
+
+        if mode in ("sparse", "text_search", "hybrid"):
+            with tracer.span("text_search"):
+                ranked.append(self.sparse_search(query_bundle.query_str, sparse_top_k, mask))
+
+        if len(ranked) == 1:
+            results = zip(*ranked[0])
+        else:
+            with tracer.span("fusion"):
+                fused = {}
+                for indices, _ in ranked:
+                    for rank, index in enumerate(indices):
+                        index = int(index)
+                        fused[index] = fused.get(index, 0.0) + 1.0 / (RRF_K + rank + 1)
+                results = sorted(fused.items(), key=lambda item: -item[1])
+
+        return [
+            NodeWithScore(
+                node=TextNode(
+                    id_=self._node_ids[index],
+                    text=self._texts[index],
+                    metadata=self._metadata[index],
+                    excluded_embed_metadata_keys=EXCLUDED_METADATA_KEYS,
+                    excluded_llm_metadata_keys=EXCLUDED_METADATA_KEYS,
+                ),
+                score=float(score),
+            )
+            for index, score in results
+        ]
+
+    def as_retriever(self, vector_store_query_mode="hybrid", similarity_top_k=2,
+                     sparse_top_k=4, filters=None, **kwargs):
+
+        return InMemoryRetriever(
+            self,
+            mode=vector_store_query_mode,
+            similarity_top_k=similarity_top_k,
+            sparse_top_k=sparse_top_k,
+            filters=filters,
+        )
+
+
+class InMemoryRetriever(BaseRetriever):
+    """llama-index retriever over an InMemoryVectorDB."""
+
+    def __init__(self, vectordb, mode="hybrid", similarity_top_k=2, sparse_top_k=4,
+                 filters=None):
+        super().__init__()
+        self._vectordb = vectordb
+        self._mode = mode
+        self._similarity_top_k = similarity_top_k
+        self._sparse_top_k = sparse_top_k
+        self._filters = filters
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._vectordb.search(
+            query_bundle,
+            mode=self._mode,
+            similarity_top_k=self._similarity_top_k,
+            sparse_top_k=self._sparse_top_k,
+            filters=self._filters,
+        )
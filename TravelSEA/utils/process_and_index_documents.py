@@ -2,18 +2,14 @@
 
 ## This notebook will be used to process the pdf files exported from WikiVoyage and index them in a vector store.
 
+import argparse
 import hashlib
+import json
+import multiprocessing
 import os
 import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from langchain_text_splitters import (
-    MarkdownHeaderTextSplitter,
-    RecursiveCharacterTextSplitter,
-)
-
-# from marker.convert import convert_single_pdf
-# from marker.logger import configure_logging
-# from marker.models import load_all_models
 from tqdm import tqdm
 
 
@@ -52,8 +48,56 @@ def download_and_process_pdf_file(
 
     mdfile = convert_pdf_to_markdown(temp_file_name, reference_folder, model_lst, None)
 
+    return split_markdown_document(f_key, mdfile, text_splitter, markdown_splitter)
+
+
+def split_markdown_document(f_key, mdfile, text_splitter, markdown_splitter):
+    """Split a converted markdown document into chunk dicts with metadata."""
+
     md_header_split = markdown_splitter.split_text(mdfile)
 
+    return chunk_sections(f_key, md_header_split, text_splitter)
+
+
+def legacy_chunk_id(f_key, part):
+    """
+    Chunk id of the first processing scheme: the position of the chunk in its
+    header section, so every section's chunks collided with the previous ones.
+    Kept as legacy_document_id to match ground truth generated with it.
+    """
+    return hashlib.md5(f"{f_key}_part_{part}".encode()).hexdigest()[:10]
+
+
+def stable_chunk_id(f_key, headers, content):
+    """Content-derived chunk id: hash of the PDF name, section headers and text."""
+    payload = json.dumps([f_key, headers, content], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def assign_chunk_ids(documents):
+    """
+    Set document_id (stable, content-derived) and legacy_document_id on chunk
+    dicts. Identical chunks under the same headers of one PDF get -1, -2, ...
+    suffixes in document order. Idempotent, so it also upgrades cached chunks.
+    """
+    counts = {}
+    for document in documents:
+        metadata = document["metadata"]
+        headers = {key: value for key, value in metadata.items() if key.startswith("Header")}
+        base_id = stable_chunk_id(metadata["pdf_name"], headers, document["content"])
+        n = counts.get(base_id, 0)
+        counts[base_id] = n + 1
+
+        metadata["document_id"] = base_id if n == 0 else f"{base_id}-{n}"
+        metadata["legacy_document_id"] = legacy_chunk_id(
+            metadata["pdf_name"], metadata["pdf_part"]
+        )
+    return documents
+
+
+def chunk_sections(f_key, md_header_split, text_splitter):
+    """Split the header sections of one document into chunk dicts with metadata."""
+
     documents = []
     for split in md_header_split:
 
@@ -61,13 +105,8 @@ def download_and_process_pdf_file(
 
         for i, split_text in enumerate(split_texts):
 
-            document_id = f"{f_key}_part_{i}"
-            hash_object = hashlib.md5(document_id.encode())
-            hash_hex = hash_object.hexdigest()
-            document_id = hash_hex[:10]
-
             metadata_dict = {
-                "document_id": document_id,
+                "document_id": None,  # set by assign_chunk_ids
                 "pdf_name": f_key,
                 "pdf_part": i,
             }
@@ -76,7 +115,76 @@ def download_and_process_pdf_file(
 
             documents.append({"metadata": metadata_dict, "content": split_text})
 
-    return documents
+    return assign_chunk_ids(documents)
+
+
+def load_marker_models():
+    """Import marker (slow, loads torch) on first use and load its models."""
+    global convert_single_pdf
+
+    from marker.convert import convert_single_pdf
+    from marker.logger import configure_logging
+    from marker.models import load_all_models
+
+    configure_logging()
+    return load_all_models()
+
+
+# Marker models loaded once per worker process by _init_conversion_worker
+_worker_models = None
+
+
+def _init_conversion_worker():
+    global _worker_models
+
+    _worker_models = load_marker_models()
+
+
+def _convert_in_worker(f_key, reference_folder):
+    # Errors are returned rather than raised so one bad PDF only fails itself
+    try:
+        temp_file_name = parse_file_name(f_key)
+        mdfile = convert_pdf_to_markdown(
+            temp_file_name, reference_folder, _worker_models, None
+        )
+        return f_key, mdfile, None
+    except Exception as e:
+        return f_key, None, f"{type(e).__name__}: {e}"
+
+
+def convert_pdfs_parallel(filenames, reference_folder, num_workers):
+    """
+    Convert PDF files to markdown in a pool of worker processes.
+
+    Each worker loads the marker models once and converts files independently.
+    Results are yielded as soon as each file finishes, in completion order.
+
+    Parameters:
+        filenames (list): PDF file names inside reference_folder.
+        reference_folder (str): Directory containing the PDF files.
+        num_workers (int): Number of worker processes.
+
+    Yields:
+        tuple: (filename, markdown text or None, error message or None).
+    """
+    # "spawn" avoids forking a parent that may already hold torch/CUDA state
+    context = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=context,
+        initializer=_init_conversion_worker,
+    ) as executor:
+        futures = {
+            executor.submit(_convert_in_worker, filename, reference_folder): filename
+            for filename in filenames
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # e.g. a worker crashed hard and the pool became unusable
+                yield futures[future], None, f"{type(e).__name__}: {e}"
 
 
 def list_pdf_files(directory_path):
@@ -102,15 +210,25 @@ def list_pdf_files(directory_path):
 
 
 def main():
+    from langchain_text_splitters import (
+        MarkdownHeaderTextSplitter,
+        RecursiveCharacterTextSplitter,
+    )
+
+    parser = argparse.ArgumentParser(description="Process and chunk PDF documents")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes used for PDF conversion",
+    )
+    args = parser.parse_args()
 
     # Usage example
     directory = "../data/"  # Replace with your directory path
     filenames = list_pdf_files(directory)
     print(f"Number of PDFs read: {len(filenames)}")
 
-    configure_logging()
-    model_lst = load_all_models()
-
     headers_to_split_on = [
         ("#", "Header 1"),
         ("##", "Header 2"),
@@ -127,19 +245,36 @@ def main():
 
     documents = []
 
-    for filename in tqdm(filenames):
+    if args.workers > 1:
+        for filename, mdfile, error in tqdm(
+            convert_pdfs_parallel(filenames, directory, args.workers),
+            total=len(filenames),
+        ):
+            if error:
+                print(f"Failed to process {filename}: {error}")
+                continue
+
+            documents.append(
+                split_markdown_document(
+                    filename, mdfile, text_splitter, markdown_splitter
+                )
+            )
+    else:
+        model_lst = load_marker_models()
 
-        print("\n filename: {} \n".format(filename))
+        for filename in tqdm(filenames):
 
-        splitted_doc = download_and_process_pdf_file(
-            filename,
-            text_splitter,
-            markdown_splitter,
-            model_lst,
-            reference_folder="../data/",
-        )
+            print("\n filename: {} \n".format(filename))
+
+            splitted_doc = download_and_process_pdf_file(
+                filename,
+                text_splitter,
+                markdown_splitter,
+                model_lst,
+                reference_folder="../data/",
+            )
 
-        documents.append(splitted_doc)
+            documents.append(splitted_doc)
 
     flattened_list = [item for sublist in documents for item in sublist]
 
@@ -0,0 +1,93 @@
+"""
+quantization.py
+
+Compact embedding codes for candidate search: int8 scalar quantization (4x
+smaller than float32) and binary sign quantization (32x smaller). Candidates
+found with the codes are rescored with the full-precision vectors.
+"""
+
+import numpy as np
+
+QUANTIZATION_METHODS = ("none", "int8", "binary")
+
+# Number of set bits of every byte value, for Hamming distances
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(bits):
+    bitwise_count = getattr(np, "bitwise_count", None)  # NumPy >= 2.0
+    if bitwise_count is not None:
+        return bitwise_count(bits)
+    return _POPCOUNT[bits]
+
+
+class Int8Quantizer:
+    """Symmetric per-dimension int8 codes: x ~= codes * scale."""
+
+    method = "int8"
+
+    def __init__(self, scale=None):
+        self.scale = scale
+
+    def fit(self, vectors, batch_size=4096):
+        max_abs = np.zeros(vectors.shape[1], dtype=np.float32)
+        for i in range(0, len(vectors), batch_size):
+            batch = np.abs(np.asarray(vectors[i : i + batch_size], dtype=np.float32))
+            max_abs = np.maximum(max_abs, batch.max(axis=0))
+        self.scale = np.maximum(max_abs, 1e-12) / 127.0
+        return self
+
+    def encode(self, vectors, batch_size=4096):
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for i in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[i : i + batch_size], dtype=np.float32)
+            codes[i : i + batch_size] = np.clip(np.rint(batch / self.scale), -127, 127)
+        return codes
+
+    def scores(self, codes, query, batch_size=4096):
+        """
+        Approximate dot products of query with every encoded vector. Codes are
+        converted to float32 one block of rows at a time into a reused buffer,
+        instead of upcasting the whole int8 matrix on every query.
+        """
+        weights = (np.asarray(query, dtype=np.float32) * self.scale).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        block = np.empty((min(batch_size, len(codes)), codes.shape[1]), dtype=np.float32)
+        for i in range(0, len(codes), batch_size):
+            rows = codes[i : i + batch_size]
+            np.copyto(block[: len(rows)], rows)
+            np.matmul(block[: len(rows)], weights, out=scores[i : i + len(rows)])
+        return scores
+
+
+class BinaryQuantizer:
+    """One bit per dimension (the sign), compared by Hamming distance."""
+
+    method = "binary"
+
+    def fit(self, vectors, batch_size=4096):
+        return self
+
+    def encode(self, vectors, batch_size=4096):
+        codes = np.empty((len(vectors), (vectors.shape[1] + 7) // 8), dtype=np.uint8)
+        for i in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[i : i + batch_size], dtype=np.float32)
+            codes[i : i + batch_size] = np.packbits(batch > 0, axis=1)
+        return codes
+
+    def scores(self, codes, query):
+        """Negative Hamming distance, so larger is more similar."""
+        query_bits = np.packbits(np.asarray(query) > 0)
+        distances = _popcount(np.bitwise_xor(codes, query_bits)).sum(axis=1, dtype=np.int32)
+        return -distances.astype(np.float32)
+
+
+def create_quantizer(method):
+    """Return an unfitted quantizer for method ("int8" or "binary")."""
+    if method == "int8":
+        return Int8Quantizer()
+    if method == "binary":
+        return BinaryQuantizer()
+    raise ValueError(
+        f"Unknown quantization {method!r}; expected one of {QUANTIZATION_METHODS}"
+    )
@@ -0,0 +1,109 @@
+"""
+query_batcher.py
+
+Micro-batching of concurrent query embeddings for the async service: queries
+arriving within a short window are embedded together in one forward pass.
+"""
+
+import asyncio
+import time
+
+
+def embed_queries(embed_model, queries):
+    """Embed several queries with a single model call when the model supports it."""
+    batch_fn = getattr(embed_model, "get_query_embedding_batch", None)
+    if batch_fn is not None:
+        return batch_fn(queries)
+
+    # HuggingFaceEmbedding embeds a list of sentences with the query prompt via _embed
+    embed_fn = getattr(embed_model, "_embed", None)
+    if embed_fn is not None:
+        return embed_fn(queries, prompt_name="query")
+
+    return [embed_model.get_query_embedding(query) for query in queries]
+
+
+class QueryEmbeddingBatcher:
+    """
+    Collects queries for up to max_wait_ms (or until max_batch_size queries are
+    waiting) and embeds them together in a worker thread.
+    """
+
+    def __init__(self, embed_model, max_batch_size=16, max_wait_ms=5.0):
+        self.embed_model = embed_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.queries = 0
+        self.embed_seconds = 0.0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """Start the background batching task on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def embed(self, query):
+        """Return the embedding of query, computed as part of a micro-batch."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        return await future
+
+    async def _collect_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            queries = [query for query, _ in batch]
+
+            start = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(
+                    None, embed_queries, self.embed_model, queries
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.embed_seconds += time.perf_counter() - start
+
+            self.batches += 1
+            self.queries += len(queries)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def stats(self):
+        """Return batch counts and the average batch size."""
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "embed_seconds": self.embed_seconds,
+        }
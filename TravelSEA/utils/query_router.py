@@ -0,0 +1,224 @@
+"""
+query_router.py
+
+Country-aware query routing. Every chunk carries the pdf_name of its source
+guide (one per country); when a question mentions a country, one of its
+demonyms or a major destination, retrieval is restricted to that country's
+guide with a pdf_name metadata filter, which is pushed into both the dense
+and the sparse search. Questions that mention no country search everything.
+"""
+
+import re
+from typing import List
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores.types import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+)
+
+from utils.tracing import tracer
+
+# Country guide -> names, demonyms and major destinations (lowercase, matched
+# case-insensitively). Aliases that are also ordinary words ("hue", "pagan")
+# or used outside their country ("thai" food) are left out or listed in
+# CASE_SENSITIVE_ALIASES.
+COUNTRY_ALIASES = {
+    "Brunei.pdf": [
+        "brunei", "bruneian", "bruneians", "bandar seri begawan", "kampong ayer",
+        "temburong", "ulu temburong",
+    ],
+    "Cambodia.pdf": [
+        "cambodia", "cambodian", "cambodians", "khmer", "kampuchea", "phnom penh",
+        "siem reap", "angkor", "angkor wat", "battambang", "sihanoukville", "kampot",
+        "koh rong", "kratie", "mondulkiri", "ratanakiri", "tonle sap",
+    ],
+    "Indonesia.pdf": [
+        "indonesia", "indonesian", "indonesians", "jakarta", "bali", "balinese",
+        "ubud", "lombok", "javanese", "yogyakarta", "jogja", "borobudur",
+        "prambanan", "sumatra", "sumatran", "sulawesi", "komodo",
+        "raja ampat", "papua", "bandung", "surabaya", "gili islands", "bromo",
+        "kalimantan", "labuan bajo", "lake toba",
+    ],
+    "Laos.pdf": [
+        "laos", "laotian", "laotians", "vientiane", "luang prabang",
+        "vang vieng", "pakse", "si phan don", "4000 islands", "plain of jars",
+        "phonsavan", "luang namtha", "nong khiaw", "champasak", "bolaven",
+    ],
+    "Malaysia.pdf": [
+        "malaysia", "malaysian", "malaysians", "kuala lumpur", "penang",
+        "george town", "georgetown", "malacca", "melaka", "langkawi",
+        "cameron highlands", "sabah", "sarawak", "kota kinabalu", "kuching",
+        "ipoh", "johor bahru", "perhentian", "tioman", "taman negara",
+        "mount kinabalu",
+    ],
+    "Myanmar.pdf": [
+        "myanmar", "burma", "burmese", "yangon", "rangoon", "mandalay", "bagan",
+        "inle lake", "naypyidaw", "nay pyi taw", "shwedagon",
+        "ngapali", "hpa-an", "kalaw", "mrauk u", "golden rock", "kyaiktiyo",
+    ],
+    "Philippines.pdf": [
+        "philippines", "philippine", "filipino", "filipina", "filipinos",
+        "pinoy", "manila", "cebu", "boracay", "palawan", "el nido",
+        "bohol", "davao", "mindanao", "luzon", "visayas", "siargao", "banaue",
+        "puerto princesa", "vigan", "baguio", "makati", "iloilo",
+    ],
+    "Singapore.pdf": [
+        "singapore", "singaporean", "singaporeans", "sentosa", "marina bay",
+        "orchard road", "little india", "changi", "jurong", "pulau ubin",
+    ],
+    "Thailand.pdf": [
+        "thailand", "siam", "bangkok", "chiang mai",
+        "chiang rai", "phuket", "krabi", "ko samui", "koh samui", "ko phangan",
+        "koh phangan", "ko tao", "koh tao", "pattaya", "ayutthaya", "sukhothai",
+        "hua hin", "kanchanaburi", "ko lanta", "koh lanta", "phi phi",
+        "khao sok", "isaan", "isan",
+    ],
+    "Vietnam.pdf": [
+        "vietnam", "viet nam", "vietnamese", "hanoi", "ho chi minh city",
+        "ho chi minh", "saigon", "hoi an", "da nang", "danang",
+        "ha long bay", "halong bay", "ha long", "halong", "sapa", "sa pa",
+        "mekong delta", "nha trang", "dalat", "da lat", "phu quoc",
+        "ninh binh", "mui ne", "can tho", "phong nha",
+    ],
+}
+
+# Destinations whose names are also common words, matched only as written
+CASE_SENSITIVE_ALIASES = {
+    "Coron": ["Philippines.pdf"],
+    "Flores": ["Indonesia.pdf"],
+    "Hue": ["Vietnam.pdf"],
+    "Java": ["Indonesia.pdf"],
+    "Kep": ["Cambodia.pdf"],
+    "Medan": ["Indonesia.pdf"],
+    "Pai": ["Thailand.pdf"],
+}
+
+# Regions spanning several guides
+REGION_ALIASES = {
+    "indochina": ["Cambodia.pdf", "Laos.pdf", "Vietnam.pdf"],
+    "mekong": ["Cambodia.pdf", "Laos.pdf", "Thailand.pdf", "Vietnam.pdf"],
+    "golden triangle": ["Laos.pdf", "Myanmar.pdf", "Thailand.pdf"],
+    "borneo": ["Brunei.pdf", "Indonesia.pdf", "Malaysia.pdf"],
+    "malay peninsula": ["Malaysia.pdf", "Singapore.pdf", "Thailand.pdf"],
+}
+
+# Guides that apply to every country
+GENERAL_GUIDES = ["Responsible_travel.pdf", "Sustainable_travel.pdf"]
+
+
+def _alias_pattern(aliases, flags=0):
+    # Longest aliases first so "ho chi minh city" wins over "ho chi minh"
+    alternatives = sorted(aliases, key=len, reverse=True)
+    return re.compile(
+        r"\b(?:" + "|".join(re.escape(alias) for alias in alternatives) + r")\b", flags
+    )
+
+
+class QueryRouter:
+    """Maps a question to the pdf_name guides it is about with precompiled regexes."""
+
+    def __init__(self, country_aliases=None, region_aliases=None,
+                 case_sensitive_aliases=None):
+        self._targets = {}
+        for pdf_name, aliases in (country_aliases or COUNTRY_ALIASES).items():
+            for alias in aliases:
+                self._targets.setdefault(alias, set()).add(pdf_name)
+        for alias, pdf_names in (region_aliases or REGION_ALIASES).items():
+            self._targets.setdefault(alias, set()).update(pdf_names)
+        self._pattern = _alias_pattern(self._targets, re.IGNORECASE)
+
+        self._case_sensitive_targets = {
+            alias: set(pdf_names)
+            for alias, pdf_names in (case_sensitive_aliases or CASE_SENSITIVE_ALIASES).items()
+        }
+        self._case_sensitive_pattern = _alias_pattern(self._case_sensitive_targets)
+
+    def route(self, question):
+        """Return the sorted pdf_names the question refers to (empty: no country found)."""
+        pdf_names = set()
+        for match in self._pattern.finditer(question):
+            pdf_names.update(self._targets[match.group(0).lower()])
+        for match in self._case_sensitive_pattern.finditer(question):
+            pdf_names.update(self._case_sensitive_targets[match.group(0)])
+        return sorted(pdf_names)
+
+
+def pdf_name_filters(pdf_names):
+    """Build the metadata filter restricting retrieval to the given guides."""
+    if len(pdf_names) == 1:
+        condition = MetadataFilter(key="pdf_name", value=pdf_names[0])
+    else:
+        condition = MetadataFilter(
+            key="pdf_name", value=list(pdf_names), operator=FilterOperator.IN
+        )
+    return MetadataFilters(filters=[condition])
+
+
+class RoutedRetriever(BaseRetriever):
+    """
+    Retriever that routes each question to the guides of the countries it
+    mentions and falls back to the unfiltered retriever otherwise (or when the
+    filtered search comes back empty).
+    """
+
+    def __init__(self, vectordb, router=None, include_general_guides=True,
+                 **retriever_kwargs):
+        super().__init__()
+        self._vectordb = vectordb
+        self._router = router or QueryRouter()
+        self._include_general_guides = include_general_guides
+        self._retriever_kwargs = retriever_kwargs
+        self._global_retriever = vectordb.as_retriever(**retriever_kwargs)
+        # One retriever per distinct filter, built on first use
+        self._routed_retrievers = {}
+        self.routed = 0
+        self.fallbacks = 0
+
+    def _retriever_for(self, question):
+        pdf_names = self._router.route(question)
+        if not pdf_names:
+            self.fallbacks += 1
+            tracer.increment("query_routes", route="global")
+            return None
+
+        if self._include_general_guides:
+            pdf_names = sorted(set(pdf_names) | set(GENERAL_GUIDES))
+        key = tuple(pdf_names)
+
+        retriever = self._routed_retrievers.get(key)
+        if retriever is None:
+            retriever = self._vectordb.as_retriever(
+                filters=pdf_name_filters(pdf_names), **self._retriever_kwargs
+            )
+            self._routed_retrievers[key] = retriever
+
+        self.routed += 1
+        tracer.increment("query_routes", route="filtered")
+        return retriever
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        retriever = self._retriever_for(query_bundle.query_str)
+        if retriever is not None:
+            nodes = retriever.retrieve(query_bundle)
+            if nodes:
+                return nodes
+        return self._global_retriever.retrieve(query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        retriever = self._retriever_for(query_bundle.query_str)
+        if retriever is not None:
+            nodes = await retriever.aretrieve(query_bundle)
+            if nodes:
+                return nodes
+        return await self._global_retriever.aretrieve(query_bundle)
+
+    def stats(self):
+        total = self.routed + self.fallbacks
+        return {
+            "routed": self.routed,
+            "global": self.fallbacks,
+            "routed_rate": self.routed / total if total else 0.0,
+        }
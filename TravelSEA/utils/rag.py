@@ -0,0 +1,230 @@
+"""
+rag.py
+
+Retrieval Augmented Generation pipeline shared by the Streamlit app and other
+entry points: retrieve context nodes, build the TravelSEA prompt and ask the LLM.
+"""
+
+import time
+
+from utils.tokens import count_tokens
+from utils.tracing import tracer
+
+PROMPT_TEMPLATE = """You are TravelSEA Advisor, an AI travel assistant specialized in sustainable tourism in Southeast Asia.
+        Use the following context to answer the question. If you cannot find the answer in the context,
+        say so politely and suggest what information might be helpful to better answer the question.
+
+        Context: {context}
+
+        Question: {query}
+
+        Answer: """
+
+
+def retrieve_nodes(query, retriever):
+    """
+    Return the source nodes relevant to the query.
+
+    Accepts either a retriever (preferred, no LLM involved) or a llama-index
+    query engine, in which case the synthesized answer is discarded and only
+    its source nodes are used.
+    """
+    with tracer.span("retrieve"):
+        if hasattr(retriever, "retrieve"):
+            return retriever.retrieve(query)
+
+        return retriever.query(query).source_nodes
+
+
+def build_prompt(query, nodes, context_packer=None):
+    """
+    Create the LLM prompt from the query and the retrieved nodes. With a
+    context_packer, overlapping chunks are merged and the context is fit
+    into its token budget; otherwise all node texts are concatenated.
+    """
+    with tracer.span("build_prompt"):
+        if context_packer is None:
+            context = "\n\n".join([node.text for node in nodes])
+        else:
+            context, _ = context_packer.pack(nodes)
+        prompt = PROMPT_TEMPLATE.format(context=context, query=query)
+
+    if tracer.enabled:
+        tracer.observe("context_chars", len(context))
+        tracer.observe("context_nodes", len(nodes), buckets=(1, 2, 4, 8, 16, 32))
+        tracer.observe("prompt_tokens", count_tokens(prompt))
+    return prompt
+
+
+def _prepare_rag(query, retriever, response_cache=None, embed_model=None,
+                 context_packer=None):
+    """
+    Run everything before generation.
+
+    Returns (cached answer, query embedding, nodes, prompt); when a cached
+    answer is found, retrieval is skipped and the last three are None.
+    """
+    query_embedding = None
+
+    if response_cache is not None:
+        with tracer.span("cache_lookup"):
+            answer = response_cache.get_exact(query)
+        if answer is not None:
+            tracer.increment("cache_lookups", cache="response", result="exact_hit")
+            return answer, None, None, None
+
+        if embed_model is None:
+            response_cache.record_miss()
+        else:
+            # Embed once and reuse the vector for both the cache and retrieval
+            query_embedding = embed_model.get_query_embedding(query)
+            with tracer.span("cache_lookup"):
+                answer = response_cache.get_semantic(query_embedding, query)
+            if answer is not None:
+                tracer.increment("cache_lookups", cache="response", result="semantic_hit")
+                return answer, None, None, None
+        tracer.increment("cache_lookups", cache="response", result="miss")
+
+    if query_embedding is None:
+        nodes = retrieve_nodes(query, retriever)
+    else:
+        from llama_index.core.schema import QueryBundle
+
+        nodes = retrieve_nodes(
+            QueryBundle(query_str=query, embedding=query_embedding), retriever
+        )
+
+    return None, query_embedding, nodes, build_prompt(query, nodes, context_packer)
+
+
+def get_rag_response(
+    query: str, retriever, llm, response_cache=None, embed_model=None,
+    context_packer=None,
+) -> str:
+    """
+    Get response using RAG:
+    1. Serve a cached answer if an identical or very similar question was seen
+    2. Retrieve relevant documents
+    3. Create prompt with context
+    4. Get LLM response
+    """
+    start = time.perf_counter()
+
+    with tracer.trace("rag_request") as trace:
+        answer, query_embedding, _, prompt = _prepare_rag(
+            query, retriever, response_cache, embed_model, context_packer
+        )
+        trace.set("cached", answer is not None)
+        if answer is not None:
+            return answer
+
+        with tracer.span("generate"):
+            response = llm.predict(prompt)
+
+    if response_cache is not None:
+        response_cache.put(
+            query, response, query_embedding, latency=time.perf_counter() - start
+        )
+
+    return response
+
+
+class RAGStream:
+    """
+    Streaming RAG answer. Iterate over tokens() to receive the answer as the LLM
+    produces it; afterwards text holds the assembled answer and
+    time_to_first_token/total_time the timings (seconds since the request started).
+    """
+
+    def __init__(self, query, llm, prompt, nodes, start, cached_answer=None,
+                 on_complete=None, trace=None):
+        self.query = query
+        self.nodes = nodes or []
+        self.text = ""
+        self.cached = cached_answer is not None
+        self.time_to_first_token = None
+        self.total_time = None
+
+        self._llm = llm
+        self._prompt = prompt
+        self._start = start
+        self._cached_answer = cached_answer
+        self._on_complete = on_complete
+        self._trace = trace or tracer.trace("rag_stream")
+
+    def tokens(self):
+        """Yield answer tokens as they arrive from the LLM."""
+        if self.cached:
+            self.time_to_first_token = time.perf_counter() - self._start
+            self.text = self._cached_answer
+            self.total_time = self.time_to_first_token
+            self._trace.finish()
+            yield self._cached_answer
+            return
+
+        parts = []
+        generate_start = time.perf_counter()
+        error = None
+        try:
+            for chunk in self._llm.stream(self._prompt):
+                # Chat models yield message chunks, plain LLMs yield strings
+                token = getattr(chunk, "content", chunk)
+                if not token:
+                    continue
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - self._start
+                parts.append(token)
+                yield token
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            # Also close the trace when the LLM raises or the consumer stops early
+            self.text = "".join(parts)
+            self.total_time = time.perf_counter() - self._start
+
+            if tracer.enabled:
+                generate_seconds = time.perf_counter() - generate_start
+                tracer.observe_stage("generate", generate_seconds)
+                self._trace.record("generate", generate_seconds)
+                if self.time_to_first_token is not None:
+                    tracer.observe_stage("time_to_first_token", self.time_to_first_token)
+                    self._trace.set("time_to_first_token_ms", 1000 * self.time_to_first_token)
+            self._trace.finish(error=error)
+
+        if self._on_complete is not None:
+            self._on_complete(self)
+
+
+def _cache_on_complete(response_cache, query, query_embedding):
+    """Callback storing a finished stream's answer in the response cache."""
+
+    def on_complete(stream):
+        response_cache.put(query, stream.text, query_embedding, latency=stream.total_time)
+
+    return on_complete
+
+
+def stream_rag_response(query: str, retriever, llm, response_cache=None,
+                        embed_model=None, context_packer=None) -> RAGStream:
+    """Like get_rag_response, but returns a RAGStream yielding tokens as they arrive."""
+    start = time.perf_counter()
+
+    # The trace stays open until the stream has finished generating
+    trace = tracer.trace("rag_stream")
+    with trace.activate():
+        answer, query_embedding, nodes, prompt = _prepare_rag(
+            query, retriever, response_cache, embed_model, context_packer
+        )
+    trace.set("cached", answer is not None)
+
+    on_complete = (
+        _cache_on_complete(response_cache, query, query_embedding)
+        if response_cache is not None and answer is None
+        else None
+    )
+
+    return RAGStream(
+        query, llm, prompt, nodes, start, cached_answer=answer, on_complete=on_complete,
+        trace=trace,
+    )
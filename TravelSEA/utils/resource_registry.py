@@ -0,0 +1,101 @@
+"""
+resource_registry.py
+
+Process-wide registry for long-lived resources (embedding model, vector index,
+query engine, LLM client). Streamlit re-executes the app script on every
+interaction, but imported modules are only loaded once per process, so a
+module-level registry lets every rerun and every session share the same objects.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from utils.tracing import tracer
+
+
+def config_hash(*configs):
+    """Return a stable short hash for one or more config objects or dicts."""
+    payload = []
+    for config in configs:
+        if hasattr(config, "model_dump"):
+            config = config.model_dump()
+        elif hasattr(config, "dict"):
+            config = config.dict()
+        payload.append(config)
+
+    serialized = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()[:16]
+
+
+class ResourceRegistry:
+    """Builds each resource once per (name, config hash) and reuses it afterwards."""
+
+    def __init__(self):
+        self._resources = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def get_or_build(self, name, config_key, builder):
+        """
+        Return the resource registered under name/config_key, building it if needed.
+
+        Parameters:
+            name (str): Logical resource name, e.g. "embedding_model".
+            config_key (str): Hash of the configuration the resource depends on.
+            builder (callable): Zero-argument callable creating the resource.
+
+        Returns:
+            The cached or newly built resource.
+        """
+        key = (name, config_key)
+
+        with self._lock:
+            stats = self._stats.setdefault(
+                key, {"hits": 0, "misses": 0, "build_seconds": None}
+            )
+            if key in self._resources:
+                stats["hits"] += 1
+                return self._resources[key]
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # Build outside the registry lock so unrelated resources are not blocked,
+        # but serialize concurrent builds of the same resource.
+        with build_lock:
+            with self._lock:
+                if key in self._resources:
+                    stats["hits"] += 1
+                    return self._resources[key]
+
+            start = time.perf_counter()
+            with tracer.span(f"startup_{name}"):
+                resource = builder()
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._resources[key] = resource
+                stats["misses"] += 1
+                stats["build_seconds"] = elapsed
+
+        # Build times are reported by stats() and the startup_<name> span
+        return resource
+
+    def stats(self):
+        """Return hit/miss counts and build time for every registered resource."""
+        with self._lock:
+            return {
+                f"{name}:{config_key}": dict(stats)
+                for (name, config_key), stats in self._stats.items()
+            }
+
+    def clear(self):
+        """Drop all cached resources (mainly useful for tests and reloads)."""
+        with self._lock:
+            self._resources.clear()
+            self._stats.clear()
+            self._build_locks.clear()
+
+
+registry = ResourceRegistry()
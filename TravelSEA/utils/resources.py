@@ -0,0 +1,246 @@
+"""
+resources.py
+
+Builders for the long-lived resources of the RAG pipeline (embedding model,
+vector database, retrieval engine, response cache, context packer, feedback
+log, tracing and LLM client). Every
+builder goes through the process-wide registry, so each resource is created
+once per configuration and shared by all sessions and entry points.
+
+Heavy dependencies (llama-index, the Hugging Face and OpenAI clients, the
+vector store backends) are imported inside the builders, so importing this
+module is cheap and each entry point only loads what it builds.
+"""
+
+from utils.context_packing import ContextPacker
+from utils.feedback_log import FeedbackLog, migrate_json_feedback
+from utils.resource_registry import config_hash, registry
+from utils.tracing import start_metrics_server, trace_methods, tracer
+
+
+def load_embedding_model(embedding_config, cache_config):
+    """Load the embedding model once per process and warm it up."""
+    from utils.embedding_backends import create_embedding_model, warmup_embedding
+
+    def build_model():
+        return create_embedding_model(
+            embedding_config.embed_model_name,
+            backend=embedding_config.backend,
+            num_threads=embedding_config.num_threads,
+            batch_size=embedding_config.batch_size,
+            max_length=embedding_config.max_length,
+            onnx_dir=embedding_config.onnx_path,
+        )
+
+    def build():
+        if not cache_config.enabled:
+            embedding_model = build_model()
+        else:
+            from utils.embedding_cache import create_cached_embedding
+
+            embedding_model = create_cached_embedding(
+                embedding_config.embed_model_name,
+                embedding_config.embed_dim,
+                build_model,
+                directory=cache_config.directory,
+                backend=embedding_config.backend,
+                dtype=cache_config.dtype,
+                max_entries=cache_config.max_entries,
+                embed_batch_size=embedding_config.batch_size,
+            )
+        warmup_embedding(embedding_model)
+
+        trace_methods(
+            embedding_model,
+            {
+                "_get_query_embedding": "embed_query",
+                "get_query_embedding_batch": "embed_query_batch",
+            },
+        )
+        return embedding_model
+
+    return registry.get_or_build(
+        "embedding_model", config_hash(embedding_config, cache_config), build
+    )
+
+
+def initialize_vector_db(config):
+    """Initialize the vector database backend selected in vector_store.backend."""
+    db_config = config.database
+    embedding_config = config.embedding_model
+    store_config = config.vector_store
+
+    def build():
+        embedding_model = load_embedding_model(embedding_config, config.embedding_cache)
+
+        if store_config.backend == "memory":
+            from utils.memory_storage import InMemoryVectorDB
+
+            vectordb = InMemoryVectorDB(
+                store_config.memory_path,
+                embed_dim=embedding_config.embed_dim,
+                quantization=store_config.quantization,
+                rescore_multiplier=store_config.rescore_multiplier,
+            )
+        else:
+            from utils.vector_storage import PGVectorDB
+
+            vectordb = PGVectorDB(
+                db_config.name,
+                db_config.host,
+                db_config.password,
+                db_config.username,
+                db_config.port,
+                db_config.table_name,
+                embed_dim=embedding_config.embed_dim,
+                ann_config=db_config.ann_index.model_dump(),
+                pool_config=db_config.pool.model_dump(),
+            )
+        vectordb.build_index(embedding_model)
+        return vectordb
+
+    return registry.get_or_build(
+        "vectordb",
+        config_hash(db_config, embedding_config, config.embedding_cache, store_config),
+        build,
+    )
+
+
+def initialize_vector_db_engine(config):
+    """Return the retrieval engine (retriever or query engine) for the vector database."""
+    retrieval_config = config.retrieval
+
+    def build():
+        from llama_index.core.query_engine import RetrieverQueryEngine
+
+        vectordb = initialize_vector_db(config)
+        engine_kwargs = dict(
+            vector_store_query_mode=retrieval_config.query_mode,
+            similarity_top_k=retrieval_config.similarity_top_k,
+            sparse_top_k=retrieval_config.sparse_top_k,
+        )
+        if retrieval_config.routing:
+            from utils.query_router import RoutedRetriever
+
+            retriever = RoutedRetriever(
+                vectordb,
+                include_general_guides=retrieval_config.routing_include_general_guides,
+                **engine_kwargs,
+            )
+            if retrieval_config.retriever_only:
+                return retriever
+            return RetrieverQueryEngine.from_args(retriever)
+
+        if retrieval_config.retriever_only:
+            return vectordb.as_retriever(**engine_kwargs)
+        if hasattr(vectordb, "index"):
+            return vectordb.index.as_query_engine(**engine_kwargs)
+        return RetrieverQueryEngine.from_args(vectordb.as_retriever(**engine_kwargs))
+
+    return registry.get_or_build(
+        "retrieval_engine",
+        config_hash(
+            config.database,
+            config.embedding_model,
+            config.embedding_cache,
+            config.vector_store,
+            retrieval_config,
+        ),
+        build,
+    )
+
+
+def initialize_response_cache(response_cache_config, vectordb):
+    """Create the answer cache shared by all sessions, or None when disabled."""
+    if not response_cache_config.enabled:
+        return None
+
+    def build():
+        from utils.response_cache import ResponseCache
+
+        scope_fn = None
+        if response_cache_config.semantic:
+            from utils.query_router import QueryRouter
+
+            # Similar questions about different countries must not share answers
+            scope_fn = QueryRouter().route
+
+        return ResponseCache(
+            max_entries=response_cache_config.max_entries,
+            ttl_seconds=response_cache_config.ttl_seconds,
+            similarity_threshold=response_cache_config.similarity_threshold,
+            index_version_fn=vectordb.index_version,
+            version_check_seconds=response_cache_config.version_check_seconds,
+            semantic=response_cache_config.semantic,
+            scope_fn=scope_fn,
+        )
+
+    return registry.get_or_build("response_cache", config_hash(response_cache_config), build)
+
+
+def initialize_context_packer(packing_config):
+    """Create the context packer shared by all sessions, or None when disabled."""
+    if not packing_config.enabled:
+        return None
+
+    return registry.get_or_build(
+        "context_packer",
+        config_hash(packing_config),
+        lambda: ContextPacker(
+            max_tokens=packing_config.max_tokens,
+            min_overlap=packing_config.min_overlap_chars,
+            max_overlap=packing_config.max_overlap_chars,
+            model=packing_config.tokenizer_model,
+        ),
+    )
+
+
+def initialize_feedback_log(feedback_config):
+    """Create the feedback log writer shared by all sessions."""
+
+    def build():
+        migrate_json_feedback(feedback_config.legacy_json_path, feedback_config.path)
+        return FeedbackLog(
+            feedback_config.path,
+            max_bytes=feedback_config.max_bytes,
+            backup_count=feedback_config.backup_count,
+            flush_interval_seconds=feedback_config.flush_interval_seconds,
+        )
+
+    return registry.get_or_build("feedback_log", config_hash(feedback_config), build)
+
+
+def initialize_tracing(tracing_config):
+    """Apply the tracing settings and start the metrics endpoint once per process."""
+    tracer.configure(
+        enabled=tracing_config.enabled,
+        log_requests=tracing_config.log_requests,
+        log_path=tracing_config.log_path,
+    )
+    if tracing_config.enabled and tracing_config.metrics_port:
+        registry.get_or_build(
+            "metrics_server",
+            config_hash(
+                {"host": tracing_config.metrics_host, "port": tracing_config.metrics_port}
+            ),
+            lambda: start_metrics_server(
+                tracing_config.metrics_port, tracing_config.metrics_host
+            ),
+        )
+    return tracer
+
+
+def initialize_llm(llm_config, openai_api_key):
+    """Create the chat model client once per process."""
+    key = config_hash(llm_config, {"api_key": openai_api_key})
+
+    def build():
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(
+            api_key=openai_api_key,
+            model=llm_config.openai_model,
+            temperature=llm_config.temperature,
+        )
+
+    return registry.get_or_build("llm", key, build)
@@ -0,0 +1,189 @@
+"""
+response_cache.py
+
+Two-tier answer cache for the RAG pipeline:
+- exact tier: keyed on the normalized question text;
+- semantic tier (opt-in): serves the answer of a previously seen question
+  whose query embedding has a cosine similarity above a configurable
+  threshold. Questions that differ in a single entity ("what to see in
+  Vietnam" / "... in Cambodia") embed almost identically, so hits are scoped:
+  only questions with the same scope_fn value (the routed country guides)
+  can share an answer.
+
+Entries expire after a TTL, the least recently used entry is evicted when the
+cache is full, and everything is dropped when the index version changes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(question):
+    """Lowercase and collapse whitespace and trailing punctuation."""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+class ResponseCache:
+    """Exact + semantic answer cache with LRU/TTL eviction and hit counters."""
+
+    def __init__(
+        self,
+        max_entries=1000,
+        ttl_seconds=3600,
+        similarity_threshold=0.95,
+        index_version_fn=None,
+        version_check_seconds=60,
+        semantic=False,
+        scope_fn=None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.semantic = semantic
+        self.scope_fn = scope_fn
+        self.index_version_fn = index_version_fn
+        self.version_check_seconds = version_check_seconds
+
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._matrix_keys = []
+        self._matrix_scopes = []
+        self._lock = threading.Lock()
+        self._index_version = None
+        self._last_version_check = 0.0
+        self._counters = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "latency_saved_seconds": 0.0,
+        }
+
+    def _check_index_version(self):
+        if self.index_version_fn is None:
+            return
+
+        now = time.monotonic()
+        if now - self._last_version_check < self.version_check_seconds:
+            return
+        self._last_version_check = now
+
+        version = self.index_version_fn()
+        if version != self._index_version:
+            if self._index_version is not None:
+                print("Index version changed; clearing response cache")
+            self._entries.clear()
+            self._matrix = None
+            self._index_version = version
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry["created"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _hit(self, key, counter):
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        self._counters[counter] += 1
+        self._counters["latency_saved_seconds"] += entry["latency"]
+        return entry["answer"]
+
+    def get_exact(self, question):
+        """Return the cached answer for the same normalized question, or None."""
+        with self._lock:
+            self._check_index_version()
+            self._expire()
+
+            key = normalize_question(question)
+            if key in self._entries:
+                return self._hit(key, "exact_hits")
+            return None
+
+    def _scope(self, question):
+        return tuple(self.scope_fn(question)) if self.scope_fn is not None else ()
+
+    def get_semantic(self, query_embedding, question):
+        """
+        Return the answer of the most similar cached question of the same scope
+        above the threshold (None when the semantic tier is disabled).
+        """
+        scope = self._scope(question) if self.semantic else None
+
+        with self._lock:
+            if not self.semantic:
+                self._counters["misses"] += 1
+                return None
+
+            self._check_index_version()
+            self._expire()
+
+            if self._matrix is None:
+                candidates = [
+                    key
+                    for key, entry in self._entries.items()
+                    if entry["embedding"] is not None
+                ]
+                self._matrix_keys = candidates
+                self._matrix_scopes = [self._entries[key]["scope"] for key in candidates]
+                self._matrix = (
+                    np.stack([self._entries[key]["embedding"] for key in candidates])
+                    if candidates
+                    else None
+                )
+
+            if self._matrix is not None:
+                query = np.asarray(query_embedding, dtype=np.float32)
+                query = query / (np.linalg.norm(query) or 1.0)
+                in_scope = np.array([s == scope for s in self._matrix_scopes])
+                scores = np.where(in_scope, self._matrix @ query, -np.inf)
+                best = int(np.argmax(scores))
+
+                if scores[best] >= self.similarity_threshold:
+                    return self._hit(self._matrix_keys[best], "semantic_hits")
+
+            self._counters["misses"] += 1
+            return None
+
+    def record_miss(self):
+        """Count a miss for lookups that skip the semantic tier."""
+        with self._lock:
+            self._counters["misses"] += 1
+
+    def put(self, question, answer, query_embedding=None, latency=0.0):
+        """Store an answer together with its query embedding and generation latency."""
+        embedding, scope = None, None
+        if self.semantic and query_embedding is not None:
+            embedding = np.asarray(query_embedding, dtype=np.float32)
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+            scope = self._scope(question)
+
+        with self._lock:
+            key = normalize_question(question)
+            self._entries[key] = {
+                "answer": answer,
+                "embedding": embedding,
+                "scope": scope,
+                "created": time.monotonic(),
+                "latency": latency,
+            }
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self):
+        """Return hit/miss counters, hit rate and total latency saved."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
@@ -0,0 +1,160 @@
+"""
+stubs.py
+
+Deterministic local stand-ins for the OpenAI chat model and the embedding model,
+used to run and test the RAG services fully offline.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+
+class StubMessage:
+    """Minimal chat message with the .content attribute used by the pipeline."""
+
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    """
+    Chat model stub with the subset of the LangChain ChatOpenAI interface used by
+    the pipeline (predict, invoke, ainvoke, stream). Answers are derived from the
+    prompt, so they are deterministic; latency simulates the remote call.
+    """
+
+    def __init__(self, latency=0.0, tokens_per_second=None, answer_words=40):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_words = answer_words
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, prompt):
+        with self._lock:
+            self.calls += 1
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        words = [digest[i % len(digest) : i % len(digest) + 6] for i in range(self.answer_words)]
+        return "Stub answer " + " ".join(words)
+
+    def predict(self, prompt):
+        time.sleep(self.latency)
+        return self._answer(prompt)
+
+    def invoke(self, prompt):
+        return StubMessage(self.predict(prompt))
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return StubMessage(self._answer(prompt))
+
+    def stream(self, prompt):
+        time.sleep(self.latency)
+        for word in self._answer(prompt).split(" "):
+            if self.tokens_per_second:
+                time.sleep(1.0 / self.tokens_per_second)
+            yield StubMessage(word + " ")
+
+
+class _StubCompletions:
+    def __init__(self, client):
+        self._client = client
+
+    async def create(self, model, messages, **kwargs):
+        return await self._client._complete(messages[-1]["content"])
+
+
+class StubChatClient:
+    """
+    Stand-in for openai.AsyncOpenAI with the chat.completions.create subset used
+    by generate_ground_truth.py. It answers with a JSON list of questions built
+    from the words of the prompt; error_rate and malformed_rate inject timeouts
+    and unparsable answers to exercise the retry path.
+    """
+
+    def __init__(self, latency=0.0, num_questions=4, error_rate=0.0, malformed_rate=0.0,
+                 seed=0):
+        self.latency = latency
+        self.num_questions = num_questions
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self.chat = type("StubChat", (), {})()
+        self.chat.completions = _StubCompletions(self)
+
+    def _questions(self, prompt):
+        text = prompt.split("text:", 1)[-1].split("\n\n", 1)[0]
+        words = sorted(set(re.findall(r"[A-Za-z]{5,}", text))) or ["Southeast", "Asia"]
+        digest = hashlib.sha256(prompt.encode()).digest()
+        return [
+            f"What should sustainable travellers know about {words[digest[i] % len(words)]}?"
+            for i in range(self.num_questions)
+        ]
+
+    async def _complete(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self._random.random() < self.error_rate:
+            raise TimeoutError("stub chat model timed out")
+
+        content = json.dumps(self._questions(prompt))
+        if self._random.random() < self.malformed_rate:
+            content = content[: len(content) // 2]
+        message = StubMessage(content)
+        choice = type("StubChoice", (), {"message": message})()
+        return type("StubCompletion", (), {"choices": [choice]})()
+
+
+class HashingEmbedding(BaseEmbedding):
+    """
+    Deterministic bag-of-words embedding: tokens are hashed into embed_dim
+    buckets and the vector is L2-normalized. Not semantically meaningful, but
+    texts sharing words get similar vectors, which is enough for offline runs.
+    """
+
+    embed_dim: int = 1024
+    _latency: float = PrivateAttr(default=0.0)
+
+    def __init__(self, embed_dim=1024, latency=0.0, **kwargs):
+        super().__init__(model_name="hashing-stub", embed_dim=embed_dim, **kwargs)
+        self._latency = latency
+
+    @classmethod
+    def class_name(cls):
+        return "HashingEmbedding"
+
+    def _vector(self, text):
+        vector = np.zeros(self.embed_dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            bucket = int(hashlib.md5(token.encode()).hexdigest()[:8], 16)
+            vector[bucket % self.embed_dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        time.sleep(self._latency)
+        return [self._vector(query) for query in queries]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self.get_query_embedding_batch([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._latency)
+        return [self._vector(text) for text in texts]
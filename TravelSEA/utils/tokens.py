@@ -0,0 +1,35 @@
+"""
+tokens.py
+
+Token counting for prompts and retrieved context. Uses tiktoken when it is
+installed and falls back to a characters-per-token estimate otherwise.
+"""
+
+from functools import lru_cache
+
+# Average characters per token of English text for OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model="gpt-4o"):
+    """Return the number of tokens of text for model (estimated without tiktoken)."""
+    if not text:
+        return 0
+
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, round(len(text) / CHARS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))
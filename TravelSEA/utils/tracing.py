@@ -0,0 +1,393 @@
+"""
+tracing.py
+
+Lightweight tracing and metrics for the query pipeline.
+
+Spans time pipeline stages (query embedding, vector/text search, fusion,
+prompt assembly, generation, startup model loads) into latency histograms;
+counters track cache hits and misses; value histograms record context and
+prompt sizes. render_prometheus() exposes everything in the Prometheus text
+format, and each request can optionally be written as one structured JSON
+log line with its per-stage timings.
+
+Tracing is disabled by default. While disabled, span() returns a shared no-op
+context manager and counters return immediately, so the instrumentation left
+in the pipeline costs a function call and an attribute check.
+"""
+
+import contextlib
+import contextvars
+import inspect
+import json
+import sys
+import threading
+import time
+import uuid
+
+METRIC_PREFIX = "travelsea"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets (seconds) for stage histograms
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+# Buckets for size histograms (tokens, characters)
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+_current_trace = contextvars.ContextVar("travelsea_trace", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _NoopTrace(_NoopSpan):
+    trace_id = None
+
+    def record(self, name, seconds):
+        pass
+
+    def activate(self):
+        return self
+
+    def finish(self, error=None):
+        pass
+
+
+_NOOP_TRACE = _NoopTrace()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Span:
+    """Times one stage; the duration goes to the stage histogram and the trace."""
+
+    def __init__(self, tracer, name, trace):
+        self._tracer = tracer
+        self._name = name
+        self._trace = trace
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        self._tracer.observe_stage(self._name, seconds, error=exc_type is not None)
+        if self._trace is not None:
+            self._trace.record(self._name, seconds)
+        return False
+
+    def set(self, key, value):
+        if self._trace is not None:
+            self._trace.set(key, value)
+
+
+class Trace:
+    """One request: collects stage timings and attributes for the request log."""
+
+    def __init__(self, tracer, name, attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = dict(attributes)
+        self.stages = {}
+        self._tracer = tracer
+        self._start = time.perf_counter()
+        self._token = None
+        self._finished = False
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._token)
+        self.finish(error=exc_type.__name__ if exc_type else None)
+        return False
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Make this trace current for the spans opened inside, without finishing it."""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self, error=None):
+        """Close the trace and record its total duration (idempotent)."""
+        if self._finished:
+            return
+        self._finished = True
+        total = time.perf_counter() - self._start
+        self._tracer.observe_stage(self.name, total, error=error is not None)
+        self._tracer.log_request(
+            {
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "timestamp": time.time(),
+                "total_ms": round(1000 * total, 3),
+                "stages_ms": {k: round(1000 * v, 3) for k, v in self.stages.items()},
+                "error": error,
+                **self.attributes,
+            }
+        )
+
+
+class Tracer:
+    """Process-wide collector of stage latencies, counters and value histograms."""
+
+    def __init__(self):
+        self.enabled = False
+        self.log_requests = False
+        self.log_path = None
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._stage_errors = {}
+        self._counters = {}
+        self._values = {}
+        self._log_file = None
+
+    def configure(self, enabled=True, log_requests=False, log_path=None):
+        """Turn tracing on or off; request log lines go to log_path or stdout."""
+        with self._lock:
+            self.enabled = enabled
+            self.log_requests = enabled and log_requests
+            if log_path != self.log_path and self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            self.log_path = log_path
+
+    # --- recording -------------------------------------------------------
+
+    def span(self, name):
+        """Context manager timing one stage of the current request."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, _current_trace.get())
+
+    def trace(self, name, **attributes):
+        """
+        Start a request trace. Use as a context manager to make it current for
+        the spans opened inside, or call finish() explicitly (e.g. for streams).
+        """
+        if not self.enabled:
+            return _NOOP_TRACE
+        return Trace(self, name, attributes)
+
+    def current_trace(self):
+        return _current_trace.get() or _NOOP_TRACE
+
+    def observe_stage(self, name, seconds, error=False):
+        with self._lock:
+            histogram = self._stages.get(name)
+            if histogram is None:
+                histogram = self._stages[name] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            if error:
+                self._stage_errors[name] = self._stage_errors.get(name, 0) + 1
+
+    def increment(self, name, value=1, **labels):
+        """Add value to a labelled counter, e.g. increment("cache_lookups", cache="response", result="hit")."""
+        if not self.enabled or not value:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=SIZE_BUCKETS):
+        """Record a value (e.g. prompt tokens) in a histogram and the current trace."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._values.get(name)
+            if histogram is None:
+                histogram = self._values[name] = Histogram(buckets)
+            histogram.observe(value)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.set(name, value)
+
+    def log_request(self, record):
+        if not self.log_requests:
+            return
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self.log_path is None:
+                sys.stdout.write(line)
+                return
+            if self._log_file is None:
+                self._log_file = open(self.log_path, "a", buffering=1)
+            self._log_file.write(line)
+
+    # --- export ----------------------------------------------------------
+
+    def snapshot(self):
+        """Return stage latency summaries and counters as a plain dict."""
+        with self._lock:
+            return {
+                "stages": {
+                    name: {
+                        "count": h.count,
+                        "mean_ms": 1000 * h.sum / h.count if h.count else 0.0,
+                        "errors": self._stage_errors.get(name, 0),
+                    }
+                    for name, h in self._stages.items()
+                },
+                "counters": {
+                    name + "".join(f"[{k}={v}]" for k, v in labels): value
+                    for (name, labels), value in self._counters.items()
+                },
+            }
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            stage_metric = f"{METRIC_PREFIX}_stage_duration_seconds"
+            lines.append(f"# HELP {stage_metric} Duration of pipeline stages.")
+            lines.append(f"# TYPE {stage_metric} histogram")
+            for name, histogram in sorted(self._stages.items()):
+                lines.extend(_render_histogram(stage_metric, {"stage": name}, histogram))
+
+            error_metric = f"{METRIC_PREFIX}_stage_errors_total"
+            lines.append(f"# HELP {error_metric} Pipeline stages that raised an exception.")
+            lines.append(f"# TYPE {error_metric} counter")
+            for name, count in sorted(self._stage_errors.items()):
+                lines.append(f'{error_metric}{{stage="{name}"}} {count}')
+
+            counter_names = sorted({name for name, _ in self._counters})
+            for counter in counter_names:
+                metric = f"{METRIC_PREFIX}_{counter}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (name, labels), value in sorted(self._counters.items()):
+                    if name == counter:
+                        lines.append(f"{metric}{_labels(dict(labels))} {value}")
+
+            for name, histogram in sorted(self._values.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                lines.extend(_render_histogram(metric, {}, histogram))
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._stage_errors.clear()
+            self._counters.clear()
+            self._values.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _render_histogram(metric, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f"{metric}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+    lines.append(f"{metric}_bucket{_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+    lines.append(f"{metric}_sum{_labels(labels)} {histogram.sum}")
+    lines.append(f"{metric}_count{_labels(labels)} {histogram.count}")
+    return lines
+
+
+def trace_methods(obj, spans):
+    """
+    Wrap methods of obj in spans, e.g. {"_query_with_score": "vector_search"}.
+    Missing methods are skipped, so this tolerates library version changes.
+    """
+    for method_name, span_name in spans.items():
+        method = getattr(obj, method_name, None)
+        if method is None:
+            continue
+
+        if inspect.iscoroutinefunction(method):
+
+            async def traced(*args, _method=method, _span_name=span_name, **kwargs):
+                with tracer.span(_span_name):
+                    return await _method(*args, **kwargs)
+
+        else:
+
+            def traced(*args, _method=method, _span_name=span_name, **kwargs):
+                with tracer.span(_span_name):
+                    return _method(*args, **kwargs)
+
+        # Bypass pydantic's __setattr__ validation on llama-index components
+        object.__setattr__(obj, method_name, traced)
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Serve GET /metrics from a daemon thread (for processes without an HTTP API).
+    Listens on loopback unless another host is given explicitly.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return server
+
+
+tracer = Tracer()
@@ -1,8 +1,109 @@
-from llama_index.core import Settings
-from llama_index.core.indices.vector_store.base import VectorStoreIndex
-from llama_index.core.schema import TextNode
-from llama_index.core.storage.storage_context import StorageContext
-from llama_index.vector_stores.postgres import PGVectorStore
+import contextvars
+import numbers
+import time
+from typing import List
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from sqlalchemy import delete, event, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from tqdm import tqdm
+
+from utils.index_sync import CONTENT_HASH_KEY, EXCLUDED_METADATA_KEYS, sync_vector_db
+from utils.tracing import trace_methods
+
+# SET LOCAL statements for the queries run by a SearchParamsRetriever; None
+# means the PGVectorDB defaults. Only read by the after_begin listener of
+# PGVectorDB's own session classes, never by other sessions.
+_search_statements = contextvars.ContextVar("pgvector_search_statements", default=None)
+
+
+def _positive_int(name, value):
+    if isinstance(value, bool) or not isinstance(value, numbers.Integral) or value < 1:
+        raise ValueError(f"{name} must be a positive integer, got {value!r}")
+    return int(value)
+
+
+def search_statements(method, ef_search=None, probes=None):
+    """
+    SET LOCAL statements of the query-time parameter of the ANN index method:
+    hnsw.ef_search for "hnsw", ivfflat.probes for "ivfflat", nothing otherwise.
+    Values are validated integers, inlined because SET takes no bind parameters.
+    """
+    if method == "hnsw" and ef_search is not None:
+        return (f"SET LOCAL hnsw.ef_search = {_positive_int('ef_search', ef_search)}",)
+    if method == "ivfflat" and probes is not None:
+        return (f"SET LOCAL ivfflat.probes = {_positive_int('probes', probes)}",)
+    return ()
+
+
+def search_session_class(default_statements):
+    """
+    Session subclass that runs the search SET LOCAL statements at the start of
+    every transaction (on the connection it uses), so they end with it.
+    """
+    session_class = type("PGVectorSession", (Session,), {})
+
+    def apply_search_statements(session, transaction, connection):
+        statements = _search_statements.get()
+        for statement in default_statements if statements is None else statements:
+            connection.exec_driver_sql(statement)
+
+    event.listen(session_class, "after_begin", apply_search_statements)
+    return session_class
+
+
+def pool_engine_kwargs(pool_config):
+    """
+    Translate the pool config into SQLAlchemy create_engine arguments.
+
+    min_size connections are kept open in the pool; up to max_size - min_size
+    extra connections are opened under load and closed when returned.
+    """
+    min_size = pool_config.get("min_size", 2)
+    max_size = max(pool_config.get("max_size", 10), min_size)
+    return {
+        "pool_size": min_size,
+        "max_overflow": max_size - min_size,
+        "pool_timeout": pool_config.get("timeout", 30),
+        "pool_recycle": pool_config.get("recycle", 1800),
+        "pool_pre_ping": pool_config.get("pre_ping", True),
+    }
+
+
+def _connect_timeout_setter(param, seconds):
+    def set_connect_timeout(dialect, conn_rec, cargs, cparams):
+        cparams.setdefault(param, seconds)
+
+    return set_connect_timeout
+
+
+def _instrument_sessions(session_class, stats_by_engine):
+    """
+    Count connection acquisitions of the session class and how long each took
+    (pool checkout wait, plus connecting when the pool opens a new connection):
+    from the start of a transaction until its connection has begun.
+    """
+
+    def on_transaction_create(session, transaction):
+        if transaction.parent is None:
+            session.info["acquire_started_at"] = time.perf_counter()
+
+    def on_begin(session, transaction, connection):
+        start = session.info.pop("acquire_started_at", None)
+        stats = stats_by_engine.get(connection.engine)
+        if start is None or stats is None:
+            return
+        wait = time.perf_counter() - start
+        stats["checkouts"] += 1
+        stats["wait_seconds"] += wait
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+
+    event.listen(session_class, "after_transaction_create", on_transaction_create)
+    # Before the search SET LOCAL statements, which already use the connection
+    event.listen(session_class, "after_begin", on_begin, insert=True)
 
 
 class PGVectorDB:
@@ -17,8 +118,27 @@ class PGVectorDB:
         table_name,
         hybrid_search=True,
         embed_dim=1024,
+        ann_config=None,
+        pool_config=None,
     ):
 
+        # ANN index settings: method ("hnsw" or "ivfflat"), m, ef_construction,
+        # lists, and the default ef_search / probes used at query time
+        self.ann_config = dict(ann_config or {})
+        self._search_statements = search_statements(
+            self.ann_config.get("method", "hnsw"),
+            self.ann_config.get("ef_search"),
+            self.ann_config.get("probes"),
+        )
+        # Connection pool settings: min_size, max_size, timeout, recycle,
+        # pre_ping, statement_timeout_ms and connect_timeout
+        self.pool_config = dict(pool_config or {})
+        self._connections_configured = False
+        self._pool_stats = {}
+
+        # Imported here: the postgres integration pulls in asyncpg and pgvector
+        from llama_index.vector_stores.postgres import PGVectorStore
+
         self.vector_store = PGVectorStore.from_params(
             database=db_name,
             host=host,
@@ -29,26 +149,430 @@ class PGVectorDB:
             hybrid_search=hybrid_search,
             text_search_config="english",
             embed_dim=embed_dim,
+            create_engine_kwargs=pool_engine_kwargs(self.pool_config),
         )
 
     def build_index(self, embedding_model):
+        from llama_index.core import Settings, StorageContext, VectorStoreIndex
 
         Settings.embed_model = embedding_model
+        self.embedding_model = embedding_model
 
         self.storage_context = StorageContext.from_defaults(
             vector_store=self.vector_store
         )
 
+        # Configure timeouts, pool instrumentation and the search session class
+        # now, so the serving path (queries only) gets them too.
+        self._ensure_initialized()
+
         self.index = VectorStoreIndex.from_documents(
             [], storage_context=self.storage_context
         )
 
-    def add_document(self, document):
+        # Time pgvector (dense) and tsvector (sparse) searches separately, and
+        # whole hybrid queries, which run both inside PGVectorStore and merge the
+        # results (the async path runs the two searches concurrently).
+        trace_methods(
+            self.vector_store,
+            {
+                "_query_with_score": "vector_search",
+                "_aquery_with_score": "vector_search",
+                "_sparse_query_with_rank": "text_search",
+                "_async_sparse_query_with_rank": "text_search",
+                "_hybrid_query": "hybrid_search",
+                "_async_hybrid_query": "hybrid_search",
+            },
+        )
+
+    # --- connections ----------------------------------------------------
+
+    def _ensure_initialized(self):
+        """Create engines and tables (PGVectorStore does it lazily) and configure pools."""
+        if self._connections_configured:
+            return
+        store = self.vector_store
+        store._initialize()
+
+        statement_timeout = self.pool_config.get("statement_timeout_ms")
+
+        def set_statement_timeout(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET statement_timeout = {int(statement_timeout)}")
+            cursor.close()
 
-        llama_node = TextNode(
+        connect_timeout = self.pool_config.get("connect_timeout")
+        # psycopg2 and asyncpg name the connect timeout differently
+        timeout_params = {"sync": "connect_timeout", "async": "timeout"}
+
+        engines = {"sync": store._engine, "async": store._async_engine.sync_engine}
+        for name, engine in engines.items():
+            if statement_timeout:
+                event.listen(engine, "connect", set_statement_timeout)
+            if connect_timeout:
+                event.listen(
+                    engine,
+                    "do_connect",
+                    _connect_timeout_setter(timeout_params[name], connect_timeout),
+                )
+
+        # Drop the connections opened during table setup so every pooled
+        # connection is created with the listeners above.
+        store._engine.dispose()
+
+        # Same session factories as PGVectorStore's, with a session class that
+        # applies the ANN search settings inside each transaction
+        session_class = search_session_class(self._search_statements)
+        store._session = sessionmaker(**{**store._session.kw, "class_": session_class})
+        store._async_session = async_sessionmaker(
+            **{**store._async_session.kw, "class_": AsyncSession,
+               "sync_session_class": session_class}
+        )
+
+        for name in engines:
+            self._pool_stats[name] = {
+                "checkouts": 0,
+                "wait_seconds": 0.0,
+                "max_wait_seconds": 0.0,
+            }
+        _instrument_sessions(
+            session_class,
+            {engine: self._pool_stats[name] for name, engine in engines.items()},
+        )
+
+        self._connections_configured = True
+
+    def pool_status(self):
+        """Return in-use/idle connection counts and connection acquisition waits per engine."""
+        if not self._connections_configured:
+            return {}
+
+        store = self.vector_store
+        status = {}
+        for name, engine in (
+            ("sync", store._engine),
+            ("async", store._async_engine.sync_engine),
+        ):
+            pool = engine.pool
+            stats = self._pool_stats[name]
+            status[name] = {
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": stats["checkouts"],
+                "avg_wait_ms": 1000 * stats["wait_seconds"] / max(stats["checkouts"], 1),
+                "max_wait_ms": 1000 * stats["max_wait_seconds"],
+            }
+        return status
+
+    @staticmethod
+    def to_node(document):
+
+        return TextNode(
             text=document["content"],
             metadata=document["metadata"],
             id_=document["metadata"]["document_id"],
+            # Bookkeeping only: keep it out of the embedded text and the LLM context.
+            excluded_embed_metadata_keys=EXCLUDED_METADATA_KEYS,
+            excluded_llm_metadata_keys=EXCLUDED_METADATA_KEYS,
         )
 
-        self.index.insert_nodes([llama_node])
+    def add_document(self, document):
+
+        self.index.insert_nodes([self.to_node(document)])
+
+    def embed_nodes(self, nodes):
+        """Embed a batch of nodes with a single batched call to the embedding model."""
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        embeddings = self.embedding_model.get_text_embedding_batch(texts)
+
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+
+        return nodes
+
+    def _insert_rows(self, session, nodes):
+        store = self.vector_store
+        rows = [
+            {
+                "node_id": node.node_id,
+                "text": node.get_content(metadata_mode=MetadataMode.NONE),
+                "metadata_": node_to_metadata_dict(
+                    node, remove_text=True, flat_metadata=store.flat_metadata
+                ),
+                "embedding": node.get_embedding(),
+            }
+            for node in nodes
+        ]
+        if rows:
+            session.execute(insert(store._table_class.__table__), rows)
+
+    def _delete_rows(self, session, node_ids, batch_size=1000):
+        table = self.vector_store._table_class.__table__
+        node_ids = list(node_ids)
+        for i in range(0, len(node_ids), batch_size):
+            session.execute(delete(table).where(table.c.node_id.in_(node_ids[i : i + batch_size])))
+
+    def insert_nodes(self, nodes, refresh=True):
+        """
+        Insert already-embedded nodes with one multi-row INSERT in one transaction.
+        Rows are searchable once committed; refresh is accepted for interface
+        parity with InMemoryVectorDB.
+        """
+        self._ensure_initialized()
+        with self.vector_store._session() as session, session.begin():
+            self._insert_rows(session, nodes)
+
+    def add_documents(self, documents, batch_size=256):
+        """
+        Bulk-load documents: embed them in batches and insert each batch in a
+        single transaction, instead of one embedding call and one INSERT per chunk.
+
+        Parameters:
+            documents (list): Document dicts with "content" and "metadata" keys.
+            batch_size (int): Number of chunks embedded and inserted per transaction.
+
+        Returns:
+            dict: Chunk count and time spent embedding and writing to the database.
+        """
+        stats = {"chunks": 0, "embed_seconds": 0.0, "db_seconds": 0.0}
+        start = time.perf_counter()
+
+        with tqdm(
+            total=len(documents), desc="Adding documents to vector DB", unit="chunk"
+        ) as progress:
+            for i in range(0, len(documents), batch_size):
+                nodes = [self.to_node(doc) for doc in documents[i : i + batch_size]]
+
+                t0 = time.perf_counter()
+                self.embed_nodes(nodes)
+                t1 = time.perf_counter()
+                self.insert_nodes(nodes)
+                t2 = time.perf_counter()
+
+                stats["embed_seconds"] += t1 - t0
+                stats["db_seconds"] += t2 - t1
+                stats["chunks"] += len(nodes)
+                progress.update(len(nodes))
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"Inserted {stats['chunks']} chunks in {elapsed:.1f}s "
+            f"({stats['chunks'] / max(elapsed, 1e-9):.1f} chunks/sec; "
+            f"embedding {stats['embed_seconds']:.1f}s, "
+            f"database {stats['db_seconds']:.1f}s)"
+        )
+
+        return stats
+
+    def stored_content_hashes(self):
+        """Return a mapping of stored document_id to its content hash."""
+        store = self.vector_store
+        self._ensure_initialized()
+        table = store._table_class.__table__
+
+        stmt = select(table.c.node_id, table.c.metadata_[CONTENT_HASH_KEY].astext)
+        with store._session() as session:
+            return {node_id: content_hash for node_id, content_hash in session.execute(stmt)}
+
+    def stored_node_ids(self, pdf_names):
+        """Return the node_ids of the stored rows of the given PDFs."""
+        store = self.vector_store
+        self._ensure_initialized()
+        table = store._table_class.__table__
+
+        stmt = select(table.c.node_id).where(
+            table.c.metadata_["pdf_name"].astext.in_(list(pdf_names))
+        )
+        with store._session() as session:
+            return [node_id for (node_id,) in session.execute(stmt)]
+
+    def delete_nodes(self, node_ids, batch_size=1000, refresh=True):
+        """Delete all rows whose node_id is in node_ids (refresh: see insert_nodes)."""
+        self._ensure_initialized()
+        with self.vector_store._session() as session, session.begin():
+            self._delete_rows(session, node_ids, batch_size)
+
+    def replace_nodes(self, node_ids, nodes, refresh=True):
+        """
+        Delete the rows in node_ids and insert the already-embedded nodes in one
+        transaction, so replaced chunks are never missing (refresh: see insert_nodes).
+        """
+        self._ensure_initialized()
+        with self.vector_store._session() as session, session.begin():
+            self._delete_rows(session, node_ids)
+            self._insert_rows(session, nodes)
+
+    def sync_documents(self, documents, batch_size=256):
+        """Incrementally add, replace and remove chunks; see index_sync.sync_vector_db."""
+        return sync_vector_db(self, documents, batch_size=batch_size)
+
+    def refresh(self):
+        """No-op: committed rows are searchable right away."""
+
+    def index_version(self):
+        """Return a cheap fingerprint of the table contents (row count and max id)."""
+        store = self.vector_store
+        self._ensure_initialized()
+        table = store._table_class.__table__
+
+        stmt = select(func.count(), func.max(table.c.id))
+        with store._session() as session:
+            count, max_id = session.execute(stmt).one()
+        return f"{count}:{max_id}"
+
+    # --- ANN and full-text index management -------------------------------
+
+    def _table(self):
+        store = self.vector_store
+        self._ensure_initialized()
+        return f'"{store.schema_name}"."{store._table_class.__tablename__}"'
+
+    def _table_name(self):
+        self._ensure_initialized()
+        return self.vector_store._table_class.__tablename__
+
+    def _execute(self, statement, params=None):
+        """Run a statement in its own transaction; return its rows, if any."""
+        with self.vector_store._session() as session, session.begin():
+            result = session.execute(text(statement), params or {})
+            return result.fetchall() if result.returns_rows else None
+
+    def create_ann_index(
+        self, method="hnsw", m=16, ef_construction=64, lists=100, **kwargs
+    ):
+        """
+        Create an HNSW or IVFFlat index on the embedding column (cosine distance).
+
+        Build it after bulk loading: inserting into an existing ANN index is much
+        slower than building it once, and IVFFlat needs data to train its lists.
+        Any index of the other method is dropped.
+        """
+        table_name = self._table_name()
+        index_name = f"{table_name}_embedding_{method}_idx"
+
+        if method == "hnsw":
+            using = (
+                "hnsw (embedding vector_cosine_ops) "
+                f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+            )
+        elif method == "ivfflat":
+            using = f"ivfflat (embedding vector_cosine_ops) WITH (lists = {int(lists)})"
+        else:
+            raise ValueError(f"Unknown ANN index method: {method}")
+
+        self.drop_ann_index(keep=method)
+
+        start = time.perf_counter()
+        self._execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {self._table()} USING {using}"
+        )
+        self._execute(f"ANALYZE {self._table()}")
+        elapsed = time.perf_counter() - start
+        print(f"Created {method} index {index_name} in {elapsed:.1f}s")
+
+    def drop_ann_index(self, keep=None):
+        """Drop the HNSW/IVFFlat indexes on the embedding column (except method keep)."""
+        table_name = self._table_name()
+        for method in ("hnsw", "ivfflat"):
+            if method != keep:
+                self._execute(
+                    f'DROP INDEX IF EXISTS "{self.vector_store.schema_name}".'
+                    f"{table_name}_embedding_{method}_idx"
+                )
+
+    def tune_text_search_index(self):
+        """
+        Make sure the tsvector column has a GIN index and turn off fastupdate on it,
+        so sparse queries never have to scan the pending list after bulk loads.
+        """
+        table_name = self._table_name()
+        rows = self._execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = :schema "
+            "AND tablename = :table AND indexdef ILIKE '%USING gin%text_search_tsv%'",
+            {"schema": self.vector_store.schema_name, "table": table_name},
+        )
+
+        if not rows:
+            self._execute(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_text_search_tsv_idx "
+                f"ON {self._table()} USING gin (text_search_tsv) WITH (fastupdate = off)"
+            )
+        for (index_name,) in rows:
+            self._execute(
+                f'ALTER INDEX "{self.vector_store.schema_name}"."{index_name}" '
+                "SET (fastupdate = off)"
+            )
+
+    def build_search_indexes(self):
+        """Create the configured ANN index and tune the full-text index."""
+        config = {k: v for k, v in self.ann_config.items() if v is not None}
+        if config.get("method", "hnsw") != "none":
+            self.create_ann_index(**config)
+        self.tune_text_search_index()
+
+    def index_status(self):
+        """Return name, definition, size and scan count of every index on the table."""
+        rows = self._execute(
+            "SELECT i.indexname, i.indexdef, "
+            "pg_size_pretty(pg_relation_size("
+            "quote_ident(i.schemaname) || '.' || quote_ident(i.indexname))), "
+            "s.idx_scan "
+            "FROM pg_indexes i LEFT JOIN pg_stat_user_indexes s "
+            "ON s.schemaname = i.schemaname AND s.indexrelname = i.indexname "
+            "WHERE i.schemaname = :schema AND i.tablename = :table ORDER BY i.indexname",
+            {"schema": self.vector_store.schema_name, "table": self._table_name()},
+        )
+
+        return [
+            {"name": name, "definition": definition, "size": size, "scans": scans}
+            for name, definition, size, scans in rows
+        ]
+
+    def as_retriever(self, ef_search=None, probes=None, **kwargs):
+        """
+        Return a retriever over the index. Each query transaction starts with
+        SET LOCAL hnsw.ef_search or ivfflat.probes (whichever matches the
+        configured ANN method), from ef_search/probes or the ANN config.
+        """
+        self._ensure_initialized()
+        retriever = self.index.as_retriever(**kwargs)
+
+        statements = search_statements(
+            self.ann_config.get("method", "hnsw"),
+            ef_search or self.ann_config.get("ef_search"),
+            probes or self.ann_config.get("probes"),
+        )
+        if statements == self._search_statements:
+            # The session class applies the defaults to every transaction
+            return retriever
+        return SearchParamsRetriever(retriever, statements)
+
+    async def aretrieve(self, query, **kwargs):
+        """Retrieve through the store's async engine (asyncpg) without blocking."""
+        self._ensure_initialized()
+        return await self.as_retriever(**kwargs).aretrieve(query)
+
+
+class SearchParamsRetriever(BaseRetriever):
+    """Runs a retriever's queries with other ANN search settings than the defaults."""
+
+    def __init__(self, retriever, statements):
+        super().__init__()
+        self._retriever = retriever
+        self._statements = statements
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        token = _search_statements.set(self._statements)
+        try:
+            return self._retriever.retrieve(query_bundle)
+        finally:
+            _search_statements.reset(token)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        token = _search_statements.set(self._statements)
+        try:
+            return await self._retriever.aretrieve(query_bundle)
+        finally:
+            _search_statements.reset(token)